@@ -1,29 +1,65 @@
+import logging
 from datetime import datetime, timezone
-from typing import List
-
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile, status
+from functools import partial
+from typing import List, Optional, Tuple
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, update
 from sqlalchemy.orm import Session
 
+from app import config
 from app.models.database import Bookmark, get_db
-from app.models.schemas import BookmarkCreate, BookmarkResponse, BookmarkUpdate  # noqa: F401
+from app.models.schemas import (  # noqa: F401
+    BookmarkCreate,
+    BookmarkResponse,
+    BookmarkUpdate,
+    DuplicateGroup,
+    RelatedBookmark,
+)
+from app.services import inverted_index, neighbor_graph, page_cache, retraining, token_cache
 from app.services.bookmark_importer import parse_and_import_bookmarks
-from app.services.content_enricher import ContentEnricher
-from app.services.tfidf_vectorizer import get_vectorizer, reset_vectorizer
+from app.services.content_enricher import ContentEnricher, FetchedPage
+from app.services.crawler import create_crawler
+from app.services.dedup import canonicalize_url, get_duplicate_index, simhash, to_signed
+from app.services.job_queue import get_job_queue
+from app.services.retraining import is_retraining, retrain_in_shadow
+from app.services.search_cache import bump_generation
+from app.services.tfidf_vectorizer import get_vectorizer
+from app.services.tokenizer import shutdown_pool
+from app.services.vector_index import get_vector_index
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # 初始化內容豐富化服務
 content_enricher = ContentEnricher()
+bulk_crawler = create_crawler(content_enricher)
 
 
 @router.post("/bookmarks", response_model=BookmarkResponse, status_code=status.HTTP_201_CREATED)
-async def create_bookmark(
-    bookmark: BookmarkCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
-):
+async def create_bookmark(bookmark: BookmarkCreate, db: Session = Depends(get_db)):
     """創建新書籤"""
     try:
-        # 檢查是否已存在相同 URL
-        existing = db.query(Bookmark).filter(Bookmark.url == str(bookmark.url)).first()
+        # 檢查是否已存在相同 URL（追蹤參數等變體視為相同）
+        canonical_url = canonicalize_url(str(bookmark.url))
+        existing = (
+            db.query(Bookmark)
+            .filter(
+                or_(Bookmark.url == str(bookmark.url), Bookmark.canonical_url == canonical_url)
+            )
+            .first()
+        )
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -31,15 +67,21 @@ async def create_bookmark(
             )
 
         db_bookmark = Bookmark(
-            url=str(bookmark.url), title=bookmark.title, description=bookmark.description
+            url=str(bookmark.url),
+            canonical_url=canonical_url,
+            title=bookmark.title,
+            description=bookmark.description,
         )
         db.add(db_bookmark)
+        db.flush()
+        inverted_index.index_bookmark(db, db_bookmark)
         db.commit()
         db.refresh(db_bookmark)
+        bump_generation()
 
-        # 添加背景任務來豐富內容
-        background_tasks.add_task(
-            enrich_bookmark_content, bookmark_id=db_bookmark.id, url=db_bookmark.url
+        # 排入持久化工作佇列來豐富內容
+        get_job_queue().enqueue(
+            db, "enrich", {"bookmark_id": db_bookmark.id, "url": db_bookmark.url}
         )
 
         return db_bookmark
@@ -48,7 +90,7 @@ async def create_bookmark(
         raise http_exc
     except Exception as e:
         db.rollback()
-        print(f"Error creating bookmark: {str(e)}")  # 在日誌中記錄錯誤
+        logger.error(f"Error creating bookmark: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating bookmark: {str(e)}",
@@ -62,6 +104,25 @@ async def get_bookmarks(skip: int = 0, limit: int = 100, db: Session = Depends(g
     return bookmarks
 
 
+@router.get("/bookmarks/duplicates", response_model=List[DuplicateGroup])
+async def get_duplicate_bookmarks(db: Session = Depends(get_db)):
+    """獲取近似重複書籤報告（依原始書籤分組）"""
+    duplicates = (
+        db.query(Bookmark)
+        .filter(Bookmark.duplicate_of.isnot(None))
+        .order_by(Bookmark.duplicate_of, Bookmark.id)
+        .all()
+    )
+    groups = {}
+    for duplicate in duplicates:
+        groups.setdefault(duplicate.duplicate_of, []).append(duplicate)
+    originals = db.query(Bookmark).filter(Bookmark.id.in_(list(groups))).all()
+    return [
+        {"bookmark": original, "duplicates": groups[original.id]}
+        for original in sorted(originals, key=lambda original: original.id)
+    ]
+
+
 @router.get("/bookmarks/{bookmark_id}", response_model=BookmarkResponse)
 async def get_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
     """獲取單個書籤"""
@@ -71,6 +132,29 @@ async def get_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
     return bookmark
 
 
+@router.get("/bookmarks/{bookmark_id}/related", response_model=List[RelatedBookmark])
+async def get_related_bookmarks(
+    bookmark_id: int,
+    background_tasks: BackgroundTasks,
+    # 相關書籤表每個書籤只保存 RELATED_NEIGHBORS 筆
+    limit: int = Query(10, ge=1, le=config.RELATED_NEIGHBORS),
+    db: Session = Depends(get_db),
+):
+    """獲取相關書籤（由預先計算的相關書籤表讀取）"""
+    bookmark = db.query(Bookmark).filter(Bookmark.id == bookmark_id).first()
+    if not bookmark:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+
+    if bookmark.tfidf_vector is not None and not neighbor_graph.is_current(db, bookmark):
+        # 相關書籤表尚未對應目前的向量：本次即時計算，並在背景更新相關書籤表
+        background_tasks.add_task(neighbor_graph.refresh_neighbors_task)
+    related = neighbor_graph.get_related(db, bookmark, limit)
+    return [
+        {"bookmark": related_bookmark, "similarity": similarity}
+        for related_bookmark, similarity in related
+    ]
+
+
 @router.put("/bookmarks/{bookmark_id}", response_model=BookmarkResponse)
 async def update_bookmark(
     bookmark_id: int, bookmark: BookmarkUpdate, db: Session = Depends(get_db)
@@ -81,13 +165,18 @@ async def update_bookmark(
         raise HTTPException(status_code=404, detail="Bookmark not found")
     db_bookmark.title = bookmark.title
     db_bookmark.description = bookmark.description
+    db_bookmark.tfidf_vector_next = None  # 進行中的重新訓練需以新內容重新產生影子向量
+    inverted_index.index_bookmark(db, db_bookmark)
     db.commit()
     db.refresh(db_bookmark)
+    bump_generation()
     return db_bookmark
 
 
 @router.delete("/bookmarks/{bookmark_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
+async def delete_bookmark(
+    bookmark_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
     """刪除指定ID的書籤"""
     try:
         # 查詢書籤是否存在
@@ -95,14 +184,27 @@ async def delete_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
         if not db_bookmark:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bookmark not found")
 
-        # 刪除書籤
+        # 刪除書籤；其重複書籤不再有原始書籤，重新豐富化以產生向量或比對其他原始書籤
+        orphans = db.query(Bookmark).filter(Bookmark.duplicate_of == bookmark_id).all()
+        for orphan in orphans:
+            orphan.duplicate_of = None
         db.delete(db_bookmark)
+        inverted_index.remove_bookmark(db, bookmark_id)
+        token_cache.remove_document_tokens(db, bookmark_id)
+        page_cache.remove_page(db, bookmark_id)
         db.commit()
+        get_vector_index().remove(bookmark_id)
+        get_duplicate_index().remove(bookmark_id)
+        bump_generation()
+        # 相關書籤中含有此書籤的書籤需重算
+        background_tasks.add_task(neighbor_graph.refresh_neighbors_task)
+        for orphan in orphans:
+            get_job_queue().enqueue(db, "enrich", {"bookmark_id": orphan.id, "url": orphan.url})
         return None  # 204 No Content 不返回內容
 
     except Exception as e:
         db.rollback()
-        print(f"Error deleting bookmark: {str(e)}")
+        logger.error(f"Error deleting bookmark: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting bookmark: {str(e)}",
@@ -110,9 +212,7 @@ async def delete_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/bookmarks/upload", status_code=status.HTTP_201_CREATED)
-async def upload_bookmarks_file(
-    background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)
-):
+async def upload_bookmarks_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     上傳並匯入書籤檔案 (HTML 格式)。
     """
@@ -125,17 +225,18 @@ async def upload_bookmarks_file(
     try:
         # 呼叫服務層的函式來處理檔案
         imported_bookmarks = parse_and_import_bookmarks(db, file.file)
+        bump_generation()
 
-        # 為每個新書籤添加背景豐富化任務
-        for bookmark_info in imported_bookmarks:
-            background_tasks.add_task(
-                enrich_bookmark_content, bookmark_id=bookmark_info["id"], url=bookmark_info["url"]
-            )
+        # 以單一工作批量抓取所有新書籤（有限並行、每個主機限速）
+        job = get_job_queue().enqueue(
+            db, "crawl", {"bookmark_ids": [info["id"] for info in imported_bookmarks]}
+        )
 
         imported_count = len(imported_bookmarks)
         return {
             "message": f"Successfully imported {imported_count} bookmarks. Enrichment tasks are running in the background.",
             "count": imported_count,
+            "job_id": job.id,
         }
     except Exception as e:
         # 捕獲服務層可能拋出的任何異常
@@ -147,21 +248,55 @@ async def upload_bookmarks_file(
 
 @router.post("/bookmarks/{bookmark_id}/enrich", status_code=status.HTTP_202_ACCEPTED)
 async def enrich_bookmark(
-    bookmark_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+    bookmark_id: int, from_cache: bool = False, db: Session = Depends(get_db)
 ):
-    """手動觸發書籤內容豐富化"""
+    """
+    手動觸發書籤內容豐富化
+
+    有快取頁面時送出條件式請求，頁面未改變則不重新解析；
+    from_cache=true 時以快取的原始頁面重新解析，不需網路請求。
+    """
     bookmark = db.query(Bookmark).filter(Bookmark.id == bookmark_id).first()
     if not bookmark:
         raise HTTPException(status_code=404, detail="Bookmark not found")
 
-    # 添加背景任務
-    background_tasks.add_task(enrich_bookmark_content, bookmark_id=bookmark.id, url=bookmark.url)
+    # 排入持久化工作佇列
+    if from_cache:
+        if page_cache.get_cached_page(db, bookmark.id, bookmark.url) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No cached page for this bookmark",
+            )
+        job = get_job_queue().enqueue(db, "reextract", {"bookmark_ids": [bookmark.id]})
+    else:
+        job = get_job_queue().enqueue(
+            db, "enrich", {"bookmark_id": bookmark.id, "url": bookmark.url}
+        )
+
+    return {"message": "Content enrichment started", "job_id": job.id}
+
+
+@router.post("/bookmarks/reextract", status_code=status.HTTP_202_ACCEPTED)
+async def reextract_bookmarks(db: Session = Depends(get_db)):
+    """以快取的原始頁面重新解析所有書籤（解析規則改進後使用，不需網路請求）"""
+    cache_stats = page_cache.stats(db)
+    if cache_stats["pages"] == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No cached pages found for re-extraction",
+        )
+
+    job = get_job_queue().enqueue(db, "reextract", unique=True)
 
-    return {"message": "Content enrichment started"}
+    return {
+        "message": f"Re-extraction started for {cache_stats['pages']} cached pages",
+        "cache": cache_stats,
+        "job_id": job.id,
+    }
 
 
 @router.post("/bookmarks/batch-vectorize", status_code=status.HTTP_202_ACCEPTED)
-async def batch_vectorize_bookmarks(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def batch_vectorize_bookmarks(db: Session = Depends(get_db)):
     """批量為所有書籤生成 TF-IDF 向量"""
     
     # 計算需要處理的書籤數量
@@ -176,17 +311,18 @@ async def batch_vectorize_bookmarks(background_tasks: BackgroundTasks, db: Sessi
             detail="No bookmarks with content found for vectorization"
         )
     
-    # 添加背景任務
-    background_tasks.add_task(batch_vectorize_task)
+    # 排入持久化工作佇列（已有等待中的批量向量化工作時不重複排入）
+    job = get_job_queue().enqueue(db, "batch_vectorize", unique=True)
     
     return {
         "message": f"Batch vectorization started for {total_bookmarks} bookmarks",
-        "total_bookmarks": total_bookmarks
+        "total_bookmarks": total_bookmarks,
+        "job_id": job.id,
     }
 
 
 @router.post("/bookmarks/retrain-vectorizer", status_code=status.HTTP_202_ACCEPTED)
-async def retrain_vectorizer(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def retrain_vectorizer(db: Session = Depends(get_db)):
     """重新訓練 TF-IDF 向量化器並為所有書籤生成新向量"""
     
     total_bookmarks = db.query(Bookmark).filter(
@@ -200,215 +336,360 @@ async def retrain_vectorizer(background_tasks: BackgroundTasks, db: Session = De
             detail="No bookmarks with content found for training"
         )
     
-    # 重置向量化器並添加重新訓練任務
-    reset_vectorizer()
-    background_tasks.add_task(retrain_and_vectorize_task)
+    if get_vectorizer().hashing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hashing vectorizer does not need retraining. Use batch-vectorize instead."
+        )
+    
+    if is_retraining():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Vectorizer retraining is already in progress"
+        )
+    
+    # 新模型在背景訓練完成前，現有模型持續提供搜尋
+    job = get_job_queue().enqueue(db, "retrain", unique=True)
     
     return {
         "message": f"Vectorizer retraining started for {total_bookmarks} bookmarks",
-        "total_bookmarks": total_bookmarks
+        "total_bookmarks": total_bookmarks,
+        "job_id": job.id,
     }
 
 
-def batch_vectorize_task():
-    """背景任務：為現有書籤批量生成向量"""
-    from app.models.database import SessionLocal
+def batch_vectorize_task(chunk_size: int = 500):
+    """背景任務：為現有書籤批量生成向量（以 yield_per 串流讀取，每批提交一次）"""
+    from app.models.database import streaming_session
     
-    db = SessionLocal()
+    with streaming_session() as db:
+        _batch_vectorize(db, chunk_size)
+    neighbor_graph.refresh_neighbors_task()
+
+
+def _batch_vectorize(db: Session, chunk_size: int):
     try:
-        print("Starting batch vectorization...")
+        logger.info("Starting batch vectorization...")
         
-        # 獲取所有有內容的書籤
-        bookmarks = db.query(Bookmark).filter(
-            Bookmark.content.isnot(None),
-            Bookmark.content != ""
-        ).all()
-        
-        if not bookmarks:
-            print("No bookmarks found for vectorization")
+        # 尚未訓練時以影子模型訓練並產生所有向量，完成後一次切換
+        if not get_vectorizer().is_trained:
+            logger.info("Vectorizer not trained. Training a new model in the background...")
+            retrain_in_shadow(db)
             return
         
-        # 確保向量化器已訓練
         vectorizer = get_vectorizer()
-        if not vectorizer.vectorizer:
-            print("Training vectorizer with existing bookmarks...")
-            texts = []
-            for bookmark in bookmarks:
-                text_parts = []
-                if bookmark.title:
-                    text_parts.append(bookmark.title)
-                if bookmark.description:
-                    text_parts.append(bookmark.description)
-                if bookmark.content:
-                    text_parts.append(bookmark.content)
-                if bookmark.keywords and isinstance(bookmark.keywords, list):
-                    text_parts.extend(bookmark.keywords)
-                
-                if text_parts:
-                    texts.append(" ".join(text_parts))
-            
-            if texts:
-                vectorizer.fit(texts)
-                print(f"Vectorizer trained with {len(texts)} texts")
-        
-        # 為每個書籤生成向量
+        index = get_vector_index()
         processed_count = 0
         error_count = 0
         
-        for bookmark in bookmarks:
-            try:
-                # 生成 TF-IDF 向量
-                tfidf_vector = content_enricher.generate_tfidf_vector(
-                    bookmark.title or "",
-                    bookmark.description or "",
-                    bookmark.content or "",
-                    bookmark.keywords or []
-                )
-                
+        # 只讀取向量化需要的欄位，逐批串流
+        result = db.execute(
+            select(
+                Bookmark.id, Bookmark.title, Bookmark.description,
+                Bookmark.content, Bookmark.keywords,
+            )
+            .where(
+                Bookmark.content.isnot(None),
+                Bookmark.content != "",
+                Bookmark.duplicate_of.is_(None),  # 近似重複的書籤不產生向量
+            )
+            .order_by(Bookmark.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for rows in result.partitions():
+            # 一批只做一次稀疏矩陣轉換（分詞結果取自 token_cache）
+            tfidf_vectors = content_enricher.generate_tfidf_vectors(
+                db, rows, vectorizer=vectorizer
+            )
+            now = datetime.now(timezone.utc)
+            updates = []
+            for row, tfidf_vector in zip(rows, tfidf_vectors):
                 if tfidf_vector:
-                    bookmark.tfidf_vector = tfidf_vector
-                    bookmark.updated_at = datetime.now(timezone.utc)
-                    processed_count += 1
+                    updates.append({"id": row.id, "tfidf_vector": tfidf_vector, "updated_at": now})
                 else:
-                    print(f"Failed to generate vector for bookmark {bookmark.id}")
+                    logger.warning(f"Failed to generate vector for bookmark {row.id}")
                     error_count += 1
-                    
+            
+            try:
+                if updates:
+                    db.execute(update(Bookmark), updates)
+                db.commit()
             except Exception as e:
-                print(f"Error processing bookmark {bookmark.id}: {e}")
-                error_count += 1
+                db.rollback()
+                logger.error(f"Error committing batch updates: {e}")
+                error_count += len(updates)
+                continue
+            
+            for values in updates:
+                index.upsert_encoded(values["id"], values["tfidf_vector"])
+            bump_generation()
+            processed_count += len(updates)
         
-        # 批量提交更改
-        try:
-            db.commit()
-            print(f"Batch vectorization completed: {processed_count} processed, {error_count} errors")
-        except Exception as e:
-            db.rollback()
-            print(f"Error committing batch updates: {e}")
+        logger.info(
+            f"Batch vectorization completed: {processed_count} processed, {error_count} errors"
+        )
             
     except Exception as e:
-        print(f"Error in batch vectorization task: {e}")
+        db.rollback()
+        logger.error(f"Error in batch vectorization task: {e}")
+        raise
     finally:
-        db.close()
+        shutdown_pool()
 
 
 def retrain_and_vectorize_task():
-    """背景任務：重新訓練向量化器並生成所有向量"""
+    """
+    背景任務：以藍綠方式重新訓練向量化器並生成所有向量
+
+    另一個重新訓練正在執行或沒有可訓練的文本時正常結束，只有訓練或切換失敗時拋出例外，
+    由工作佇列記錄並重試。
+
+    Returns:
+        重新訓練的結果（存入工作的 result）
+    """
+    logger.info("Starting vectorizer retraining and batch vectorization...")
+    outcome = retrain_in_shadow()
+    if outcome == retraining.FAILED:
+        raise RuntimeError("Retraining did not complete. The current model remains active.")
+    if outcome == retraining.RETRAINED:
+        logger.info("Retraining and vectorization completed")
+        neighbor_graph.refresh_neighbors_task()
+    else:
+        logger.info(f"Retraining skipped: {outcome}")
+    return {"outcome": outcome}
+
+
+async def enrich_bookmark_content(bookmark_id: int, url: str):
+    """
+    背景工作：抓取並處理網頁內容
+
+    在應用程式的事件迴圈以共用的 HTTP session 抓取網頁（TCP/TLS 連線與 DNS 結果可重複使用），
+    解析、寫入資料庫與更新索引在執行緒池進行，不阻塞事件迴圈。
+    已有快取頁面時送出條件式請求，304 或 HTML 未改變時略過解析、關鍵字提取與向量化。
+    抓取或寫入失敗時拋出例外，由工作佇列記錄錯誤並重試。
+
+    Returns:
+        抓取結果（存入工作的 result）
+    """
+    cached = await run_in_threadpool(_cached_page, bookmark_id, url)
+    page = await content_enricher.fetch(
+        url,
+        etag=cached.etag if cached else None,
+        last_modified=cached.last_modified if cached else None,
+    )
+    if cached is not None and (
+        page.status == 304
+        or (page.html is not None and page_cache.html_hash(page.html) == cached.html_hash)
+    ):
+        await run_in_threadpool(_mark_page_checked, bookmark_id, page)
+        return {"status": page.status, "modified": False}
+    if page.skipped:
+        # 不是 HTML 的網頁（PDF、圖片等）不是錯誤，重試也不會成功
+        return {"status": page.status, "skipped": page.skipped}
+    if page.status != 200 or page.html is None:
+        raise RuntimeError(f"Failed to fetch {url}: HTTP {page.status}")
+
+    content_data = await run_in_threadpool(content_enricher.process_page, page.html, url)
+    content_data["page"] = page
+    await run_in_threadpool(_store_enriched_content, bookmark_id, content_data)
+    return {"status": page.status, "modified": True}
+
+
+def _cached_page(bookmark_id: int, url: str) -> Optional[page_cache.CachedPage]:
+    """已有內容的書籤的快取頁面（尚無內容時需完整抓取並解析）"""
     from app.models.database import SessionLocal
-    
+
     db = SessionLocal()
     try:
-        print("Starting vectorizer retraining and batch vectorization...")
-        
-        # 獲取所有有內容的書籤
-        bookmarks = db.query(Bookmark).filter(
-            Bookmark.content.isnot(None),
-            Bookmark.content != ""
-        ).all()
-        
-        if not bookmarks:
-            print("No bookmarks found for retraining")
-            return
-        
-        # 收集所有文本用於訓練
-        print("Collecting texts for training...")
-        texts = []
-        for bookmark in bookmarks:
-            text_parts = []
-            if bookmark.title:
-                text_parts.append(bookmark.title)
-            if bookmark.description:
-                text_parts.append(bookmark.description)
-            if bookmark.content:
-                text_parts.append(bookmark.content)
-            if bookmark.keywords and isinstance(bookmark.keywords, list):
-                text_parts.extend(bookmark.keywords)
-            
-            if text_parts:
-                texts.append(" ".join(text_parts))
-        
-        if not texts:
-            print("No texts found for training")
-            return
-        
-        # 重新訓練向量化器
-        print(f"Training vectorizer with {len(texts)} texts...")
-        vectorizer = get_vectorizer()
-        vectorizer.fit(texts)
-        print("Vectorizer training completed")
-        
-        # 為所有書籤生成新向量
-        print("Generating vectors for all bookmarks...")
-        processed_count = 0
-        error_count = 0
-        
-        for bookmark in bookmarks:
-            try:
-                tfidf_vector = content_enricher.generate_tfidf_vector(
-                    bookmark.title or "",
-                    bookmark.description or "",
-                    bookmark.content or "",
-                    bookmark.keywords or []
-                )
-                
-                if tfidf_vector:
-                    bookmark.tfidf_vector = tfidf_vector
-                    bookmark.updated_at = datetime.now(timezone.utc)
-                    processed_count += 1
-                else:
-                    error_count += 1
-                    
-            except Exception as e:
-                print(f"Error processing bookmark {bookmark.id}: {e}")
-                error_count += 1
-        
-        # 提交所有更改
-        try:
-            db.commit()
-            print(f"Retraining and vectorization completed: {processed_count} processed, {error_count} errors")
-        except Exception as e:
-            db.rollback()
-            print(f"Error committing updates: {e}")
-            
-    except Exception as e:
-        print(f"Error in retraining task: {e}")
+        has_content = db.execute(
+            select(Bookmark.id).where(Bookmark.id == bookmark_id, Bookmark.content.isnot(None))
+        ).first()
+        return page_cache.get_cached_page(db, bookmark_id, url) if has_content else None
+    finally:
+        db.close()
+
+
+def _mark_page_checked(bookmark_id: int, page: FetchedPage):
+    """記錄快取頁面未改變的檢查結果"""
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        page_cache.mark_checked(db, bookmark_id, page)
+        db.commit()
     finally:
         db.close()
 
 
-def enrich_bookmark_content(bookmark_id: int, url: str):
-    """背景任務：抓取並處理網頁內容"""
-    import asyncio
+def reextract_cached_pages_task(bookmark_ids: Optional[List[int]] = None) -> dict:
+    """
+    背景工作：以快取的原始頁面重新解析書籤（不需網路請求）
+
+    Args:
+        bookmark_ids: 只重新解析這些書籤，未提供時重新解析所有快取頁面
+
+    Returns:
+        重新解析的書籤數（存入工作的 result）
+    """
+    from app.models.database import streaming_session
+
+    processed = 0
+    with streaming_session() as db:
+        for pages in page_cache.iter_cached_pages(db, bookmark_ids, config.CRAWL_BATCH_SIZE):
+            results = [
+                (bookmark_id, content_enricher.process_page(html, url))
+                for bookmark_id, url, html in pages
+            ]
+            _store_enriched_batch(results, refresh_neighbors=False)
+            processed += len(results)
+    logger.info(f"Re-extracted {processed} bookmarks from cached pages")
+    neighbor_graph.refresh_neighbors_task()
+    return {"processed": processed}
+
+
+def _store_enriched_content(bookmark_id: int, content_data: dict):
+    """將抓取的內容寫入書籤，並同步更新重複偵測、倒排與向量索引"""
+    _store_enriched_batch([(bookmark_id, content_data)])
+
 
+def _store_enriched_batch(results: List[Tuple[int, dict]], refresh_neighbors: bool = True):
+    """
+    將一批抓取的內容寫入書籤（單一交易），並同步更新重複偵測、倒排與向量索引
+
+    Args:
+        results: (書籤 ID, 抓取內容) 列表
+        refresh_neighbors: 是否在寫入後重算相關書籤（批量抓取時於全部完成後才重算一次）
+    """
     from app.models.database import SessionLocal
 
     db = SessionLocal()
     try:
-        # 獲取書籤
-        bookmark = db.query(Bookmark).filter(Bookmark.id == bookmark_id).first()
-        if not bookmark:
+        # 獲取書籤（抓取期間可能已被刪除）
+        ids = [bookmark_id for bookmark_id, _ in results]
+        bookmarks = {b.id: b for b in db.query(Bookmark).filter(Bookmark.id.in_(ids))}
+        stored = []
+        pages = []
+        for bookmark_id, content_data in results:
+            bookmark = bookmarks.get(bookmark_id)
+            if bookmark:
+                _apply_enriched_content(db, bookmark, content_data)
+                stored.append(bookmark)
+                if content_data.get("page") is not None:
+                    pages.append((bookmark.id, bookmark.url, content_data["page"]))
+        if not stored:
             return
+        # 保存原始頁面與驗證標頭，之後可條件式重新抓取或離線重新解析
+        page_cache.store_pages(db, pages)
+        db.commit()
 
-        # 抓取內容 - 在同步函數中執行異步操作
-        content_data = asyncio.run(content_enricher.extract_content(url))
+        # 同步更新常駐向量索引
+        index = get_vector_index()
+        for bookmark in stored:
+            index.upsert_encoded(bookmark.id, bookmark.tfidf_vector)
+        bump_generation()
+        if refresh_neighbors:
+            neighbor_graph.refresh_neighbors_task()
 
-        if content_data:
-            # 更新書籤內容
-            bookmark.content = content_data.get("content", "")
-            # 直接將列表賦值給 JSON 欄位
-            bookmark.keywords = content_data.get("keywords", [])
-            if content_data.get("title") and not bookmark.title:
-                bookmark.title = content_data["title"]
-            if content_data.get("description") and not bookmark.description:
-                bookmark.description = content_data["description"]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-            # 更新 TF-IDF 向量
-            if content_data.get("tfidf_vector"):
-                bookmark.tfidf_vector = content_data["tfidf_vector"]
 
-            bookmark.updated_at = datetime.now(timezone.utc)
-            db.commit()
+def _apply_enriched_content(db: Session, bookmark: Bookmark, content_data: dict):
+    """將抓取的內容寫入書籤物件並更新重複偵測與倒排索引（由呼叫端提交，回滾時復原重複偵測索引）"""
+    # 更新書籤內容
+    bookmark.content = content_data.get("content", "")
+    # 直接將列表賦值給 JSON 欄位
+    bookmark.keywords = content_data.get("keywords", [])
+    if content_data.get("title") and not bookmark.title:
+        bookmark.title = content_data["title"]
+    if content_data.get("description") and not bookmark.description:
+        bookmark.description = content_data["description"]
+
+    # 內容與其他書籤近似重複時標記 duplicate_of 且不產生向量，
+    # 搜尋、相關書籤與之後的批量向量化都只處理原始書籤
+    signature = simhash(content_data.get("content_tokens", []), config.DEDUP_MIN_TOKENS)
+    duplicate_of = None
+    # 索引變更在交易回滾時復原
+    if signature is not None:
+        duplicate_of = get_duplicate_index().assign(bookmark.id, signature, db)
+    else:
+        get_duplicate_index().remove(bookmark.id, db)
+    bookmark.content_simhash = to_signed(signature) if signature is not None else None
+    bookmark.duplicate_of = duplicate_of
+
+    if duplicate_of is not None:
+        logger.info(f"Bookmark {bookmark.id} is a near-duplicate of bookmark {duplicate_of}")
+        bookmark.tfidf_vector = None
+        # 原本指向此書籤的重複書籤改指向新的原始書籤
+        db.execute(
+            update(Bookmark)
+            .where(Bookmark.duplicate_of == bookmark.id)
+            .values(duplicate_of=duplicate_of)
+        )
+    elif content_data.get("tfidf_vector"):
+        # 更新 TF-IDF 向量
+        bookmark.tfidf_vector = content_data["tfidf_vector"]
+    # 內容已改變，進行中的重新訓練需以新內容重新產生影子向量
+    bookmark.tfidf_vector_next = None
 
-    except Exception as e:
-        print(f"Error enriching bookmark {bookmark_id}: {str(e)}")
+    bookmark.updated_at = datetime.now(timezone.utc)
+    # 寫入分詞快取時沿用抓取內容時的分詞結果
+    document = token_cache.get_document_tokens(
+        db, [bookmark], {bookmark.id: content_data.get("content_tokens", [])}
+    )[0]
+    inverted_index.index_bookmark(db, bookmark, document)
+
+
+async def crawl_bookmarks_task(bookmark_ids: List[int]) -> dict:
+    """
+    背景工作：以有限並行批量抓取匯入的書籤網頁
+
+    只抓取尚未有內容的書籤，服務中斷後重新執行時從未完成的書籤繼續。
+    結果分批寫入資料庫，全部完成後重算一次相關書籤。
+
+    Returns:
+        抓取統計（存入工作的 result）
+    """
+    bookmarks = await run_in_threadpool(_bookmarks_to_crawl, bookmark_ids)
+    stats = await bulk_crawler.crawl(
+        bookmarks, partial(_store_enriched_batch, refresh_neighbors=False)
+    )
+    logger.info(f"Bulk enrichment completed: {stats.as_dict()}")
+    await run_in_threadpool(neighbor_graph.refresh_neighbors_task)
+    return stats.as_dict()
+
+
+def _bookmarks_to_crawl(bookmark_ids: List[int], chunk_size: int = 500) -> List[Tuple[int, str]]:
+    """尚未抓取內容的書籤 (id, url)（已刪除或標記為重複的書籤略過）"""
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        bookmarks = []
+        for start in range(0, len(bookmark_ids), chunk_size):
+            bookmarks.extend(
+                db.execute(
+                    select(Bookmark.id, Bookmark.url).where(
+                        Bookmark.id.in_(bookmark_ids[start : start + chunk_size]),
+                        Bookmark.content.is_(None),
+                        Bookmark.duplicate_of.is_(None),
+                    )
+                ).all()
+            )
+        return [(bookmark_id, url) for bookmark_id, url in bookmarks]
     finally:
         db.close()
+
+
+# 持久化工作佇列的工作類型
+for kind, handler in {
+    "enrich": enrich_bookmark_content,
+    "crawl": crawl_bookmarks_task,
+    "batch_vectorize": batch_vectorize_task,
+    "retrain": retrain_and_vectorize_task,
+    "reextract": reextract_cached_pages_task,
+}.items():
+    get_job_queue().register(kind, handler)
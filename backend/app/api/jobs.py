@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.models.database import Job, get_db
+from app.models.schemas import JobQueueStats, JobResponse
+from app.services.job_queue import get_job_queue
+
+router = APIRouter()
+
+
+@router.get("/jobs", response_model=JobQueueStats)
+async def get_job_queue_stats(db: Session = Depends(get_db)):
+    """工作佇列狀態：佇列深度、各狀態工作數、完成速率與最近的失敗工作"""
+    return get_job_queue().stats(db)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    """獲取指定工作的狀態、嘗試次數與錯誤訊息"""
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
@@ -1,13 +1,15 @@
 import json
 import logging
 import time
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import String, cast, or_
 from sqlalchemy.orm import Session
 
-from app.models.database import Bookmark, get_db
+from app import config
+from app.models.database import Bookmark, get_db, get_session_factory
 from app.models.schemas import (
     AnalyzeUrlRequest,
     AnalyzeUrlResponse,
@@ -15,8 +17,14 @@ from app.models.schemas import (
     SearchRequest,
     SearchResult,
 )
+from app.services import inverted_index
 from app.services.content_enricher import ContentEnricher
+from app.services.fts_search import search_fts
+from app.services.retraining import is_retraining
+from app.services.search_cache import SearchKey, get_search_cache, get_search_flight
 from app.services.tfidf_vectorizer import get_vectorizer
+from app.services.vector_codec import decode_vector, is_compatible
+from app.services.vector_index import get_vector_index
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +32,13 @@ router = APIRouter()
 content_enricher = ContentEnricher()
 
 
-def _semantic_search(query: str, bookmarks: List[Bookmark], limit: int = 20) -> Tuple[List[Tuple[Bookmark, float]], dict]:
+def _semantic_search(
+    query: str,
+    bookmarks: List[Bookmark],
+    limit: int = 20,
+    keyword_scores: Optional[Dict[int, float]] = None,
+    query_vector: Optional[bytes] = None,
+) -> Tuple[List[Tuple[Bookmark, float]], dict]:
     """
     執行語義搜索，返回按相關性排序的書籤列表和性能指標
     
@@ -32,6 +46,8 @@ def _semantic_search(query: str, bookmarks: List[Bookmark], limit: int = 20) ->
         query: 搜索查詢
         bookmarks: 候選書籤列表
         limit: 返回結果數量限制
+        keyword_scores: 關鍵字引擎提供的 bookmark_id -> 分數 (0-1)，未提供時以子字串比對計算
+        query_vector: 已產生的查詢向量，未提供時由查詢產生
         
     Returns:
         ((書籤, 相關性分數) 的列表，性能指標字典)
@@ -49,48 +65,55 @@ def _semantic_search(query: str, bookmarks: List[Bookmark], limit: int = 20) ->
     try:
         # 為查詢生成向量
         vector_start = time.time()
-        query_vector = content_enricher.generate_tfidf_vector_for_query(query)
+        if query_vector is None:
+            query_vector = content_enricher.generate_tfidf_vector_for_query(query)
         metrics["vector_generation_time"] = time.time() - vector_start
         
         if not query_vector:
             logger.warning(f"Failed to generate vector for query: {query}")
             metrics["total_time"] = time.time() - start_time
-            return [(bookmark, 1.0) for bookmark in bookmarks[:limit]], metrics
+            return _keyword_only_results(query, bookmarks, limit, keyword_scores), metrics
+
+        index = get_vector_index()
+        decoded_query = decode_vector(query_vector)
+        # 模型切換的瞬間查詢向量可能與索引屬於不同模型，此時只以關鍵字分數排序
+        if decoded_query is None or not is_compatible(
+            decoded_query.model_version, index.model_version
+        ):
+            metrics["total_time"] = time.time() - start_time
+            return _keyword_only_results(query, bookmarks, limit, keyword_scores), metrics
 
-        vectorizer = get_vectorizer()
         results = []
         similarity_start = time.time()
-        
-        # 準備批量相似度計算的數據
-        bookmark_vectors = []
-        bookmarks_by_id = {}
-        
+
+        # 索引中缺少的候選書籤（例如由其他程序寫入）以資料庫向量補上
         for bookmark in bookmarks:
-            if bookmark.tfidf_vector:
-                bookmark_vectors.append((str(bookmark.id), bookmark.tfidf_vector))
-                bookmarks_by_id[str(bookmark.id)] = bookmark
-        
-        # 使用批量相似度計算（更高效）
-        if bookmark_vectors:
-            similarity_results = vectorizer.calculate_batch_similarity(query_vector, bookmark_vectors)
-            
-            for bookmark_id, similarity_score in similarity_results:
-                bookmark = bookmarks_by_id.get(bookmark_id)
-                if bookmark:
-                    # 為確保有基本相關性，給關鍵字匹配增加權重
-                    keyword_bonus = _calculate_keyword_bonus(query, bookmark)
-                    final_score = similarity_score * 0.7 + keyword_bonus * 0.3
-                    results.append((bookmark, final_score))
-                    metrics["similarity_calculations"] += 1
-                    metrics["vectors_found"] += 1
-        
-        # 處理沒有向量的書籤
+            if bookmark.tfidf_vector and bookmark.id not in index:
+                index.upsert_encoded(bookmark.id, bookmark.tfidf_vector)
+
+        # 以常駐索引的一次稀疏矩陣向量乘法計算所有候選書籤的相似度
+        similarity_scores = index.similarities(
+            decoded_query.indices, decoded_query.values, [bookmark.id for bookmark in bookmarks]
+        )
+
         for bookmark in bookmarks:
-            if not bookmark.tfidf_vector or str(bookmark.id) not in bookmarks_by_id:
+            if keyword_scores is not None:
+                keyword_bonus = keyword_scores.get(bookmark.id, 0.0)
+            else:
+                keyword_bonus = _calculate_keyword_bonus(query, bookmark)
+            similarity_score = similarity_scores.get(bookmark.id)
+            if similarity_score is None:
+                # 處理沒有向量的書籤
                 metrics["vectors_missing"] += 1
-                final_score = _calculate_keyword_bonus(query, bookmark)
-                results.append((bookmark, final_score))
-        
+                results.append((bookmark, keyword_bonus))
+                continue
+
+            # 為確保有基本相關性，給關鍵字匹配增加權重
+            final_score = similarity_score * 0.7 + keyword_bonus * 0.3
+            results.append((bookmark, final_score))
+            metrics["similarity_calculations"] += 1
+            metrics["vectors_found"] += 1
+
         metrics["similarity_calculation_time"] = time.time() - similarity_start
         
         # 按相關性分數排序
@@ -106,6 +129,110 @@ def _semantic_search(query: str, bookmarks: List[Bookmark], limit: int = 20) ->
         return [(bookmark, 1.0) for bookmark in bookmarks[:limit]], metrics
 
 
+def _keyword_only_results(
+    query: str,
+    bookmarks: List[Bookmark],
+    limit: int,
+    keyword_scores: Optional[Dict[int, float]] = None,
+) -> List[Tuple[Bookmark, float]]:
+    """無法進行語義搜索時，只以關鍵字分數排序候選書籤"""
+    if keyword_scores is not None:
+        results = [(bookmark, keyword_scores.get(bookmark.id, 0.0)) for bookmark in bookmarks]
+    else:
+        results = [(bookmark, _calculate_keyword_bonus(query, bookmark)) for bookmark in bookmarks]
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:limit]
+
+
+def _load_bookmarks_in_order(db: Session, bookmark_ids: List[int]) -> List[Bookmark]:
+    """依指定 ID 順序載入書籤"""
+    if not bookmark_ids:
+        return []
+
+    bookmarks_by_id = {
+        bookmark.id: bookmark
+        for bookmark in db.query(Bookmark).filter(Bookmark.id.in_(bookmark_ids))
+    }
+    return [bookmarks_by_id[bid] for bid in bookmark_ids if bid in bookmarks_by_id]
+
+
+def _keyword_candidates(
+    db: Session, query: str, limit: int
+) -> Tuple[List[Bookmark], Optional[Dict[int, float]]]:
+    """
+    取得關鍵字候選書籤
+
+    依 config.KEYWORD_ENGINE 使用 FTS5（附 BM25 關鍵字分數）或倒排索引；
+    查詢分詞後沒有可索引的詞彙（例如單字或停用詞）時才退回 ILIKE 掃描。
+
+    Args:
+        db: 資料庫 Session
+        query: 搜索查詢
+        limit: 最多返回的候選數量
+
+    Returns:
+        (候選書籤列表（依命中程度排序），bookmark_id -> 關鍵字分數 或 None)
+    """
+    if config.KEYWORD_ENGINE == "fts5":
+        ranked = search_fts(db, query, limit)
+        if ranked is not None:
+            keyword_scores = dict(ranked)
+            return _load_bookmarks_in_order(db, list(keyword_scores)), keyword_scores
+
+    terms = inverted_index.query_terms(query)
+    if not terms:
+        return (
+            db.query(Bookmark)
+            .filter(
+                or_(
+                    Bookmark.title.ilike(f"%{query}%"),
+                    Bookmark.description.ilike(f"%{query}%"),
+                    Bookmark.content.ilike(f"%{query}%"),
+                    cast(Bookmark.keywords, String).ilike(f"%{query}%"),
+                )
+            )
+            .limit(limit)
+            .all()
+        ), None
+
+    candidate_ids = inverted_index.find_candidate_ids(db, terms, limit)
+    return _load_bookmarks_in_order(db, candidate_ids), None
+
+
+def _semantic_candidates(
+    db: Session, query_vector: Optional[bytes], limit: int, exclude: Set[int]
+) -> List[Bookmark]:
+    """
+    以查詢向量在整個向量索引中檢索語義相近的書籤
+
+    Args:
+        db: 資料庫 Session
+        query_vector: 查詢向量的編碼資料
+        limit: 最多返回的候選數量
+        exclude: 已在關鍵字候選中的書籤 ID
+
+    Returns:
+        依相似度排序的候選書籤（不含 exclude 中的書籤）
+    """
+    decoded_query = decode_vector(query_vector)
+    index = get_vector_index()
+    if decoded_query is None or not is_compatible(
+        decoded_query.model_version, index.model_version
+    ):
+        return []
+
+    # 啟用 SEARCH_ANN 時只重新計分 LSH 同桶的書籤，否則為整個語料計分
+    ranked = index.approximate_top_k(decoded_query.indices, decoded_query.values, limit)
+    return _load_bookmarks_in_order(
+        db, [bookmark_id for bookmark_id, _ in ranked if bookmark_id not in exclude]
+    )
+
+
+def _estimate_result_size(results: List[SearchResult]) -> int:
+    """以 JSON 序列化長度估計搜尋結果佔用的記憶體"""
+    return 64 + sum(len(result.model_dump_json()) for result in results)
+
+
 def _calculate_keyword_bonus(query: str, bookmark: Bookmark) -> float:
     """
     計算基於關鍵字匹配的獎勵分數
@@ -139,70 +266,104 @@ def _calculate_keyword_bonus(query: str, bookmark: Bookmark) -> float:
 
 
 @router.post("/", response_model=List[SearchResult])
-async def search_bookmarks(search_request: SearchRequest, db: Session = Depends(get_db)):
+async def search_bookmarks(
+    search_request: SearchRequest,
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+):
     """智能搜尋書籤 - 結合關鍵字搜索和語義搜索"""
-    query = search_request.query
+    query = " ".join(search_request.query.split())  # 合併空白，與結果快取的正規化一致
     limit = search_request.limit
-    
-    # 開始計時總體性能
-    total_start_time = time.time()
-    logger.info(f"Starting search for query: '{query}' (limit: {limit})")
 
     if not query:
         return []
 
+    # 相同查詢在索引世代未改變前直接返回快取結果
+    result_cache = get_search_cache()
+    cached_results, cache_key = result_cache.lookup(query, limit)
+    if cached_results is not None:
+        logger.info(f"Search cache hit for query: '{query}'")
+        return cached_results
+
+    # 同時到達的相同查詢只計算一次，搜尋在執行緒池進行，不阻塞事件迴圈
+    # 計算由所有等待者共用，不使用第一個請求的 Session（該請求中斷時 Session 會被關閉）
+    return await get_search_flight().run(
+        cache_key,
+        lambda: run_in_threadpool(_run_search, session_factory, query, limit, cache_key),
+    )
+
+
+def _run_search(
+    session_factory: Callable[[], Session], query: str, limit: int, cache_key: SearchKey
+) -> List[SearchResult]:
+    """
+    以自行開啟的 Session 執行搜尋
+
+    Args:
+        session_factory: 建立資料庫 Session 的函式
+        query: 已合併空白的搜尋查詢
+        limit: 結果數量
+        cache_key: 結果快取的鍵
+
+    Returns:
+        搜尋結果列表
+    """
+    db = session_factory()
     try:
-        # 先用關鍵字搜索獲取候選集合 (擴大搜索範圍)
-        keyword_query = db.query(Bookmark).filter(
-            or_(
-                Bookmark.title.ilike(f"%{query}%"),
-                Bookmark.description.ilike(f"%{query}%"),
-                Bookmark.content.ilike(f"%{query}%"),
-                cast(Bookmark.keywords, String).ilike(f"%{query}%"),
-            )
+        return _search(db, query, limit, cache_key)
+    finally:
+        db.close()
+
+
+def _search(db: Session, query: str, limit: int, cache_key: SearchKey) -> List[SearchResult]:
+    """
+    執行搜尋並寫入結果快取
+
+    Args:
+        db: 資料庫 Session
+        query: 已合併空白的搜尋查詢
+        limit: 結果數量
+        cache_key: 結果快取的鍵
+
+    Returns:
+        搜尋結果列表
+    """
+    result_cache = get_search_cache()
+
+    # 開始計時總體性能
+    total_start_time = time.time()
+    logger.info(f"Starting search for query: '{query}' (limit: {limit})")
+
+    try:
+        # 先用關鍵字引擎獲取候選集合 (擴大搜索範圍)
+        keyword_bookmarks, keyword_scores = _keyword_candidates(
+            db, query, limit * 3  # 獲取更多候選項
         )
+        candidates = keyword_bookmarks
+
+        # 混合檢索：以查詢向量檢索整個語料，補上不含查詢詞彙但語義相近的書籤
+        query_vector = None
+        if config.SEARCH_RETRIEVAL == "hybrid":
+            query_vector = content_enricher.generate_tfidf_vector_for_query(query)
+            candidates = keyword_bookmarks + _semantic_candidates(
+                db, query_vector, limit * 3, {bookmark.id for bookmark in keyword_bookmarks}
+            )
         
-        keyword_bookmarks = keyword_query.limit(limit * 3).all()  # 獲取更多候選項
-        
-        if not keyword_bookmarks:
+        if not candidates:
+            result_cache.store(cache_key, [], _estimate_result_size([]))
             return []
         
-        # 檢查是否有訓練好的向量化器
-        vectorizer = get_vectorizer()
-        if not vectorizer.vectorizer:
-            # 如果向量化器未訓練，嘗試使用現有書籤訓練
-            all_bookmarks = db.query(Bookmark).filter(
-                Bookmark.content.isnot(None),
-                Bookmark.content != ""
-            ).all()
-            
-            if all_bookmarks:
-                texts = []
-                for bm in all_bookmarks:
-                    text_parts = []
-                    if bm.title:
-                        text_parts.append(bm.title)
-                    if bm.description:
-                        text_parts.append(bm.description)
-                    if bm.content:
-                        text_parts.append(bm.content)
-                    if bm.keywords and isinstance(bm.keywords, list):
-                        text_parts.extend(bm.keywords)
-                    
-                    if text_parts:
-                        texts.append(" ".join(text_parts))
-                
-                if texts:
-                    vectorizer.fit(texts)
-        
+        # 向量化器未訓練時 _semantic_search 只以關鍵字分數排序，訓練由背景任務負責
         # 執行語義搜索
-        semantic_results, search_metrics = _semantic_search(query, keyword_bookmarks, limit)
+        semantic_results, search_metrics = _semantic_search(
+            query, candidates, limit, keyword_scores, query_vector
+        )
         
         # 記錄搜尋性能指標
         total_time = time.time() - total_start_time
         logger.info(
             f"Search completed in {total_time:.3f}s - "
             f"Keyword candidates: {len(keyword_bookmarks)}, "
+            f"Semantic candidates: {len(candidates) - len(keyword_bookmarks)}, "
             f"Semantic results: {len(semantic_results)}, "
             f"Search metrics: {search_metrics}"
         )
@@ -228,6 +389,7 @@ async def search_bookmarks(search_request: SearchRequest, db: Session = Depends(
                 )
             )
 
+        result_cache.store(cache_key, results, _estimate_result_size(results))
         return results
         
     except Exception as e:
@@ -285,13 +447,11 @@ async def search_health_check(db: Session = Depends(get_db)):
         # 檢查資料庫連接
         total_bookmarks = db.query(Bookmark).count()
         bookmarks_with_vectors = db.query(Bookmark).filter(
-            Bookmark.tfidf_vector.isnot(None),
-            Bookmark.tfidf_vector != ""
+            Bookmark.tfidf_vector.isnot(None)
         ).count()
         
         # 獲取向量化器狀態
-        is_vectorizer_trained = vectorizer.vectorizer is not None
-        cache_stats = vectorizer.get_cache_stats()
+        is_vectorizer_trained = vectorizer.is_trained
         
         # 系統狀態
         system_status = "healthy"
@@ -318,7 +478,7 @@ async def search_health_check(db: Session = Depends(get_db)):
                 "feature_count": len(vectorizer.feature_names),
                 "max_features": vectorizer.max_features
             },
-            "cache": cache_stats,
+            "result_cache": get_search_cache().stats(),
             "issues": issues
         }
         
@@ -336,17 +496,21 @@ async def get_vectorizer_stats():
     """獲取向量化器統計資訊"""
     try:
         vectorizer = get_vectorizer()
-        cache_stats = vectorizer.get_cache_stats()
         
         return {
             "vectorizer": {
-                "is_trained": vectorizer.vectorizer is not None,
+                "is_trained": vectorizer.is_trained,
+                "model_version": vectorizer.model_version,
+                "retraining": is_retraining(),
+                "vocabulary": vectorizer.get_vocabulary_stats(),
                 "feature_count": len(vectorizer.feature_names),
                 "max_features": vectorizer.max_features,
                 "min_df": vectorizer.min_df,
                 "max_df": vectorizer.max_df
             },
-            "cache": cache_stats,
+            "result_cache": get_search_cache().stats(),
+            "search_coalescing": get_search_flight().stats(),
+            "index": get_vector_index().stats(),
             "stop_words_count": len(vectorizer.stop_words)
         }
         
@@ -359,13 +523,13 @@ async def get_vectorizer_stats():
 
 @router.post("/vectorizer/clear-cache")
 async def clear_vectorizer_cache():
-    """清空向量化器快取"""
+    """清空搜尋結果快取"""
     try:
-        vectorizer = get_vectorizer()
-        old_size = len(vectorizer.similarity_cache)
-        vectorizer.clear_cache()
+        result_cache = get_search_cache()
+        old_size = len(result_cache)
+        result_cache.clear()
         
-        logger.info(f"Cleared vectorizer cache (removed {old_size} entries)")
+        logger.info(f"Cleared search result cache (removed {old_size} entries)")
         return {
             "success": True,
             "message": f"Cleared {old_size} cache entries",
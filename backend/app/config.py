@@ -0,0 +1,116 @@
+"""
+應用程式設定
+所有設定皆可由環境變數或 backend/.env 覆寫
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _get_str(name: str, default: str) -> str:
+    return os.getenv(name, default).strip()
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    return _get_str(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+def _get_int(name: str, default: int) -> int:
+    try:
+        return int(_get_str(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(_get_str(name, str(default)))
+    except ValueError:
+        return default
+
+
+# TF-IDF 模型檔目錄，留空時與資料庫檔案放在同一目錄
+VECTORIZER_MODEL_DIR = _get_str("VECTORIZER_MODEL_DIR", "")
+
+# 關鍵字檢索引擎："inverted"（倒排索引）或 "fts5"（SQLite FTS5 + BM25）
+KEYWORD_ENGINE = _get_str("KEYWORD_ENGINE", "inverted").lower()
+
+# 增量模式：IDF 隨書籤增刪即時更新，新詞彙使用預留的特徵槽位，不需整體重新訓練
+VECTORIZER_INCREMENTAL = _get_bool("VECTORIZER_INCREMENTAL", False)
+
+# 增量模式下為新詞彙預留的特徵槽位（訓練時詞彙數的比例）
+VECTORIZER_FEATURE_RESERVE = _get_float("VECTORIZER_FEATURE_RESERVE", 0.2)
+
+# 向量化模式："vocabulary"（訓練詞彙表）或 "hashing"（特徵雜湊，不需訓練）
+VECTORIZER_MODE = _get_str("VECTORIZER_MODE", "vocabulary").lower()
+
+# 雜湊模式的特徵維度為 2^VECTORIZER_HASH_BITS
+VECTORIZER_HASH_BITS = _get_int("VECTORIZER_HASH_BITS", 18)
+
+# 大於 0 時以 TruncatedSVD 訓練此維度的 LSA 投影，相似度改以潛在語義空間計算（僅詞彙表模式）
+VECTORIZER_LSA_COMPONENTS = _get_int("VECTORIZER_LSA_COMPONENTS", 0)
+
+# 平行分詞的行程數，0 表示使用全部 CPU 核心，1 表示只在目前行程分詞
+TOKENIZER_WORKERS = _get_int("TOKENIZER_WORKERS", 0)
+
+# 每批交給分詞行程的文件數
+TOKENIZER_CHUNK_SIZE = _get_int("TOKENIZER_CHUNK_SIZE", 200)
+
+# 候選書籤來源："keyword"（只重新排序關鍵字命中）或 "hybrid"（另以查詢向量檢索整個語料）
+SEARCH_RETRIEVAL = _get_str("SEARCH_RETRIEVAL", "keyword").lower()
+
+# 混合檢索以 LSH 近似最近鄰索引產生語義候選（不再為整個語料計分）
+SEARCH_ANN = _get_bool("SEARCH_ANN", False)
+
+# LSH 雜湊表數、每表位元數與每表額外探測的鄰近桶數（表數與探測數越多召回率越高、延遲越長）
+ANN_TABLES = _get_int("ANN_TABLES", 16)
+ANN_BITS = _get_int("ANN_BITS", 8)
+ANN_PROBES = _get_int("ANN_PROBES", 2)
+
+# 每個書籤預先計算的相關書籤數量
+RELATED_NEIGHBORS = _get_int("RELATED_NEIGHBORS", 20)
+
+# 計算相關書籤時每次矩陣乘法的書籤數（記憶體用量為 區塊大小 × 書籤數 × 4 位元組）
+RELATED_BLOCK_SIZE = _get_int("RELATED_BLOCK_SIZE", 128)
+
+# 內容 SimHash 的漢明距離不超過此值時視為近似重複（0 表示只偵測內容完全相同的頁面）
+DEDUP_MAX_DISTANCE = _get_int("DEDUP_MAX_DISTANCE", 3)
+
+# 不重複詞彙少於此數的頁面不計算 SimHash（內容太短容易誤判）
+DEDUP_MIN_TOKENS = _get_int("DEDUP_MIN_TOKENS", 30)
+
+# 抓取網頁的共用連線池：總連線數、每個主機的連線數與 DNS 快取秒數
+FETCH_MAX_CONNECTIONS = _get_int("FETCH_MAX_CONNECTIONS", 100)
+FETCH_MAX_CONNECTIONS_PER_HOST = _get_int("FETCH_MAX_CONNECTIONS_PER_HOST", 4)
+FETCH_DNS_CACHE_TTL = _get_int("FETCH_DNS_CACHE_TTL", 300)
+
+# 單一頁面最多下載的位元組數（超過時只解析已下載的部分）
+FETCH_MAX_BYTES = _get_int("FETCH_MAX_BYTES", 5 * 1024 * 1024)
+
+# 網頁解析後端："html.parser"、"selectolax"、"lxml" 或 "auto"（依序使用已安裝的 selectolax、lxml）
+HTML_PARSER = _get_str("HTML_PARSER", "html.parser").lower()
+
+# 批量抓取（匯入書籤後的內容豐富化）：全局同時抓取數、每個主機的同時抓取數與請求間隔秒數
+CRAWL_CONCURRENCY = _get_int("CRAWL_CONCURRENCY", 32)
+CRAWL_PER_HOST = _get_int("CRAWL_PER_HOST", 2)
+CRAWL_HOST_DELAY = _get_float("CRAWL_HOST_DELAY", 0.5)
+
+# 暫時性錯誤（逾時、連線錯誤、429/5xx）的重試次數與指數退避的起始秒數
+CRAWL_RETRIES = _get_int("CRAWL_RETRIES", 3)
+CRAWL_BACKOFF = _get_float("CRAWL_BACKOFF", 1.0)
+
+# 抓取結果每批寫回資料庫的書籤數
+CRAWL_BATCH_SIZE = _get_int("CRAWL_BATCH_SIZE", 50)
+
+# 持久化工作佇列：工作者數量、租約秒數（工作者持續續約，崩潰後租約到期即由其他工作者接手）、
+# 最大嘗試次數與失敗重試的指數退避起始秒數
+JOB_WORKERS = _get_int("JOB_WORKERS", 2)
+JOB_LEASE_SECONDS = _get_int("JOB_LEASE_SECONDS", 60)
+JOB_MAX_ATTEMPTS = _get_int("JOB_MAX_ATTEMPTS", 3)
+JOB_RETRY_BACKOFF = _get_float("JOB_RETRY_BACKOFF", 10.0)
+
+# 搜尋結果快取的記憶體上限（位元組，以結果的 JSON 大小估計）
+SEARCH_CACHE_MAX_BYTES = _get_int("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024)
@@ -1,13 +1,23 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.bookmarks import content_enricher
 from app.api.bookmarks import router as bookmarks_router
+from app.api.jobs import router as jobs_router
 from app.api.search import router as search_router
-from app.models.database import create_tables
-from app.services.tfidf_vectorizer import train_vectorizer_if_needed
+from app.models.database import SessionLocal, create_tables
+from app.services.dedup import rebuild_duplicate_index
+from app.services.inverted_index import sync_document_frequencies
+from app.services.job_queue import get_job_queue
+from app.services.neighbor_graph import refresh_neighbors_task
+from app.services.retraining import finish_interrupted_swap
+from app.services.tfidf_vectorizer import get_vectorizer, load_vectorizer
+from app.services.tokenizer import shutdown_pool
+from app.services.vector_index import rebuild_vector_index, save_ann_index
 
 # 設定日誌記錄
 logging.basicConfig(
@@ -19,9 +29,32 @@ logging.basicConfig(
 async def lifespan(app):
     # 啟動時執行的初始化程式碼
     create_tables()  # 啟動時自動建立資料表
-    train_vectorizer_if_needed()  # 啟動時訓練 TF-IDF 模型
+    # 啟動時只載入 TF-IDF 模型檔，模型過期時由背景工作重新訓練（期間以已存檔的模型提供服務）
+    pending_job = load_vectorizer()
+    finish_interrupted_swap()  # 完成或捨棄上次中斷的藍綠切換
+    if get_vectorizer().uses_live_idf:
+        sync_document_frequencies()  # 查詢端 IDF 由倒排索引的文件頻率計算
+    if pending_job:
+        # 藍綠重新訓練（retrain）或以目前模型重新產生所有書籤向量（batch_vectorize）
+        db = SessionLocal()
+        try:
+            get_job_queue().enqueue(db, pending_job, unique=True)
+        finally:
+            db.close()
+    rebuild_vector_index()  # 啟動時載入書籤向量索引
+    rebuild_duplicate_index()  # 載入原始書籤的內容 SimHash
+    # 在背景重算向量在上次關閉後改變的書籤的相關書籤
+    asyncio.get_running_loop().run_in_executor(None, refresh_neighbors_task)
+    # 網頁抓取共用的 HTTP session（綁定應用程式的事件迴圈）
+    await content_enricher.open_session()
+    # 啟動工作者，繼續執行上次關閉時未完成的工作
+    await get_job_queue().start()
     yield
     # 關閉時執行的清理程式碼
+    await get_job_queue().stop()
+    await content_enricher.close_session()
+    shutdown_pool()  # 結束平行分詞的工作行程
+    save_ann_index()  # 保存 LSH 桶編號，下次啟動時不需重新投影
 
 
 app = FastAPI(
@@ -44,6 +77,7 @@ app.add_middleware(
 # 註冊路由
 app.include_router(bookmarks_router, prefix="/api/v1", tags=["bookmarks"])
 app.include_router(search_router, prefix="/api/v1/search", tags=["search"])
+app.include_router(jobs_router, prefix="/api/v1", tags=["jobs"])
 
 
 @app.get("/")
@@ -1,20 +1,36 @@
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
 
 from sqlalchemy import (  # noqa: F401
     JSON,
     Column,
     DateTime,
     Float,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     create_engine,
+    event,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from app.models import fts
 
 DATABASE_URL = "sqlite:///./bookmarks.db"
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+
+@event.listens_for(engine, "connect")
+def _enable_wal(dbapi_connection, connection_record) -> None:
+    # WAL 模式下長時間的串流讀取（yield_per）不會阻擋其他連線寫入
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -38,7 +54,130 @@ class Bookmark(Base):
     )
     access_count = Column(Integer, default=0)
     last_accessed = Column(DateTime)
-    tfidf_vector = Column(Text)  # JSON 字符串，存儲 TF-IDF 向量
+    # 二進位編碼的稀疏 TF-IDF 向量（格式見 app/services/vector_codec.py）
+    tfidf_vector = Column("tfidf_vector_blob", LargeBinary)
+    # 重新訓練期間由新模型產生的影子向量，模型切換時才取代 tfidf_vector
+    tfidf_vector_next = Column(LargeBinary)
+    # 去除追蹤參數等變體的正規化 URL（見 app/services/dedup.py）
+    canonical_url = Column(String, index=True)
+    # 內容的 64 位元 SimHash（以有號整數保存）
+    content_simhash = Column(Integer)
+    # 近似重複時指向原始書籤，重複書籤不產生向量
+    duplicate_of = Column(Integer, index=True)
+
+
+# 建立 bookmarks 資料表時一併建立 FTS5 索引與同步觸發器
+fts.attach_to_table(Bookmark.__table__)
+
+
+class BookmarkTerm(Base):
+    """倒排索引：分詞後的詞彙 -> 書籤 ID 的 postings"""
+
+    __tablename__ = "bookmark_terms"
+
+    term = Column(String, primary_key=True)  # 主鍵 (term, bookmark_id) 即為依詞彙查詢的索引
+    bookmark_id = Column(Integer, primary_key=True, index=True)
+    term_frequency = Column(Integer, nullable=False, default=1)
+
+
+class BookmarkTokens(Base):
+    """書籤各欄位的分詞結果，以內容雜湊判斷是否仍對應目前的書籤內容"""
+
+    __tablename__ = "bookmark_tokens"
+
+    bookmark_id = Column(Integer, primary_key=True)
+    content_hash = Column(String, nullable=False)  # 書籤文字欄位與分詞規則版本的雜湊
+    # 以空白連接的詞彙（保留原始大小寫）
+    title = Column(Text, nullable=False, default="")
+    description = Column(Text, nullable=False, default="")
+    content = Column(Text, nullable=False, default="")
+    keywords = Column(Text, nullable=False, default="")
+
+
+class BookmarkNeighbor(Base):
+    """預先計算的相關書籤：每個書籤相似度最高的 k 個書籤"""
+
+    __tablename__ = "bookmark_neighbors"
+
+    bookmark_id = Column(Integer, primary_key=True)
+    neighbor_id = Column(Integer, primary_key=True, index=True)  # 依相關書籤反查，向量改變時需重算
+    rank = Column(Integer, nullable=False)
+    similarity = Column(Float, nullable=False)
+
+
+class BookmarkNeighborState(Base):
+    """相關書籤的計算狀態，以向量雜湊判斷是否仍對應目前的書籤向量"""
+
+    __tablename__ = "bookmark_neighbor_state"
+
+    bookmark_id = Column(Integer, primary_key=True)
+    vector_hash = Column(String, nullable=False)
+    # 第 k 名的相似度（不足 k 個時為 0），其他書籤的相似度超過此值時需重算
+    kth_similarity = Column(Float, nullable=False, default=0.0)
+
+
+class BookmarkPage(Base):
+    """書籤網頁的原始 HTML 快取（壓縮）與回應的快取驗證標頭，供條件式重新抓取與離線重新解析"""
+
+    __tablename__ = "bookmark_pages"
+
+    bookmark_id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)  # 抓取時的 URL，URL 改變時不送出條件式請求
+    etag = Column(String)
+    last_modified = Column(String)
+    html = Column(LargeBinary, nullable=False)  # zlib 壓縮的 UTF-8 HTML
+    html_hash = Column(String, nullable=False)  # 未壓縮 HTML 的雜湊，內容相同的 200 回應也略過解析
+    raw_size = Column(Integer, nullable=False, default=0)
+    fetched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    checked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class Job(Base):
+    """持久化工作佇列：背景工作在服務重啟後仍會執行，失敗原因保存在 last_error"""
+
+    __tablename__ = "jobs"
+    # 工作者依 (state, run_at) 取得下一個可執行的工作
+    __table_args__ = (Index("ix_jobs_state_run_at", "state", "run_at"),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False, index=True)
+    payload = Column(JSON, nullable=False, default=dict)
+    # pending / running / succeeded / failed
+    state = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    # 執行中工作的租約：持有者崩潰、租約到期後可由其他工作者取得
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    result = Column(JSON)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime, index=True)
+
+
+def get_data_dir() -> Path:
+    """資料庫檔案所在目錄（模型檔等衍生資料與資料庫放在一起）"""
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return Path.cwd()
+    return Path(database).resolve().parent
+
+
+@contextmanager
+def streaming_session():
+    """
+    建立綁定單一連線的 Session，供以 yield_per 串流讀取並分批提交的背景任務使用
+
+    提交時連線不會歸還連線池，串流中的游標在批次之間持續有效，也不會被其他執行緒取用。
+    """
+    with engine.connect() as connection:
+        db = SessionLocal(bind=connection)
+        try:
+            yield db
+        finally:
+            db.close()
 
 
 def get_db():
@@ -49,6 +188,17 @@ def get_db():
         db.close()
 
 
+def get_session_factory() -> Callable[[], Session]:
+    """
+    建立資料庫 Session 的函式，供生命週期不隨單一請求結束的工作自行開啟與關閉 Session
+    （例如多個請求共用的搜尋計算）
+    """
+    return SessionLocal
+
+
 # 建立所有表
 def create_tables():
+    from app.models.migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
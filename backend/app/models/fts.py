@@ -0,0 +1,105 @@
+"""
+SQLite FTS5 全文索引
+bookmarks_fts 虛擬表存放以 jieba 預先分詞的書籤文字，由觸發器與 bookmarks 資料表保持同步
+
+只在 KEYWORD_ENGINE 為 "fts5" 時建立：觸發器在每次寫入時呼叫 Python 分詞函數，
+沒有註冊該函數的連線（例如 sqlite3 命令列）無法寫入 bookmarks。
+"""
+
+import sqlite3
+from typing import List, Optional
+
+import jieba
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import config
+
+FTS_TABLE = "bookmarks_fts"
+
+# 觸發器呼叫的 Python 分詞函數，每個 SQLite 連線建立時註冊
+SEGMENT_FUNCTION = "jieba_segment"
+
+_FTS_COLUMNS = ("title", "description", "content", "keywords")
+
+_NEW_ROW_VALUES = ", ".join(f"{SEGMENT_FUNCTION}(new.{column})" for column in _FTS_COLUMNS)
+
+FTS_DDL: List[str] = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5({", ".join(_FTS_COLUMNS)}, tokenize = 'unicode61')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(_FTS_COLUMNS)})
+        VALUES (new.id, {_NEW_ROW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au
+    AFTER UPDATE OF {", ".join(_FTS_COLUMNS)} ON bookmarks BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(_FTS_COLUMNS)})
+        VALUES (new.id, {_NEW_ROW_VALUES});
+    END
+    """,
+]
+
+FTS_DROP_DDL: List[str] = [
+    "DROP TRIGGER IF EXISTS bookmarks_fts_ai",
+    "DROP TRIGGER IF EXISTS bookmarks_fts_ad",
+    "DROP TRIGGER IF EXISTS bookmarks_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+FTS_BACKFILL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, {", ".join(_FTS_COLUMNS)})
+    SELECT id, {", ".join(f"{SEGMENT_FUNCTION}({column})" for column in _FTS_COLUMNS)}
+    FROM bookmarks
+"""
+
+
+def segment_for_fts(value: Optional[str]) -> str:
+    """以 jieba 分詞並以空白連接，讓 FTS5 的 unicode61 分詞器能切出中文詞彙"""
+    if not value:
+        return ""
+    return " ".join(token for token in jieba.lcut(str(value).lower()) if token.strip())
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record) -> None:
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function(
+            SEGMENT_FUNCTION, 1, segment_for_fts, deterministic=True
+        )
+
+
+def create_fts_index(connection: Connection) -> None:
+    """建立 FTS5 虛擬表與同步觸發器（冪等）"""
+    for statement in FTS_DDL:
+        connection.execute(text(statement))
+
+
+def drop_fts_index(connection: Connection) -> None:
+    """移除 FTS5 虛擬表與同步觸發器（冪等）"""
+    for statement in FTS_DROP_DDL:
+        connection.execute(text(statement))
+
+
+def fts_enabled() -> bool:
+    """關鍵字檢索是否使用 FTS5 引擎"""
+    return config.KEYWORD_ENGINE == "fts5"
+
+
+def attach_to_table(table) -> None:
+    """在 bookmarks 資料表建立後一併建立 FTS5 索引（僅限 FTS5 引擎）"""
+
+    @event.listens_for(table, "after_create")
+    def _create_fts_index(target, connection, **kw) -> None:
+        if connection.dialect.name == "sqlite" and fts_enabled():
+            create_fts_index(connection)
@@ -0,0 +1,192 @@
+"""
+資料庫遷移
+create_all 只會建立不存在的資料表，既有資料表的結構變更在此以冪等的方式處理
+"""
+
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _column_names(engine: Engine, table: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def migrate_tfidf_vector_to_blob(engine: Engine, batch_size: int = 500) -> None:
+    """
+    將舊版 JSON 文字欄位 tfidf_vector 轉換為二進位欄位 tfidf_vector_blob
+
+    轉換完成後移除舊欄位並執行 VACUUM 回收空間。
+    """
+    from app.services.vector_codec import convert_legacy_json
+
+    columns = _column_names(engine, "bookmarks")
+    if "tfidf_vector" not in columns:
+        return
+
+    logger.info("Migrating bookmarks.tfidf_vector from JSON text to packed binary...")
+    with engine.begin() as conn:
+        if "tfidf_vector_blob" not in columns:
+            conn.execute(text("ALTER TABLE bookmarks ADD COLUMN tfidf_vector_blob BLOB"))
+
+        converted = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                text(
+                    "SELECT id, tfidf_vector FROM bookmarks "
+                    "WHERE id > :last_id AND tfidf_vector IS NOT NULL AND tfidf_vector != '' "
+                    "AND tfidf_vector_blob IS NULL ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+
+            updates = []
+            for bookmark_id, vector_json in rows:
+                packed = convert_legacy_json(vector_json)
+                if packed is not None:
+                    updates.append({"id": bookmark_id, "blob": packed})
+            if updates:
+                conn.execute(
+                    text("UPDATE bookmarks SET tfidf_vector_blob = :blob WHERE id = :id"), updates
+                )
+            converted += len(updates)
+            last_id = rows[-1][0]
+
+        conn.execute(text("ALTER TABLE bookmarks DROP COLUMN tfidf_vector"))
+
+    # VACUUM 不能在交易中執行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+
+    logger.info(f"Migrated {converted} TF-IDF vectors to packed binary format")
+
+
+def add_shadow_vector_column(engine: Engine) -> None:
+    """新增重新訓練用的影子向量欄位 tfidf_vector_next"""
+    if "tfidf_vector_next" in _column_names(engine, "bookmarks"):
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE bookmarks ADD COLUMN tfidf_vector_next BLOB"))
+    logger.info("Added bookmarks.tfidf_vector_next column")
+
+
+def add_duplicate_columns(engine: Engine, batch_size: int = 500) -> None:
+    """新增重複偵測欄位（正規化 URL、內容 SimHash、duplicate_of）並回填正規化 URL"""
+    from app.services.dedup import canonicalize_url
+
+    columns = _column_names(engine, "bookmarks")
+    if {"canonical_url", "content_simhash", "duplicate_of"} <= columns:
+        return
+
+    with engine.begin() as conn:
+        if "canonical_url" not in columns:
+            conn.execute(text("ALTER TABLE bookmarks ADD COLUMN canonical_url VARCHAR"))
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_bookmarks_canonical_url "
+                    "ON bookmarks (canonical_url)"
+                )
+            )
+        if "content_simhash" not in columns:
+            conn.execute(text("ALTER TABLE bookmarks ADD COLUMN content_simhash INTEGER"))
+        if "duplicate_of" not in columns:
+            conn.execute(text("ALTER TABLE bookmarks ADD COLUMN duplicate_of INTEGER"))
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_bookmarks_duplicate_of "
+                    "ON bookmarks (duplicate_of)"
+                )
+            )
+
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                text(
+                    "SELECT id, url FROM bookmarks WHERE id > :last_id AND canonical_url IS NULL "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+            updates = [
+                {"id": bookmark_id, "canonical": canonicalize_url(url)} for bookmark_id, url in rows
+            ]
+            conn.execute(
+                text("UPDATE bookmarks SET canonical_url = :canonical WHERE id = :id"), updates
+            )
+            last_id = rows[-1][0]
+    logger.info("Added duplicate detection columns to bookmarks")
+
+
+def backfill_bookmark_terms(engine: Engine) -> None:
+    """為倒排索引建立前就已存在的書籤建立 postings"""
+    from sqlalchemy.orm import Session
+
+    from app.services.inverted_index import rebuild_inverted_index
+
+    if "bookmark_terms" not in inspect(engine).get_table_names():
+        return
+
+    with engine.connect() as conn:
+        has_terms = conn.execute(text("SELECT 1 FROM bookmark_terms LIMIT 1")).first()
+        has_bookmarks = conn.execute(text("SELECT 1 FROM bookmarks LIMIT 1")).first()
+    if has_terms or not has_bookmarks:
+        return
+
+    logger.info("Backfilling inverted index for existing bookmarks...")
+    with Session(bind=engine) as db:
+        rebuild_inverted_index(db)
+
+
+def ensure_fts_index(engine: Engine) -> None:
+    """
+    依 KEYWORD_ENGINE 同步 FTS5 索引
+
+    使用 FTS5 引擎時建立虛擬表與同步觸發器並匯入現有書籤，否則移除（改用倒排索引後
+    觸發器不再於每次寫入時分詞）。
+    """
+    from app.models.fts import (
+        FTS_BACKFILL,
+        FTS_TABLE,
+        create_fts_index,
+        drop_fts_index,
+        fts_enabled,
+    )
+
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        if not fts_enabled():
+            if exists:
+                drop_fts_index(conn)
+                logger.info("Dropped FTS5 index (KEYWORD_ENGINE is not fts5)")
+            return
+        create_fts_index(conn)
+        if not exists:
+            logger.info("Building FTS5 index for existing bookmarks...")
+            conn.execute(text(FTS_BACKFILL))
+
+
+def run_migrations(engine: Engine) -> None:
+    """依序執行所有遷移（每個遷移都必須是冪等的）"""
+    if "bookmarks" not in inspect(engine).get_table_names():
+        return
+
+    migrate_tfidf_vector_to_blob(engine)
+    add_shadow_vector_column(engine)
+    add_duplicate_columns(engine)
+    backfill_bookmark_terms(engine)
+    ensure_fts_index(engine)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict, HttpUrl
 
@@ -27,6 +27,7 @@ class BookmarkResponse(BookmarkBase):
     updated_at: datetime
     access_count: int
     last_accessed: Optional[datetime]
+    duplicate_of: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -43,6 +44,44 @@ class SearchResult(BaseModel):
     matched_keywords: List[str]
 
 
+class RelatedBookmark(BaseModel):
+    bookmark: BookmarkResponse
+    similarity: float
+
+
+class DuplicateGroup(BaseModel):
+    bookmark: BookmarkResponse
+    duplicates: List[BookmarkResponse]
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    state: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str]
+    result: Optional[Dict[str, Any]]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class JobQueueStats(BaseModel):
+    workers: int
+    depth: int  # 等待中與執行中的工作數
+    states: Dict[str, int]
+    pending_by_kind: Dict[str, int]
+    oldest_pending_seconds: Optional[float]
+    completed_last_minute: int
+    completed_last_hour: int
+    throughput_per_minute: float  # 最近一小時平均每分鐘完成的工作數
+    recent_failures: List[JobResponse]
+
+
 class AnalyzeUrlRequest(BaseModel):
     url: HttpUrl
 
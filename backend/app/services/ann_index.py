@@ -0,0 +1,243 @@
+"""
+近似最近鄰索引
+以隨機超平面 LSH（SimHash）將書籤向量分桶，搜尋時只重新計分查詢所在桶內的書籤
+
+每個雜湊表以 bits 個隨機超平面的正負號組成桶編號；增加雜湊表數（tables）或
+探測鄰近桶（probes，翻轉最接近超平面的位元）可提高召回率，增加位元數則減少候選數量。
+輸入可以是 TF-IDF 稀疏向量（特徵數過大時以取餘數摺疊）或 LSA 嵌入。
+"""
+
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+ANN_FILENAME = "ann_index.npz"
+
+# 稀疏向量的特徵數超過此值時以取餘數摺疊，限制超平面矩陣的大小
+MAX_PLANE_DIMENSIONS = 1 << 15
+
+Vectors = Union[sparse.csr_matrix, np.ndarray]
+
+
+class LSHIndex:
+    """隨機超平面 LSH 索引：bookmark_id -> 各雜湊表的桶編號"""
+
+    def __init__(self, tables: int = 16, bits: int = 8, probes: int = 2, seed: int = 42):
+        """
+        初始化 LSH 索引
+
+        Args:
+            tables: 雜湊表數量
+            bits: 每個雜湊表的位元數（桶數為 2^bits）
+            probes: 每個雜湊表額外探測的鄰近桶數
+            seed: 產生超平面的亂數種子
+        """
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes
+        self.seed = seed
+        self.dimensions = 0
+        self.recall_at_k: Optional[Dict[str, float]] = None  # 最近一次量測的召回率
+
+        self._planes = np.empty((0, 0), dtype=np.float32)
+        self._weights = (1 << np.arange(bits, dtype=np.int64))[::-1]
+        self._codes: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(tables)]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def _ensure_planes(self, vectors: Vectors) -> None:
+        """
+        依輸入產生超平面
+
+        稀疏向量的特徵數之後增加時以取餘數摺疊，不重新產生；
+        只有密集向量（LSA 嵌入）的維度改變時才重新產生並捨棄所有已分桶的書籤。
+        """
+        dimensions = vectors.shape[-1]
+        if self.dimensions and (sparse.issparse(vectors) or dimensions == self.dimensions):
+            return
+        self._reset(min(dimensions, MAX_PLANE_DIMENSIONS))
+
+    def _reset(self, dimensions: int) -> None:
+        """以固定的亂數種子產生超平面並清空索引"""
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((dimensions, self.tables * self.bits)).astype(
+            np.float32
+        )
+        self.dimensions = dimensions
+        self._codes.clear()
+        self._buckets = [defaultdict(set) for _ in range(self.tables)]
+
+    def _project(self, vectors: Vectors) -> np.ndarray:
+        """將向量投影到所有超平面，返回 (列數, 雜湊表數, 位元數)"""
+        if sparse.issparse(vectors):
+            vectors = sparse.csr_matrix(vectors)
+            if vectors.shape[1] != self.dimensions:
+                vectors = sparse.csr_matrix(
+                    (vectors.data, vectors.indices % self.dimensions, vectors.indptr),
+                    shape=(vectors.shape[0], self.dimensions),
+                )
+            projections = np.asarray(vectors @ self._planes)
+        else:
+            projections = np.asarray(vectors, dtype=np.float32) @ self._planes
+        return projections.reshape(-1, self.tables, self.bits)
+
+    def _codes_of(self, projections: np.ndarray) -> np.ndarray:
+        return (projections > 0).astype(np.int64) @ self._weights
+
+    def build(self, bookmark_ids: Sequence[int], vectors: Vectors) -> None:
+        """
+        同步索引內容：移除不在 bookmark_ids 中的書籤，只為尚未分桶的書籤計算桶編號
+
+        已分桶的書籤沿用原本的桶編號（向量改變時由 insert 更新），
+        因此重建向量索引或由磁碟載入後不需重新投影整個語料。
+
+        Args:
+            bookmark_ids: 所有書籤 ID（與 vectors 的列對應）
+            vectors: 書籤向量（CSR 稀疏矩陣或密集陣列）
+        """
+        self._ensure_planes(vectors)
+        wanted = set(bookmark_ids)
+        for bookmark_id in [bid for bid in self._codes if bid not in wanted]:
+            self.remove(bookmark_id)
+
+        missing = [row for row, bid in enumerate(bookmark_ids) if bid not in self._codes]
+        if not missing:
+            return
+        codes = self._codes_of(self._project(vectors[np.asarray(missing, dtype=np.int64)]))
+        for row, row_codes in zip(missing, codes):
+            self._add(int(bookmark_ids[row]), row_codes)
+        logger.info(f"LSH index assigned buckets for {len(missing)} of {len(wanted)} vectors")
+
+    def insert(self, bookmark_id: int, vector: Vectors) -> None:
+        """新增或更新單一書籤（vector 為單列的稀疏矩陣或一維陣列）"""
+        self.remove(bookmark_id)
+        if self.dimensions == 0:
+            self._ensure_planes(vector)
+        self._add(bookmark_id, self._codes_of(self._project(vector.reshape(1, -1)))[0])
+
+    def remove(self, bookmark_id: int) -> None:
+        """將書籤移出索引"""
+        codes = self._codes.pop(bookmark_id, None)
+        if codes is None:
+            return
+        for table, code in enumerate(codes.tolist()):
+            bucket = self._buckets[table].get(code)
+            if bucket is not None:
+                bucket.discard(bookmark_id)
+                if not bucket:
+                    del self._buckets[table][code]
+
+    def candidates(self, query: Vectors) -> Set[int]:
+        """
+        取得與查詢落在相同或鄰近桶的書籤
+
+        Args:
+            query: 單列的稀疏矩陣或一維陣列
+
+        Returns:
+            候選書籤 ID
+        """
+        if self.dimensions == 0:
+            return set()
+        projections = self._project(query.reshape(1, -1))[0]
+        codes = self._codes_of(projections[np.newaxis])[0]
+        # 多重探測：翻轉每個雜湊表中最接近超平面（投影絕對值最小）的位元
+        nearest_bits = np.argsort(np.abs(projections), axis=1)[:, : self.probes]
+
+        found: Set[int] = set()
+        for table in range(self.tables):
+            buckets = self._buckets[table]
+            code = int(codes[table])
+            found.update(buckets.get(code, ()))
+            for bit in nearest_bits[table]:
+                found.update(buckets.get(code ^ int(self._weights[bit]), ()))
+        return found
+
+    def save(self, path: Path, metadata: Dict[str, Any]) -> None:
+        """
+        將桶編號存檔（超平面由亂數種子與維度重新產生，不需存檔）
+
+        Args:
+            path: 檔案路徑
+            metadata: 判斷存檔是否仍適用的資訊（例如模型版本與語料指紋）
+        """
+        bookmark_ids = np.fromiter(self._codes, dtype=np.int64, count=len(self._codes))
+        codes = (
+            np.stack([self._codes[bid] for bid in bookmark_ids.tolist()])
+            if len(bookmark_ids)
+            else np.empty((0, self.tables), dtype=np.int64)
+        )
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, "wb") as f:
+            np.savez(
+                f,
+                params=np.array([self.tables, self.bits, self.seed], dtype=np.int64),
+                metadata=np.array(sorted(f"{key}={value}" for key, value in metadata.items())),
+                dimensions=np.int64(self.dimensions),
+                bookmark_ids=bookmark_ids,
+                codes=codes,
+            )
+        os.replace(temporary, path)
+        logger.info(f"LSH index with {len(bookmark_ids)} vectors saved to {path}")
+
+    def load(self, path: Path, metadata: Dict[str, Any]) -> bool:
+        """
+        載入存檔的桶編號（參數或 metadata 不符時不載入）
+
+        Returns:
+            是否已載入
+        """
+        if not path.exists():
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                params = saved["params"].tolist()
+                saved_metadata = saved["metadata"].tolist()
+                dimensions = int(saved["dimensions"])
+                bookmark_ids = saved["bookmark_ids"]
+                codes = saved["codes"]
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Failed to load LSH index from {path}: {e}")
+            return False
+
+        expected = sorted(f"{key}={value}" for key, value in metadata.items())
+        if params != [self.tables, self.bits, self.seed] or saved_metadata != expected:
+            logger.info("Saved LSH index does not match the current model or corpus")
+            return False
+
+        # 超平面由亂數種子與維度決定，不需存檔
+        self._reset(dimensions)
+        for bookmark_id, row_codes in zip(bookmark_ids.tolist(), codes):
+            self._add(bookmark_id, row_codes)
+        logger.info(f"LSH index with {len(bookmark_ids)} vectors loaded from {path}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """索引統計資訊"""
+        bucket_counts = [len(buckets) for buckets in self._buckets]
+        return {
+            "tables": self.tables,
+            "bits": self.bits,
+            "probes": self.probes,
+            "dimensions": self.dimensions,
+            "rows": len(self._codes),
+            "mean_bucket_size": (
+                len(self._codes) * self.tables / sum(bucket_counts) if sum(bucket_counts) else 0.0
+            ),
+            "recall_at_k": self.recall_at_k,
+        }
+
+    def _add(self, bookmark_id: int, codes: Iterable[int]) -> None:
+        codes = np.asarray(codes, dtype=np.int64)
+        self._codes[bookmark_id] = codes
+        for table, code in enumerate(codes.tolist()):
+            self._buckets[table][code].add(bookmark_id)
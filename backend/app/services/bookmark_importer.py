@@ -1,9 +1,27 @@
-from typing import IO, Dict, List
+import logging
+from typing import IO, Dict, List, Set
 
 from bs4 import BeautifulSoup
 from sqlalchemy.orm import Session
 
 from app.models.database import Bookmark
+from app.services.dedup import canonicalize_url
+from app.services.inverted_index import index_bookmark
+
+logger = logging.getLogger(__name__)
+
+# 每次 IN 查詢的 URL 數（低於 SQLite 的參數數量上限）
+_IN_CHUNK = 500
+
+
+def _existing_canonical_urls(db: Session, canonical_urls: List[str]) -> Set[str]:
+    """已存在的書籤中符合的正規化 URL"""
+    existing = set()
+    for start in range(0, len(canonical_urls), _IN_CHUNK):
+        chunk = canonical_urls[start : start + _IN_CHUNK]
+        rows = db.query(Bookmark.canonical_url).filter(Bookmark.canonical_url.in_(chunk))
+        existing.update(url for url, in rows)
+    return existing
 
 
 def parse_and_import_bookmarks(db: Session, file: IO[bytes]) -> List[Dict[str, any]]:
@@ -22,8 +40,9 @@ def parse_and_import_bookmarks(db: Session, file: IO[bytes]) -> List[Dict[str, a
         soup = BeautifulSoup(content, "html.parser")
         links = soup.find_all("a")
         
-        imported_count = 0
         new_bookmarks = []
+        seen = set()
+        skipped = 0
 
         for link in links:
             url = link.get("href")
@@ -32,19 +51,34 @@ def parse_and_import_bookmarks(db: Session, file: IO[bytes]) -> List[Dict[str, a
             if not url or not title:
                 continue
 
-            # 檢查 URL 是否已存在
-            exists = db.query(Bookmark).filter(Bookmark.url == url).first()
-            if not exists:
-                new_bookmark = Bookmark(
+            # 追蹤參數等 URL 變體視為同一書籤（檔案內重複或已存在的書籤都略過）
+            canonical_url = canonicalize_url(url)
+            if canonical_url in seen:
+                skipped += 1
+                continue
+            seen.add(canonical_url)
+            new_bookmarks.append(
+                Bookmark(
                     url=url,
+                    canonical_url=canonical_url,
                     title=title.strip(),
                     description=""
                 )
-                new_bookmarks.append(new_bookmark)
-        
+            )
+
+        existing = _existing_canonical_urls(db, [b.canonical_url for b in new_bookmarks])
+        if existing:
+            skipped += sum(b.canonical_url in existing for b in new_bookmarks)
+            new_bookmarks = [b for b in new_bookmarks if b.canonical_url not in existing]
+        if skipped:
+            logger.info(f"Skipped {skipped} duplicate URLs while importing bookmarks")
+
         imported_bookmarks = []
         if new_bookmarks:
             db.add_all(new_bookmarks)
+            db.flush()
+            for bookmark in new_bookmarks:
+                index_bookmark(db, bookmark)
             db.commit()
             for bookmark in new_bookmarks:
                 db.refresh(bookmark)  # 確保獲取到資料庫分配的 ID
@@ -55,5 +89,5 @@ def parse_and_import_bookmarks(db: Session, file: IO[bytes]) -> List[Dict[str, a
     except Exception as e:
         db.rollback()
         # 可以在這裡加入日誌記錄
-        print(f"Error importing bookmarks: {e}")
+        logger.error(f"Error importing bookmarks: {e}")
         raise e
@@ -1,15 +1,58 @@
 import asyncio
+import codecs
 import json
+import logging
 import re
-from typing import Dict, List, Optional
-from urllib.parse import urljoin, urlparse
+from collections import Counter
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
 
 import aiohttp
 import jieba
 import jieba.analyse
-from bs4 import BeautifulSoup
 
-from .tfidf_vectorizer import get_vectorizer
+from .html_parser import create_parser
+from .tfidf_vectorizer import TFIDFVectorizer, get_vectorizer
+from .token_cache import DocumentTokens, get_document_tokens, tokenize_documents
+from .tokenizer import segment
+
+logger = logging.getLogger(__name__)
+
+# 會下載並解析的內容類型（回應未提供 Content-Type 時視為 HTML；純文字網頁整頁作為正文）
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# 串流讀取回應的區塊大小
+FETCH_CHUNK_SIZE = 64 * 1024
+
+# 回應未指定編碼時，由頁面開頭的 <meta charset> 判斷
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+class FetchedPage(NamedTuple):
+    """抓取結果與回應的快取驗證標頭"""
+
+    status: int
+    html: Optional[str]  # 狀態碼不是 200 或內容不是 HTML 時為 None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    skipped: Optional[str] = None  # 狀態碼 200 但未下載內容的原因（例如不是 HTML）
+
+
+def decode_body(body: bytes, charset: Optional[str]) -> str:
+    """
+    依回應標頭或 <meta charset> 解碼網頁（皆未指定或編碼不明時使用 UTF-8）
+
+    內容可能因大小上限而截斷在多位元組字元中間，無法解碼的位元組以替代字元取代。
+    """
+    if not charset:
+        match = _META_CHARSET.search(body[:4096])
+        charset = match.group(1).decode("ascii") if match else None
+    try:
+        encoding = codecs.lookup(charset).name if charset else "utf-8"
+    except LookupError:
+        encoding = "utf-8"
+    return body.decode(encoding, errors="replace")
 
 
 class ContentEnricher:
@@ -18,6 +61,10 @@ class ContentEnricher:
         # 設定請求超時時間
         self.timeout = aiohttp.ClientTimeout(total=30)
 
+        # 長期共用的 HTTP session（由 FastAPI lifespan 開啟與關閉），
+        # TCP/TLS 連線與 DNS 結果可重複使用
+        self._session: Optional[aiohttp.ClientSession] = None
+
         # 設定請求標頭，模擬瀏覽器
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -27,6 +74,13 @@ class ContentEnricher:
             "Connection": "keep-alive",
         }
 
+        from app import config
+
+        # 單一頁面最多下載的位元組數，超過時只解析已下載的部分
+        self.max_bytes = config.FETCH_MAX_BYTES
+        # 網頁解析後端（見 html_parser.py）
+        self.parser = create_parser(config.HTML_PARSER)
+
         # 初始化 jieba 分詞器
         jieba.initialize()
 
@@ -69,6 +123,49 @@ class ContentEnricher:
             ]
         )
 
+    async def open_session(self) -> None:
+        """
+        開啟共用的 HTTP session
+
+        session 綁定呼叫時的事件迴圈，需在之後抓取網頁的事件迴圈中呼叫（應用程式啟動時）。
+        """
+        if self._session is not None and not self._session.closed:
+            return
+
+        from app import config
+
+        connector = aiohttp.TCPConnector(
+            limit=config.FETCH_MAX_CONNECTIONS,
+            limit_per_host=config.FETCH_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=config.FETCH_DNS_CACHE_TTL,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers=self.headers,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+
+    async def close_session(self) -> None:
+        """關閉共用的 HTTP session 與其連線池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """
+        共用 session 已開啟時使用共用 session，
+        否則（例如在 lifespan 之外使用）建立單次的 session
+        """
+        if self._session is not None and not self._session.closed:
+            yield self._session
+            return
+        async with aiohttp.ClientSession(
+            timeout=self.timeout, cookie_jar=aiohttp.CookieJar(unsafe=True)
+        ) as session:
+            yield session
+
     async def extract_content(self, url: str) -> Optional[Dict[str, any]]:
         """
         從網頁抓取並處理內容
@@ -85,40 +182,104 @@ class ContentEnricher:
             if not html_content:
                 return None
 
-            # 解析 HTML
-            soup = BeautifulSoup(html_content, "html.parser")
+            # 解析、分詞與向量化是 CPU 密集的工作，在執行緒中進行，不阻塞事件迴圈的其他抓取
+            return await asyncio.to_thread(self.process_page, html_content, url)
 
-            # 提取基本資訊
-            title = self._extract_title(soup)
-            description = self._extract_description(soup)
-            image_url = self._extract_image_url(soup, url)
-            content = self._extract_main_content(soup)
+        except Exception as e:
+            logger.error(f"Error extracting content from {url}: {str(e)}")
+            return None
 
-            # 清理內容文字
-            clean_content = self._clean_text(content)
+    def process_page(self, html_content: str, url: str) -> Dict[str, any]:
+        """
+        解析網頁並產生內容、關鍵字、摘要與 TF-IDF 向量
 
-            # 提取關鍵字
-            keywords = self.extract_keywords(clean_content)
+        Args:
+            html_content: 網頁 HTML 內容
+            url: 網頁 URL（解析相對路徑用）
 
-            # 生成摘要
-            summary = self.generate_summary(clean_content)
+        Returns:
+            包含處理後內容的字典
+        """
+        # 解析 HTML，提取基本資訊與正文
+        title, description, image_url, content = self.parser.parse(html_content, url)
 
-            # 生成 TF-IDF 向量
-            tfidf_vector = self.generate_tfidf_vector(title, description, clean_content, keywords)
+        # 清理內容文字
+        clean_content = self._clean_text(content)
 
-            return {
-                "title": title,
-                "description": description or summary,  # 如果沒有 description，使用摘要
-                "image_url": image_url,
-                "content": clean_content,
-                "keywords": keywords,  # 直接返回列表
-                "summary": summary,
-                "tfidf_vector": tfidf_vector,
-            }
+        # 內容只分詞一次，關鍵字、摘要與向量共用
+        content_tokens = segment(clean_content)
 
-        except Exception as e:
-            print(f"Error extracting content from {url}: {str(e)}")
-            return None
+        # 提取關鍵字
+        keywords = self.extract_keywords(clean_content, tokens=content_tokens)
+
+        # 生成摘要
+        summary = self.generate_summary(clean_content, tokens=content_tokens)
+
+        # 生成 TF-IDF 向量
+        fields = SimpleNamespace(
+            title=title, description=description, content="", keywords=keywords
+        )
+        document = tokenize_documents([fields], {0: content_tokens})[0]
+        tfidf_vector = self.generate_tfidf_vector_from_tokens(document)
+
+        return {
+            "title": title,
+            "description": description or summary,  # 如果沒有 description，使用摘要
+            "image_url": image_url,
+            "content": clean_content,
+            "keywords": keywords,  # 直接返回列表
+            "summary": summary,
+            "tfidf_vector": tfidf_vector,
+            "content_tokens": content_tokens,  # 供寫入 token_cache，不需重新分詞
+        }
+
+    async def fetch(
+        self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> FetchedPage:
+        """
+        抓取網頁（逾時與連線錯誤直接拋出，由呼叫者決定是否重試）
+
+        提供上次回應的 ETag 或 Last-Modified 時送出條件式請求，頁面未改變時伺服器回應 304。
+        回應以串流讀取，最多下載 max_bytes 位元組；Content-Type 不是 HTML 時不下載內容。
+
+        Args:
+            url: 要抓取的網頁 URL
+            etag: 上次回應的 ETag
+            last_modified: 上次回應的 Last-Modified
+
+        Returns:
+            HTTP 狀態碼、網頁 HTML 內容與回應的快取驗證標頭
+        """
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        async with self._client() as session:
+            async with session.get(url, headers=headers) as response:
+                page = FetchedPage(
+                    response.status,
+                    None,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                )
+                if response.status != 200:
+                    return page
+                if (
+                    "Content-Type" in response.headers
+                    and response.content_type not in HTML_CONTENT_TYPES
+                ):
+                    # 不下載 PDF、圖片等內容，連線直接關閉
+                    reason = f"Unsupported content type {response.content_type}"
+                    return page._replace(skipped=reason)
+
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+                    body.extend(chunk[: self.max_bytes - len(body)])
+                    if len(body) >= self.max_bytes:
+                        logger.info(f"Truncated {url} at {self.max_bytes} bytes")
+                        break
+                return page._replace(html=decode_body(bytes(body), response.charset))
 
     async def _fetch_page(self, url: str) -> Optional[str]:
         """
@@ -131,118 +292,19 @@ class ContentEnricher:
             網頁 HTML 內容，或 None（如果抓取失敗）
         """
         try:
-            async with aiohttp.ClientSession(
-                timeout=self.timeout, cookie_jar=aiohttp.CookieJar(unsafe=True)
-            ) as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        # 自動偵測編碼
-                        text = await response.text()
-                        return text
-                    else:
-                        print(f"Failed to fetch {url}: HTTP {response.status}")
-                        return None
+            page = await self.fetch(url)
+            if page.status != 200:
+                logger.warning(f"Failed to fetch {url}: HTTP {page.status}")
+            elif page.skipped:
+                logger.info(f"Skipped {url}: {page.skipped}")
+            return page.html
         except asyncio.TimeoutError:
-            print(f"Timeout fetching {url}")
+            logger.warning(f"Timeout fetching {url}")
             return None
         except Exception as e:
-            print(f"Error fetching {url}: {str(e)}")
+            logger.error(f"Error fetching {url}: {str(e)}")
             return None
 
-    def _extract_title(self, soup: BeautifulSoup) -> str:
-        """提取網頁標題"""
-        # 優先使用 og:title
-        og_title = soup.find("meta", property="og:title")
-        if og_title and og_title.get("content"):
-            return og_title["content"].strip()
-
-        # 其次使用 title 標籤
-        title_tag = soup.find("title")
-        if title_tag:
-            return title_tag.text.strip()
-
-        # 最後使用 h1 標籤
-        h1_tag = soup.find("h1")
-        if h1_tag:
-            return h1_tag.text.strip()
-
-        return "無標題"
-
-    def _extract_description(self, soup: BeautifulSoup) -> Optional[str]:
-        """提取網頁描述"""
-        # 優先使用 og:description
-        og_desc = soup.find("meta", property="og:description")
-        if og_desc and og_desc.get("content"):
-            return og_desc["content"].strip()
-
-        # 其次使用 meta description
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        if meta_desc and meta_desc.get("content"):
-            return meta_desc["content"].strip()
-
-        return None
-
-    def _extract_image_url(self, soup: BeautifulSoup, base_url: str) -> Optional[str]:
-        """提取網頁的代表性圖片 URL"""
-        # 1. 優先使用 og:image
-        og_image = soup.find("meta", property="og:image")
-        if og_image and og_image.get("content"):
-            return urljoin(base_url, og_image["content"])
-
-        # 2. 其次使用 twitter:image
-        twitter_image = soup.find("meta", attrs={"name": "twitter:image"})
-        if twitter_image and twitter_image.get("content"):
-            return urljoin(base_url, twitter_image["content"])
-
-        # 3. 接著使用 <link rel="image_src">
-        image_src_link = soup.find("link", rel="image_src")
-        if image_src_link and image_src_link.get("href"):
-            return urljoin(base_url, image_src_link["href"])
-
-        # 4. 最後嘗試尋找 favicon
-        apple_touch_icon = soup.find("link", rel="apple-touch-icon")
-        if apple_touch_icon and apple_touch_icon.get("href"):
-            return urljoin(base_url, apple_touch_icon["href"])
-
-        favicon_link = soup.find("link", rel="icon")
-        if favicon_link and favicon_link.get("href"):
-            return urljoin(base_url, favicon_link["href"])
-
-        shortcut_icon = soup.find("link", rel="shortcut icon")
-        if shortcut_icon and shortcut_icon.get("href"):
-            return urljoin(base_url, shortcut_icon["href"])
-
-        return None
-
-    def _extract_main_content(self, soup: BeautifulSoup) -> str:
-        """
-        提取網頁主要內容
-
-        使用啟發式方法提取可能是正文的內容
-        """
-        # 移除不需要的標籤
-        for tag in soup(["script", "style", "nav", "header", "footer", "aside"]):
-            tag.decompose()
-
-        # 優先尋找文章標籤
-        article = soup.find("article")
-        if article:
-            return article.get_text(strip=True, separator=" ")
-
-        # 尋找主要內容區域
-        main_content = soup.find("main") or soup.find(
-            "div", class_=re.compile("content|article|post|entry")
-        )
-        if main_content:
-            return main_content.get_text(strip=True, separator=" ")
-
-        # 最後使用 body 內容
-        body = soup.find("body")
-        if body:
-            return body.get_text(strip=True, separator=" ")
-
-        return soup.get_text(strip=True, separator=" ")
-
     def _clean_text(self, text: str) -> str:
         """清理文字內容"""  # 移除多餘的空白
         text = re.sub(r"\s+", " ", text)
@@ -258,13 +320,16 @@ class ContentEnricher:
 
         return text.strip()
 
-    def extract_keywords(self, text: str, top_k: int = 10) -> List[str]:
+    def extract_keywords(
+        self, text: str, top_k: int = 10, tokens: Optional[List[str]] = None
+    ) -> List[str]:
         """
         提取關鍵字
 
         Args:
             text: 要分析的文字
             top_k: 要提取的關鍵字數量
+            tokens: text 的分詞結果，提供時不重新分詞
 
         Returns:
             關鍵字列表
@@ -272,20 +337,39 @@ class ContentEnricher:
         if not text:
             return []
 
-        # 使用 jieba 的 TF-IDF 算法提取關鍵字
-        keywords = jieba.analyse.extract_tags(text, topK=top_k, withWeight=False)
+        if tokens is None:
+            # 使用 jieba 的 TF-IDF 算法提取關鍵字
+            keywords = jieba.analyse.extract_tags(text, topK=top_k, withWeight=False)
+        else:
+            keywords = self._rank_keywords(tokens, top_k)
         # 過濾停用詞
         keywords = [k for k in keywords if k not in self.stop_words and len(k) > 1]
 
         return keywords
 
-    def generate_summary(self, text: str, max_sentences: int = 3) -> str:
+    def _rank_keywords(self, tokens: List[str], top_k: int) -> List[str]:
+        """以已分詞的結果計算與 jieba.analyse.extract_tags 相同的 TF-IDF 排序"""
+        tfidf = jieba.analyse.default_tfidf
+        freq = Counter(token for token in tokens if token.lower() not in tfidf.stop_words)
+        total = sum(freq.values())
+        if total == 0:
+            return []
+        scores = {
+            word: count * tfidf.idf_freq.get(word, tfidf.median_idf) / total
+            for word, count in freq.items()
+        }
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+
+    def generate_summary(
+        self, text: str, max_sentences: int = 3, tokens: Optional[List[str]] = None
+    ) -> str:
         """
         生成摘要
 
         Args:
             text: 要生成摘要的文字
             max_sentences: 摘要的最大句數
+            tokens: text 的分詞結果，提供時詞頻直接由分詞結果統計
 
         Returns:
             摘要文字
@@ -304,19 +388,20 @@ class ContentEnricher:
         if len(sentences) <= max_sentences:
             return "。".join(sentences) + "。"
         # 計算每個句子的重要性分數
-        # 使用簡單的詞頻統計
+        # 使用簡單的詞頻統計（每個句子只分詞一次）
+        sentence_words = [jieba.lcut(sentence) for sentence in sentences]
+        if tokens is None:
+            tokens = [word for words in sentence_words for word in words]
         word_freq = {}
-        for sentence in sentences:
-            words = jieba.cut(sentence)
-            for word in words:
-                if word not in self.stop_words and len(word) > 1:
-                    word_freq[word] = word_freq.get(word, 0) + 1
+        for word in tokens:
+            if word not in self.stop_words and len(word) > 1:
+                word_freq[word] = word_freq.get(word, 0) + 1
 
         # 計算句子分數
         sentence_scores = {}
         for i, sentence in enumerate(sentences):
             score = 0
-            words = list(jieba.cut(sentence))
+            words = sentence_words[i]
             word_count = len(words)
 
             if word_count > 0:
@@ -347,7 +432,51 @@ class ContentEnricher:
 
         return summary
 
-    def generate_tfidf_vector(self, title: str, description: str, content: str, keywords: List[str]) -> Optional[str]:
+    def build_vector_text(
+        self, title: str, description: str, content: str, keywords: List[str]
+    ) -> str:
+        """
+        組合書籤用於向量化的文本（標題、描述與關鍵字依權重重複）
+        
+        Args:
+            title: 書籤標題
+            description: 書籤描述
+            content: 書籤內容
+            keywords: 關鍵字列表
+            
+        Returns:
+            合併後的文本，沒有任何文字時為空字串
+        """
+        combined_text = []
+        
+        # 標題權重較高，重複 3 次
+        if title:
+            combined_text.extend([title] * 3)
+            
+        # 描述權重中等，重複 2 次
+        if description:
+            combined_text.extend([description] * 2)
+            
+        # 關鍵字權重較高，重複 2 次
+        if keywords:
+            keywords_text = " ".join(keywords)
+            combined_text.extend([keywords_text] * 2)
+            
+        # 內容權重正常，添加 1 次
+        if content:
+            combined_text.append(content)
+            
+        return " ".join(combined_text)
+
+    def generate_tfidf_vector(
+        self,
+        title: str,
+        description: str,
+        content: str,
+        keywords: List[str],
+        vectorizer: Optional[TFIDFVectorizer] = None,
+        assign_new_terms: bool = True,
+    ) -> Optional[bytes]:
         """
         生成書籤的 TF-IDF 向量
         
@@ -356,48 +485,97 @@ class ContentEnricher:
             description: 書籤描述
             content: 書籤內容
             keywords: 關鍵字列表
+            vectorizer: 使用的向量化器，未提供時使用全局實例（重新訓練時傳入影子模型）
+            assign_new_terms: 增量模式下是否為新詞彙分配預留槽位
             
         Returns:
-            TF-IDF 向量 JSON 字符串或 None
+            二進位編碼的 TF-IDF 向量或 None
         """
         try:
-            # 組合所有文本內容
-            combined_text = []
-            
-            # 標題權重較高，重複 3 次
-            if title:
-                combined_text.extend([title] * 3)
-                
-            # 描述權重中等，重複 2 次
-            if description:
-                combined_text.extend([description] * 2)
-                
-            # 關鍵字權重較高，重複 2 次
-            if keywords:
-                keywords_text = " ".join(keywords)
-                combined_text.extend([keywords_text] * 2)
-                
-            # 內容權重正常，添加 1 次
-            if content:
-                combined_text.append(content)
-                
-            if not combined_text:
+            full_text = self.build_vector_text(title, description, content, keywords)
+            if not full_text:
                 return None
-                
-            # 合併所有文本
-            full_text = " ".join(combined_text)
             
             # 使用向量化器生成向量
-            vectorizer = get_vectorizer()
-            vector_data = vectorizer.transform(full_text)
+            vectorizer = vectorizer or get_vectorizer()
+            vector_data = vectorizer.transform(full_text, assign_new_terms=assign_new_terms)
             
             return vector_data
             
         except Exception as e:
-            print(f"Error generating TF-IDF vector: {str(e)}")
+            logger.error(f"Error generating TF-IDF vector: {str(e)}")
             return None
 
-    def generate_tfidf_vector_for_query(self, query: str) -> Optional[str]:
+    def generate_tfidf_vector_from_tokens(
+        self,
+        document: DocumentTokens,
+        vectorizer: Optional[TFIDFVectorizer] = None,
+        assign_new_terms: bool = True,
+    ) -> Optional[bytes]:
+        """
+        以書籤的分詞結果生成 TF-IDF 向量（不需重新分詞）
+        
+        Args:
+            document: 書籤的分詞結果（見 token_cache）
+            vectorizer: 使用的向量化器，未提供時使用全局實例
+            assign_new_terms: 增量模式下是否為新詞彙分配預留槽位
+            
+        Returns:
+            二進位編碼的 TF-IDF 向量或 None
+        """
+        vectorizer = vectorizer or get_vectorizer()
+        try:
+            normalized = document.normalized(vectorizer.stop_words)
+            text = self.build_vector_text(*normalized)
+            if not text:
+                return None
+            return next(
+                vectorizer.transform_many(
+                    [text], assign_new_terms=assign_new_terms, preprocessed=True
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error generating TF-IDF vector: {str(e)}")
+            return None
+
+    def generate_tfidf_vectors(
+        self,
+        db,
+        bookmarks: List,
+        vectorizer: Optional[TFIDFVectorizer] = None,
+        assign_new_terms: bool = True,
+    ) -> List[Optional[bytes]]:
+        """
+        批量生成書籤的 TF-IDF 向量
+        
+        分詞結果取自 token_cache，只有內容改變的書籤才重新分詞（由行程池平行處理）。
+        
+        Args:
+            db: 資料庫 Session（新的分詞結果寫入快取，由呼叫者提交）
+            bookmarks: 具有 id、title、description、content、keywords 屬性的書籤或查詢列
+            vectorizer: 使用的向量化器，未提供時使用全局實例
+            assign_new_terms: 增量模式下是否為新詞彙分配預留槽位
+            
+        Returns:
+            與輸入順序相同的編碼向量列表
+        """
+        vectorizer = vectorizer or get_vectorizer()
+        try:
+            documents = get_document_tokens(db, bookmarks)
+            texts = [
+                self.build_vector_text(*document.normalized(vectorizer.stop_words))
+                for document in documents
+            ]
+            return list(
+                vectorizer.transform_many(
+                    texts, assign_new_terms=assign_new_terms, preprocessed=True
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error generating TF-IDF vectors: {str(e)}")
+            return [None] * len(bookmarks)
+
+    def generate_tfidf_vector_for_query(self, query: str) -> Optional[bytes]:
         """
         為搜索查詢生成 TF-IDF 向量
         
@@ -405,17 +583,17 @@ class ContentEnricher:
             query: 搜索查詢文本
             
         Returns:
-            TF-IDF 向量 JSON 字符串或 None
+            二進位編碼的 TF-IDF 向量或 None
         """
         try:
             if not query or not query.strip():
                 return None
                 
             vectorizer = get_vectorizer()
-            vector_data = vectorizer.transform(query.strip())
+            vector_data = vectorizer.transform_query(query.strip())
             
             return vector_data
             
         except Exception as e:
-            print(f"Error generating TF-IDF vector for query: {str(e)}")
+            logger.error(f"Error generating TF-IDF vector for query: {str(e)}")
             return None
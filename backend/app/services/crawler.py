@@ -0,0 +1,254 @@
+"""
+批量抓取書籤網頁
+匯入大量書籤後以有限並行抓取所有頁面，取代每個書籤一個依序執行的背景任務：
+
+- 全局 semaphore 限制同時抓取數（同時進行的多個匯入共用）
+- 每個主機限制同時抓取數與請求間隔，不對同一網站送出大量請求
+- 暫時性錯誤（逾時、連線錯誤、408/429/5xx）以指數退避加隨機抖動重試
+- 解析、分詞與向量化在執行緒中進行，結果累積成批後由單一寫入者寫回資料庫
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .content_enricher import ContentEnricher, FetchedPage
+
+logger = logging.getLogger(__name__)
+
+# 視為暫時性錯誤、需要重試的 HTTP 狀態碼
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# 批次未滿時，最久等待此秒數就寫回資料庫
+FLUSH_INTERVAL = 5.0
+
+# (bookmark_id, extract_content 格式的內容；另以 "page" 附上抓取結果供寫入原始頁面快取)
+CrawlResult = Tuple[int, Dict[str, Any]]
+
+
+class CrawlStats:
+    """批量抓取的進度與統計"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.fetched = 0
+        self.failed = 0
+        self.retries = 0
+        self.stored = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def done(self) -> int:
+        return self.fetched + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "retries": self.retries,
+            "stored": self.stored,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "pages_per_second": round(self.pages_per_second, 2),
+        }
+
+
+class HostLimiter:
+    """每個主機的同時抓取數與相鄰兩次請求的最小間隔"""
+
+    def __init__(self, per_host: int, delay: float):
+        self.per_host = per_host
+        self.delay = delay
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """取得主機的抓取名額（必要時等待到可以送出下一個請求）"""
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class BulkCrawler:
+    """有限並行的批量網頁抓取器"""
+
+    def __init__(
+        self,
+        enricher: ContentEnricher,
+        concurrency: int = 32,
+        per_host: int = 2,
+        host_delay: float = 0.5,
+        retries: int = 3,
+        backoff: float = 1.0,
+        batch_size: int = 50,
+    ):
+        """
+        初始化抓取器
+
+        Args:
+            enricher: 抓取與解析網頁的內容增強器（使用其共用的 HTTP session）
+            concurrency: 全局同時抓取數
+            per_host: 每個主機的同時抓取數
+            host_delay: 同一主機相鄰兩次請求的最小間隔秒數
+            retries: 暫時性錯誤的重試次數
+            backoff: 指數退避的起始秒數
+            batch_size: 每批寫回資料庫的書籤數
+        """
+        self.enricher = enricher
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.hosts = HostLimiter(per_host, host_delay)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch_with_retry(self, url: str, stats: CrawlStats) -> Optional[FetchedPage]:
+        """抓取網頁，暫時性錯誤以指數退避重試"""
+        host = urlsplit(url).hostname or ""
+        reason = ""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+            try:
+                # 先取得主機名額再佔用全局名額，等待忙碌主機的請求不會佔住全局名額
+                async with self.hosts.slot(host), self._semaphore:
+                    page = await self.enricher.fetch(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = str(e) or type(e).__name__
+                continue
+            if page.status == 200 and page.skipped:
+                logger.info(f"Skipped {url}: {page.skipped}")
+                return None
+            if page.status == 200:
+                return page
+            reason = f"HTTP {page.status}"
+            if page.status not in RETRYABLE_STATUSES:
+                break
+        logger.info(f"Failed to fetch {url}: {reason}")
+        return None
+
+    async def _crawl_one(
+        self, bookmark_id: int, url: str, stats: CrawlStats, results: "asyncio.Queue"
+    ) -> None:
+        page = await self._fetch_with_retry(url, stats)
+        content = None
+        if page is not None and page.html:
+            try:
+                content = await asyncio.to_thread(self.enricher.process_page, page.html, url)
+            except Exception as e:
+                logger.warning(f"Failed to process {url}: {e}")
+        if content is None:
+            stats.failed += 1
+            return
+        content["page"] = page
+        stats.fetched += 1
+        await results.put((bookmark_id, content))
+
+    async def _write_batches(
+        self,
+        results: "asyncio.Queue",
+        store_batch: Callable[[List[CrawlResult]], None],
+        stats: CrawlStats,
+    ) -> None:
+        """單一寫入者：累積抓取結果，批次滿或等待超過 FLUSH_INTERVAL 時寫回資料庫"""
+        batch: List[CrawlResult] = []
+        finished = False
+        while not finished:
+            try:
+                item = await asyncio.wait_for(results.get(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                item = False
+            if item is None:
+                finished = True
+            elif item:
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                await self._flush(batch, store_batch, stats)
+                batch = []
+
+    async def _flush(
+        self,
+        batch: List[CrawlResult],
+        store_batch: Callable[[List[CrawlResult]], None],
+        stats: CrawlStats,
+    ) -> None:
+        try:
+            await asyncio.to_thread(store_batch, batch)
+            stats.stored += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to store {len(batch)} crawled pages: {e}", exc_info=True)
+        logger.info(
+            f"Crawled {stats.done}/{stats.total} pages "
+            f"({stats.pages_per_second:.1f} pages/s, {stats.retries} retries)"
+        )
+
+    async def crawl(
+        self,
+        bookmarks: Sequence[Tuple[int, str]],
+        store_batch: Callable[[List[CrawlResult]], None],
+    ) -> CrawlStats:
+        """
+        抓取所有書籤的網頁
+
+        Args:
+            bookmarks: (bookmark_id, url) 列表
+            store_batch: 將一批抓取結果寫回資料庫的同步函式（在執行緒中執行）
+
+        Returns:
+            抓取統計
+        """
+        stats = CrawlStats(len(bookmarks))
+        # 有上限的佇列：寫入資料庫跟不上時暫停抓取，記憶體中的結果不會無限累積
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        writer = asyncio.create_task(self._write_batches(results, store_batch, stats))
+        try:
+            await asyncio.gather(
+                *(self._crawl_one(bid, url, stats, results) for bid, url in bookmarks)
+            )
+        finally:
+            await results.put(None)
+            await writer
+
+        logger.info(
+            f"Crawl finished: {stats.fetched} fetched, {stats.failed} failed, "
+            f"{stats.retries} retries in {stats.elapsed:.1f}s "
+            f"({stats.pages_per_second:.1f} pages/s)"
+        )
+        return stats
+
+
+def create_crawler(enricher: ContentEnricher) -> BulkCrawler:
+    """依設定建立批量抓取器"""
+    from app import config
+
+    return BulkCrawler(
+        enricher,
+        concurrency=config.CRAWL_CONCURRENCY,
+        per_host=config.CRAWL_PER_HOST,
+        host_delay=config.CRAWL_HOST_DELAY,
+        retries=config.CRAWL_RETRIES,
+        backoff=config.CRAWL_BACKOFF,
+        batch_size=config.CRAWL_BATCH_SIZE,
+    )
@@ -0,0 +1,299 @@
+"""
+重複書籤偵測
+匯入與新增書籤時以正規化 URL 排除追蹤參數等變體；豐富化時以內容的 64 位元 SimHash
+比對近似重複的頁面（鏡像或轉載），重複書籤標記 duplicate_of 後不再向量化
+
+SimHash 以分段 LSH 索引：64 位元分為 (最大漢明距離 + 1) 段，
+距離不超過上限的兩個簽章至少有一段完全相同（鴿籠原理），只需比對同段相同的簽章。
+"""
+
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Session.info 中記錄的索引變更 (索引, 書籤 ID, 變更前的簽章)，交易回滾時依相反順序復原
+_INDEX_UNDO_KEY = "duplicate_index_undo"
+
+SIGNATURE_BITS = 64
+
+# 不影響頁面內容的追蹤參數（精確名稱與前綴）
+TRACKING_PARAMETERS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmi",
+    "ref",
+    "ref_src",
+    "spm",
+    "__s",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "__twitter")
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    正規化 URL：scheme 與主機轉小寫、移除預設連接埠、片段與追蹤參數、
+    其餘查詢參數排序，並移除路徑結尾的斜線
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        正規化後的 URL（無法解析時返回原字串）
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMETERS
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def to_signed(signature: int) -> int:
+    """無號 64 位元簽章轉為 SQLite INTEGER 可保存的有號整數"""
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def simhash(tokens: Iterable[str], min_tokens: int = 0) -> Optional[int]:
+    """
+    計算詞彙序列的 64 位元 SimHash（以詞頻加權）
+
+    Args:
+        tokens: 分詞後的詞彙
+        min_tokens: 不重複詞彙少於此數時返回 None（內容太短的頁面容易誤判為重複）
+
+    Returns:
+        無號 64 位元簽章
+    """
+    counts = Counter(token for token in tokens if token.strip())
+    if not counts or len(counts) < min_tokens:
+        return None
+
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            for token in counts
+        ),
+        dtype=np.uint64,
+        count=len(counts),
+    )
+    weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    # (詞彙數, 64) 的位元矩陣：位元為 1 時加上權重，為 0 時減去權重
+    bits = (hashes[:, np.newaxis] >> np.arange(SIGNATURE_BITS, dtype=np.uint64)) & np.uint64(1)
+    totals = (np.where(bits == 1, 1.0, -1.0) * weights[:, np.newaxis]).sum(axis=0)
+    return int(sum(1 << bit for bit in np.flatnonzero(totals > 0).tolist()))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """SimHash 的分段 LSH 索引：只保存非重複（原始）書籤的簽章"""
+
+    def __init__(self, max_distance: int = 3):
+        """
+        初始化索引
+
+        Args:
+            max_distance: 視為近似重複的最大漢明距離
+        """
+        self.max_distance = max_distance
+        # 每段的 (位移, 遮罩)
+        bounds = np.array_split(np.arange(SIGNATURE_BITS), max_distance + 1)
+        self._bands = [(int(band[0]), (1 << len(band)) - 1) for band in bounds]
+        self._buckets: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in self._bands]
+        self._signatures: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _keys(self, signature: int) -> List[int]:
+        return [(signature >> shift) & mask for shift, mask in self._bands]
+
+    def _add(self, bookmark_id: int, signature: int) -> None:
+        self._signatures[bookmark_id] = signature
+        for buckets, key in zip(self._buckets, self._keys(signature)):
+            buckets[key].add(bookmark_id)
+
+    def _remove(self, bookmark_id: int) -> Optional[int]:
+        signature = self._signatures.pop(bookmark_id, None)
+        if signature is None:
+            return None
+        for buckets, key in zip(self._buckets, self._keys(signature)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(bookmark_id)
+                if not bucket:
+                    del buckets[key]
+        return signature
+
+    def _nearest(self, signature: int) -> Optional[Tuple[int, int]]:
+        candidates: Set[int] = set()
+        for buckets, key in zip(self._buckets, self._keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        matches = [
+            (hamming_distance(signature, self._signatures[bookmark_id]), bookmark_id)
+            for bookmark_id in candidates
+        ]
+        matches = [match for match in matches if match[0] <= self.max_distance]
+        if not matches:
+            return None
+        distance, bookmark_id = min(matches)
+        return bookmark_id, distance
+
+    def build(self, signatures: Iterable[Tuple[int, int]]) -> None:
+        """以 (bookmark_id, 無號簽章) 重建索引"""
+        with self._lock:
+            self._signatures.clear()
+            self._buckets = [defaultdict(set) for _ in self._bands]
+            for bookmark_id, signature in signatures:
+                self._add(bookmark_id, signature)
+
+    def assign(
+        self, bookmark_id: int, signature: int, db: Optional[Session] = None
+    ) -> Optional[int]:
+        """
+        比對近似重複的原始書籤；沒有時將書籤加入索引成為原始書籤
+
+        比對與加入在同一個鎖內完成，同時豐富化的鏡像頁面不會都成為原始書籤。
+
+        Args:
+            bookmark_id: 書籤 ID
+            signature: 書籤內容的無號 SimHash
+            db: 寫入此結果的資料庫 Session，提供時交易回滾後復原索引
+
+        Returns:
+            近似重複的原始書籤 ID，不是重複書籤時為 None
+        """
+        with self._lock:
+            previous = self._remove(bookmark_id)
+            nearest = self._nearest(signature)
+            if nearest is None:
+                self._add(bookmark_id, signature)
+        if db is not None:
+            _record_undo(db, self, bookmark_id, previous)
+        return None if nearest is None else nearest[0]
+
+    def remove(self, bookmark_id: int, db: Optional[Session] = None) -> None:
+        """
+        將書籤移出索引
+
+        Args:
+            bookmark_id: 書籤 ID
+            db: 寫入此變更的資料庫 Session，提供時交易回滾後復原索引
+        """
+        with self._lock:
+            previous = self._remove(bookmark_id)
+        if db is not None:
+            _record_undo(db, self, bookmark_id, previous)
+
+    def restore(self, bookmark_id: int, signature: Optional[int]) -> None:
+        """將書籤的簽章還原為 signature（None 表示不在索引中）"""
+        with self._lock:
+            self._remove(bookmark_id)
+            if signature is not None:
+                self._add(bookmark_id, signature)
+
+    def stats(self) -> Dict[str, int]:
+        """索引統計資訊"""
+        with self._lock:
+            return {
+                "signatures": len(self._signatures),
+                "bands": len(self._bands),
+                "max_distance": self.max_distance,
+            }
+
+
+def _record_undo(
+    db: Session, index: SimHashIndex, bookmark_id: int, previous: Optional[int]
+) -> None:
+    db.info.setdefault(_INDEX_UNDO_KEY, []).append((index, bookmark_id, previous))
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_index_changes(session: Session) -> None:
+    session.info.pop(_INDEX_UNDO_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _undo_index_changes(session: Session) -> None:
+    # 資料庫沒有保存的簽章不留在索引中，之後的書籤不會被判定為它的重複
+    for index, bookmark_id, signature in reversed(session.info.pop(_INDEX_UNDO_KEY, [])):
+        index.restore(bookmark_id, signature)
+
+
+# 全局實例
+_index_instance: Optional[SimHashIndex] = None
+
+
+def get_duplicate_index() -> SimHashIndex:
+    """
+    獲取全局 SimHash 索引
+
+    Returns:
+        SimHashIndex 實例
+    """
+    global _index_instance
+    if _index_instance is None:
+        from app import config
+
+        _index_instance = SimHashIndex(config.DEDUP_MAX_DISTANCE)
+    return _index_instance
+
+
+def rebuild_duplicate_index(db: Optional[Session] = None) -> None:
+    """由資料庫中原始書籤的簽章重建全局 SimHash 索引（啟動時呼叫）"""
+    from app.models.database import Bookmark, SessionLocal
+
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = db.execute(
+            select(Bookmark.id, Bookmark.content_simhash).where(
+                Bookmark.content_simhash.isnot(None), Bookmark.duplicate_of.is_(None)
+            )
+        )
+        index = get_duplicate_index()
+        index.build((bookmark_id, to_unsigned(value)) for bookmark_id, value in rows)
+        logger.info(f"Duplicate index built with {len(index)} signatures")
+    finally:
+        if own_session:
+            db.close()
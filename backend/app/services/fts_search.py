@@ -0,0 +1,70 @@
+"""
+FTS5 關鍵字檢索服務
+以 SQLite FTS5 的 bm25() 排序取得候選書籤及關鍵字分數
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.fts import FTS_TABLE, segment_for_fts
+
+from .tfidf_vectorizer import get_vectorizer
+
+logger = logging.getLogger(__name__)
+
+# bm25() 欄位權重，順序同 FTS 欄位：title, description, content, keywords
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+
+def build_match_expression(query: str) -> str:
+    """
+    將查詢分詞後組成 FTS5 MATCH 運算式（任一詞彙命中即可，由 bm25 排序）
+
+    Returns:
+        MATCH 運算式，沒有可用詞彙時為空字串
+    """
+    stop_words = get_vectorizer().stop_words
+    tokens = [
+        token
+        for token in dict.fromkeys(segment_for_fts(query).split())
+        if token not in stop_words and any(char.isalnum() for char in token)
+    ]
+    return " OR ".join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+
+
+def search_fts(db: Session, query: str, limit: int) -> Optional[List[Tuple[int, float]]]:
+    """
+    以 FTS5 檢索書籤
+
+    Args:
+        db: 資料庫 Session
+        query: 搜索查詢
+        limit: 最多返回的候選數量
+
+    Returns:
+        (bookmark_id, 關鍵字分數) 的列表，分數以最佳結果正規化至 0-1，依分數由高至低排序；
+        查詢沒有可檢索的詞彙時返回 None
+    """
+    match_expression = build_match_expression(query)
+    if not match_expression:
+        return None
+
+    weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+    rows = db.execute(
+        text(
+            f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH :match ORDER BY rank LIMIT :limit"
+        ),
+        {"match": match_expression, "limit": limit},
+    ).all()
+    if not rows:
+        return []
+
+    # bm25() 越小越相關，取負值後以最佳結果正規化
+    best = -rows[0][1]
+    if best <= 0:
+        return [(bookmark_id, 1.0) for bookmark_id, _ in rows]
+    return [(bookmark_id, max(0.0, -rank / best)) for bookmark_id, rank in rows]
@@ -0,0 +1,297 @@
+"""
+網頁解析後端
+由 HTML 提取標題、描述、代表圖片與正文，解析器可由 HTML_PARSER 選擇：
+
+- "selectolax": Lexbor 引擎（C 實作），最快，需安裝 selectolax
+- "lxml": libxml2（C 實作），需安裝 lxml
+- "html.parser": BeautifulSoup 搭配標準函式庫的純 Python 解析器，不需額外套件但最慢
+- "auto": 依序使用已安裝的 selectolax、lxml，都沒有時使用 html.parser
+
+預設為 html.parser；selectolax 與 lxml 為選用後端，需明確指定（或使用 "auto"）才會啟用。
+
+各後端共用同一套提取規則（HtmlParser.parse），只有查詢與取出文字的方式不同。
+"""
+
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# 提取正文前移除的標籤（template 的內容不會顯示，BeautifulSoup 取文字時本來就略過）
+NOISE_TAGS = ["script", "style", "nav", "header", "footer", "aside", "template"]
+
+# 可能是正文區域的 div class
+CONTENT_CLASS = re.compile("content|article|post|entry")
+
+# 依序嘗試的代表圖片來源：(標籤, 屬性, 屬性值, 取 URL 的屬性)
+IMAGE_SOURCES = [
+    ("meta", "property", "og:image", "content"),
+    ("meta", "name", "twitter:image", "content"),
+    ("link", "rel", "image_src", "href"),
+    ("link", "rel", "apple-touch-icon", "href"),
+    ("link", "rel", "icon", "href"),
+    ("link", "rel", "shortcut icon", "href"),
+]
+
+
+class ParsedPage(NamedTuple):
+    """網頁解析結果"""
+
+    title: str
+    description: Optional[str]
+    image_url: Optional[str]
+    content: str  # 正文文字（尚未清理）
+
+
+def _rel_matches(rel: Any, value: str) -> bool:
+    """link 的 rel 是否符合（rel 為多值屬性：符合其中一個值或完整字串）"""
+    if not rel:
+        return False
+    tokens = rel.split() if isinstance(rel, str) else list(rel)
+    return value in tokens or " ".join(tokens) == value
+
+
+class HtmlParser(ABC):
+    """解析後端的共同提取規則，子類別實作查詢與取出文字的方式（缺少任一方法時無法建立）"""
+
+    name = ""
+
+    def parse(self, html: str, base_url: str) -> ParsedPage:
+        """
+        解析網頁
+
+        Args:
+            html: 網頁 HTML 內容
+            base_url: 網頁 URL（解析相對路徑用）
+
+        Returns:
+            標題、描述、代表圖片 URL 與正文
+        """
+        document = self._document(html)
+        title = self._title(document)
+        description = self._attribute(document, "meta", "property", "og:description", "content")
+        if not description:
+            description = self._attribute(document, "meta", "name", "description", "content")
+
+        image_url = None
+        for tag, attribute, value, target in IMAGE_SOURCES:
+            found = self._attribute(document, tag, attribute, value, target)
+            if found:
+                image_url = urljoin(base_url, found)
+                break
+
+        # 標題與描述取完後才移除雜訊標籤（標題可能在 header 內的 h1）
+        self._remove(document, NOISE_TAGS)
+        # 以 is None 判斷而不以 or 串接：lxml 元素的真假值取決於是否有子元素
+        node = self._first(document, "article")
+        if node is None:
+            node = self._first(document, "main")
+        if node is None:
+            node = self._content_div(document)
+        if node is None:
+            node = self._first(document, "body")
+        content = self._text(node if node is not None else document, " ")
+        return ParsedPage(title, description.strip() if description else None, image_url, content)
+
+    def _title(self, document: Any) -> str:
+        """og:title 優先，其次 title 與 h1 標籤"""
+        og_title = self._attribute(document, "meta", "property", "og:title", "content")
+        if og_title:
+            return og_title.strip()
+        for tag in ("title", "h1"):
+            node = self._first(document, tag)
+            if node is not None:
+                return self._text(node, "").strip()
+        return "無標題"
+
+    @abstractmethod
+    def _document(self, html: str) -> Any:
+        """解析 HTML 為後端的文件物件"""
+
+    @abstractmethod
+    def _attribute(
+        self, document: Any, tag: str, attribute: str, value: str, target: str
+    ) -> Optional[str]:
+        """第一個 attribute 符合 value 的 tag 的 target 屬性值"""
+
+    @abstractmethod
+    def _first(self, document: Any, tag: str) -> Any:
+        """第一個 tag 元素，沒有時為 None"""
+
+    @abstractmethod
+    def _content_div(self, document: Any) -> Any:
+        """第一個 class 符合 CONTENT_CLASS 的 div"""
+
+    @abstractmethod
+    def _remove(self, document: Any, tags: List[str]) -> None:
+        """移除標籤與其內容"""
+
+    @abstractmethod
+    def _text(self, node: Any, separator: str) -> str:
+        """以 separator 連接去除前後空白的文字節點（不含註解）"""
+
+
+class SoupParser(HtmlParser):
+    """BeautifulSoup（預設使用標準函式庫的 html.parser）"""
+
+    name = "html.parser"
+
+    def __init__(self, features: str = "html.parser"):
+        self.features = features
+
+    def _document(self, html: str) -> BeautifulSoup:
+        return BeautifulSoup(html, self.features)
+
+    def _attribute(self, document, tag, attribute, value, target):
+        node = document.find(tag, attrs={attribute: value})
+        return node.get(target) if node else None
+
+    def _first(self, document, tag):
+        return document.find(tag)
+
+    def _content_div(self, document):
+        return document.find("div", class_=CONTENT_CLASS)
+
+    def _remove(self, document, tags):
+        for node in document(tags):
+            node.decompose()
+
+    def _text(self, node, separator):
+        if not separator:
+            return node.text
+        return node.get_text(strip=True, separator=separator)
+
+
+class LxmlParser(HtmlParser):
+    """lxml.html（libxml2）"""
+
+    name = "lxml"
+
+    def __init__(self):
+        from lxml import html as lxml_html
+
+        self._html = lxml_html
+        # 以 UTF-8 位元組解析：含 XML 編碼宣告的 XHTML 字串無法直接交給 lxml
+        # 保留註解：移除註解會把前後兩段文字合併成一個文字節點，與 BeautifulSoup 的分段不同
+        self._parser = lxml_html.HTMLParser(encoding="utf-8")
+
+    def _document(self, html: str):
+        if not html.strip():
+            return self._html.fromstring("<html></html>")
+        return self._html.document_fromstring(html.encode("utf-8"), parser=self._parser)
+
+    def _attribute(self, document, tag, attribute, value, target):
+        for node in document.iter(tag):
+            current = node.get(attribute)
+            if current == value or (attribute == "rel" and _rel_matches(current, value)):
+                return node.get(target)
+        return None
+
+    def _first(self, document, tag):
+        return next(document.iter(tag), None)
+
+    def _content_div(self, document):
+        for node in document.iter("div"):
+            if CONTENT_CLASS.search(node.get("class") or ""):
+                return node
+        return None
+
+    def _remove(self, document, tags):
+        # 清空元素但保留之後的文字（tail）：drop_tree 會把 tail 併入前一段文字，
+        # BeautifulSoup 的 decompose 則保留兩段各自的文字節點
+        for node in list(document.iter(*tags)):
+            node.clear(keep_tail=True)
+
+    def _text(self, node, separator):
+        if not separator:
+            return node.text_content()
+        # text() 只取文字節點（不含註解），與 BeautifulSoup 的 get_text 相同
+        parts = node.xpath(".//text()")
+        return separator.join(part.strip() for part in parts if part.strip())
+
+
+class SelectolaxParser(HtmlParser):
+    """selectolax（Lexbor）"""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser_class = LexborHTMLParser
+
+    def _document(self, html: str):
+        return self._parser_class(html)
+
+    def _attribute(self, document, tag, attribute, value, target):
+        for node in document.css(f"{tag}[{attribute}]"):
+            current = node.attributes.get(attribute)
+            if current == value or (attribute == "rel" and _rel_matches(current, value)):
+                return node.attributes.get(target)
+        return None
+
+    def _first(self, document, tag):
+        return document.css_first(tag)
+
+    def _content_div(self, document):
+        for node in document.css("div[class]"):
+            if CONTENT_CLASS.search(node.attributes.get("class") or ""):
+                return node
+        return None
+
+    def _remove(self, document, tags):
+        document.strip_tags(tags)
+
+    def _text(self, node, separator):
+        if not separator:
+            return node.text(deep=True)
+        parts = node.text(deep=True, separator="\0").split("\0")
+        return separator.join(part.strip() for part in parts if part.strip())
+
+
+PARSERS: Dict[str, Type[HtmlParser]] = {
+    "selectolax": SelectolaxParser,
+    "lxml": LxmlParser,
+    "html.parser": SoupParser,
+}
+
+
+def available_parsers() -> List[str]:
+    """已安裝相依套件、可使用的解析後端名稱（由快到慢）"""
+    names = []
+    for name, parser_class in PARSERS.items():
+        try:
+            parser_class()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def create_parser(name: str = "html.parser") -> HtmlParser:
+    """
+    建立解析後端
+
+    Args:
+        name: "html.parser"、"selectolax"、"lxml" 或 "auto"
+
+    Returns:
+        解析器；指定的後端未安裝或名稱不明時改用 html.parser
+    """
+    candidates = list(PARSERS) if name == "auto" else [name]
+    for candidate in candidates:
+        parser_class = PARSERS.get(candidate)
+        if parser_class is None:
+            logger.warning(f"Unknown HTML parser '{candidate}'. Using html.parser.")
+            break
+        try:
+            return parser_class()
+        except ImportError:
+            if name != "auto":
+                logger.warning(f"HTML parser '{candidate}' is not installed. Using html.parser.")
+    return SoupParser()
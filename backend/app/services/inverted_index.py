@@ -0,0 +1,216 @@
+"""
+倒排索引服務
+以 jieba 分詞後的詞彙建立 詞彙 -> 書籤 ID 的 postings，取代 ILIKE 全表掃描取得候選書籤
+"""
+
+import logging
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, distinct, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.database import Bookmark, BookmarkTerm
+
+from .tfidf_vectorizer import TFIDFVectorizer, get_vectorizer
+from .token_cache import DocumentTokens, get_document_tokens
+
+logger = logging.getLogger(__name__)
+
+# Session.info 中累積的文件頻率變化，提交後才套用到以即時 IDF 查詢的向量化器（增量與雜湊模式）
+_FREQUENCY_DELTA_KEY = "document_frequency_delta"
+_TRACKING_PAUSED_KEY = "document_frequency_tracking_paused"
+
+
+class _FrequencyDelta:
+    """一個交易內 postings 變動造成的文件頻率增減"""
+
+    def __init__(self):
+        self.terms: Counter = Counter()
+        self.documents = 0
+
+
+def _record_document_change(
+    db: Session, old_terms: Iterable[str], new_terms: Iterable[str]
+) -> None:
+    """記錄書籤詞彙集合的變化（交易提交後才生效）"""
+    if db.info.get(_TRACKING_PAUSED_KEY):
+        return
+
+    old_terms, new_terms = set(old_terms), set(new_terms)
+    if old_terms == new_terms:
+        return
+
+    delta = db.info.setdefault(_FREQUENCY_DELTA_KEY, _FrequencyDelta())
+    for term in new_terms - old_terms:
+        delta.terms[term] += 1
+    for term in old_terms - new_terms:
+        delta.terms[term] -= 1
+    delta.documents += bool(new_terms) - bool(old_terms)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_frequency_delta(session: Session) -> None:
+    delta = session.info.pop(_FREQUENCY_DELTA_KEY, None)
+    if delta is None:
+        return
+    vectorizer = get_vectorizer()
+    if vectorizer.uses_live_idf:
+        vectorizer.apply_document_frequency_delta(delta.terms, delta.documents)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_frequency_delta(session: Session) -> None:
+    session.info.pop(_FREQUENCY_DELTA_KEY, None)
+
+
+def query_terms(query: str) -> List[str]:
+    """將搜尋查詢轉為不重複的索引詞彙"""
+    processed = get_vectorizer()._preprocess_text(query)
+    return list(dict.fromkeys(processed.split()))
+
+
+def index_bookmark(
+    db: Session, bookmark: Bookmark, document: Optional[DocumentTokens] = None
+) -> None:
+    """
+    重建單一書籤的 postings（不提交交易，由呼叫者提交）
+
+    Args:
+        db: 資料庫 Session
+        bookmark: 已取得 ID 的書籤
+        document: 書籤的分詞結果，未提供時由 token_cache 取得
+    """
+    if document is None:
+        document = get_document_tokens(db, [bookmark])[0]
+    terms = document.terms(get_vectorizer().stop_words)
+
+    old_terms = db.scalars(
+        delete(BookmarkTerm)
+        .where(BookmarkTerm.bookmark_id == bookmark.id)
+        .returning(BookmarkTerm.term)
+    ).all()
+    _record_document_change(db, old_terms, terms)
+    if terms:
+        db.execute(
+            insert(BookmarkTerm),
+            [
+                {"term": term, "bookmark_id": bookmark.id, "term_frequency": count}
+                for term, count in terms.items()
+            ],
+        )
+
+
+def remove_bookmark(db: Session, bookmark_id: int) -> None:
+    """移除單一書籤的 postings（不提交交易，由呼叫者提交）"""
+    old_terms = db.scalars(
+        delete(BookmarkTerm)
+        .where(BookmarkTerm.bookmark_id == bookmark_id)
+        .returning(BookmarkTerm.term)
+    ).all()
+    _record_document_change(db, old_terms, ())
+
+
+def find_candidate_ids(db: Session, terms: List[str], limit: int) -> List[int]:
+    """
+    依查詢詞彙從倒排索引取得候選書籤
+
+    只讀取查詢詞彙的 postings，成本與 postings 長度成正比而非語料庫大小。
+    命中詞彙數較多、詞頻總和較高的書籤排在前面。
+
+    Args:
+        db: 資料庫 Session
+        terms: 查詢詞彙
+        limit: 最多返回的候選數量
+
+    Returns:
+        書籤 ID 列表
+    """
+    if not terms:
+        return []
+
+    matched_terms = func.count(BookmarkTerm.term)
+    total_frequency = func.sum(BookmarkTerm.term_frequency)
+    rows = db.execute(
+        select(BookmarkTerm.bookmark_id)
+        .where(BookmarkTerm.term.in_(terms))
+        .group_by(BookmarkTerm.bookmark_id)
+        .order_by(matched_terms.desc(), total_frequency.desc(), BookmarkTerm.bookmark_id)
+        .limit(limit)
+    )
+    return [bookmark_id for (bookmark_id,) in rows]
+
+
+def rebuild_inverted_index(db: Session, batch_size: int = 500) -> int:
+    """
+    為所有書籤重建倒排索引
+
+    Returns:
+        已建立索引的書籤數量
+    """
+    # 重建期間不逐筆追蹤文件頻率，完成後整體重新統計
+    db.info[_TRACKING_PAUSED_KEY] = True
+    try:
+        db.execute(delete(BookmarkTerm))
+
+        indexed = 0
+        last_id = 0
+        while True:
+            bookmarks = (
+                db.query(Bookmark)
+                .filter(Bookmark.id > last_id)
+                .order_by(Bookmark.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not bookmarks:
+                break
+            documents = get_document_tokens(db, bookmarks)
+            for bookmark, document in zip(bookmarks, documents):
+                index_bookmark(db, bookmark, document)
+            indexed += len(bookmarks)
+            last_id = bookmarks[-1].id
+            db.commit()
+        db.commit()
+    finally:
+        db.info.pop(_TRACKING_PAUSED_KEY, None)
+
+    if get_vectorizer().uses_live_idf:
+        sync_document_frequencies(db)
+
+    logger.info(f"Inverted index rebuilt for {indexed} bookmarks")
+    return indexed
+
+
+def sync_document_frequencies(
+    db: Optional[Session] = None, vectorizer: Optional[TFIDFVectorizer] = None
+) -> None:
+    """
+    以倒排索引的 postings 重新統計向量化器的文件頻率（增量與雜湊模式的即時 IDF）
+
+    每個詞彙的文件頻率即其 postings 數，啟動或重新訓練時統計一次，之後由交易提交時的增減維持。
+
+    Args:
+        db: 使用中的資料庫 Session，未提供時自行建立
+        vectorizer: 目標向量化器，未提供時使用全局實例
+    """
+    from app.models.database import SessionLocal
+
+    vectorizer = vectorizer or get_vectorizer()
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
+    try:
+        frequencies = dict(
+            db.execute(
+                select(BookmarkTerm.term, func.count()).group_by(BookmarkTerm.term)
+            ).all()
+        )
+        document_count = db.scalar(select(func.count(distinct(BookmarkTerm.bookmark_id))))
+        vectorizer.set_document_frequencies(frequencies, document_count or 0)
+        logger.info(
+            f"Document frequencies synced: {len(frequencies)} terms over {document_count} bookmarks"
+        )
+    finally:
+        if owns_session:
+            db.close()
@@ -0,0 +1,381 @@
+"""
+持久化工作佇列
+內容豐富化、批量向量化與重新訓練以 jobs 資料表排程，取代記憶體中的 BackgroundTasks：
+服務重啟後未完成的工作仍會執行，失敗的工作以指數退避重試，最終的錯誤保存在 last_error。
+
+工作者以條件式 UPDATE 取得工作（只有一個工作者能將同一個工作由 pending 改為 running），
+執行期間定期延長租約；工作者崩潰或服務中止時租約到期，工作由其他工作者重新取得。
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.database import Job
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+STATES = (PENDING, RUNNING, SUCCEEDED, FAILED)
+
+# 沒有通知時，工作者每隔此秒數檢查一次延後執行與租約到期的工作
+POLL_INTERVAL = 5.0
+
+# 工作處理函式：以 payload 為關鍵字參數呼叫，可為同步（在執行緒中執行）或 async 函式，
+# 返回的 dict 存入 result
+Handler = Callable[..., Any]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claimable(now: datetime):
+    """可取得的工作：到期的等待中工作，或租約已到期的執行中工作"""
+    return or_(
+        and_(Job.state == PENDING, Job.run_at <= now),
+        and_(Job.state == RUNNING, Job.lease_expires_at < now),
+    )
+
+
+class JobQueue:
+    """以 SQLite 資料表保存的工作佇列與執行工作的工作者"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        lease_seconds: int = 60,
+        max_attempts: int = 3,
+        retry_backoff: float = 10.0,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        """
+        初始化工作佇列
+
+        Args:
+            workers: 工作者數量
+            lease_seconds: 工作租約秒數（執行期間每隔三分之一租約續約一次）
+            max_attempts: 預設的最大嘗試次數
+            retry_backoff: 失敗重試的指數退避起始秒數
+            session_factory: 建立資料庫 Session 的函式，未提供時使用 SessionLocal
+        """
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._session_factory = session_factory
+        self._handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            from app.models.database import SessionLocal
+
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def register(self, kind: str, handler: Handler) -> None:
+        """註冊工作類型的處理函式"""
+        self._handlers[kind] = handler
+
+    def enqueue(
+        self,
+        db: Session,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        unique: bool = False,
+        max_attempts: Optional[int] = None,
+    ) -> Job:
+        """
+        新增工作並提交
+
+        Args:
+            db: 資料庫 Session
+            kind: 工作類型
+            payload: 傳給處理函式的參數（需可序列化為 JSON）
+            unique: 已有相同類型的等待中或執行中工作時不重複新增，返回既有工作
+            max_attempts: 最大嘗試次數，未提供時使用佇列預設值
+
+        Returns:
+            新增（或既有）的工作
+        """
+        if unique:
+            existing = (
+                db.query(Job)
+                .filter(Job.kind == kind, Job.state.in_((PENDING, RUNNING)))
+                .order_by(Job.id)
+                .first()
+            )
+            if existing is not None:
+                return existing
+
+        job = Job(
+            kind=kind,
+            payload=payload or {},
+            state=PENDING,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=_utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        self.notify()
+        return job
+
+    def notify(self) -> None:
+        """喚醒等待中的工作者（可由任何執行緒呼叫）"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        取得下一個可執行的工作並標記為執行中
+
+        Returns:
+            工作的 id、kind、payload、attempts 與 max_attempts，沒有可執行的工作時為 None
+        """
+        db = self._session()
+        try:
+            while True:
+                now = _utcnow()
+                job_id = db.execute(
+                    select(Job.id).where(_claimable(now)).order_by(Job.run_at, Job.id).limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                # 條件式 UPDATE：其他工作者已先取得時影響列數為 0，改取下一個工作
+                claimed = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, _claimable(now))
+                    .values(
+                        state=RUNNING,
+                        attempts=Job.attempts + 1,
+                        lease_owner=worker_id,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        started_at=now,
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:
+                    job = db.get(Job, job_id)
+                    return {
+                        "id": job.id,
+                        "kind": job.kind,
+                        "payload": job.payload or {},
+                        "attempts": job.attempts,
+                        "max_attempts": job.max_attempts,
+                    }
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, worker_id: str, **values: Any) -> bool:
+        """更新仍由此工作者持有的工作（租約已被接手時不覆寫）"""
+        db = self._session()
+        try:
+            updated = db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.state == RUNNING, Job.lease_owner == worker_id)
+                .values(**values)
+            ).rowcount
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """延長工作租約"""
+        expires = _utcnow() + timedelta(seconds=self.lease_seconds)
+        return self._finish(job_id, worker_id, lease_expires_at=expires)
+
+    def complete(self, job_id: int, worker_id: str, result: Any = None) -> None:
+        """標記工作完成"""
+        self._finish(
+            job_id,
+            worker_id,
+            state=SUCCEEDED,
+            result=result if isinstance(result, dict) else None,
+            last_error=None,
+            lease_owner=None,
+            lease_expires_at=None,
+            finished_at=_utcnow(),
+        )
+
+    def fail(self, job: Dict[str, Any], worker_id: str, error: str) -> None:
+        """記錄工作失敗：未達最大嘗試次數時以指數退避重新排程，否則標記為失敗"""
+        now = _utcnow()
+        if job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+            values = {"state": PENDING, "run_at": now + timedelta(seconds=delay)}
+        else:
+            values = {"state": FAILED, "finished_at": now}
+        self._finish(
+            job["id"],
+            worker_id,
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            **values,
+        )
+
+    async def _run(self, job: Dict[str, Any], worker_id: str) -> None:
+        """執行工作，執行期間定期續約"""
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            error = f"No handler registered for job kind '{job['kind']}'"
+            job = {**job, "attempts": job["max_attempts"]}  # 不重試
+            await asyncio.to_thread(self.fail, job, worker_id, error)
+            return
+        if job["attempts"] > job["max_attempts"]:
+            # 租約到期後重新取得、但已用完嘗試次數（例如每次執行都使服務崩潰）
+            await asyncio.to_thread(self.fail, job, worker_id, "Lease expired")
+            return
+
+        async def keep_alive() -> None:
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await asyncio.to_thread(self.heartbeat, job["id"], worker_id)
+
+        renewer = asyncio.create_task(keep_alive())
+        try:
+            if inspect.iscoroutinefunction(handler):
+                result = await handler(**job["payload"])
+            else:
+                result = await asyncio.to_thread(handler, **job["payload"])
+        except asyncio.CancelledError:
+            # 服務關閉：保留租約，到期後由重新啟動的工作者接手
+            raise
+        except Exception as e:
+            logger.warning(
+                f"Job {job['id']} ({job['kind']}) failed on attempt "
+                f"{job['attempts']}/{job['max_attempts']}: {e}",
+                exc_info=True,
+            )
+            await asyncio.to_thread(self.fail, job, worker_id, f"{type(e).__name__}: {e}")
+        else:
+            await asyncio.to_thread(self.complete, job["id"], worker_id, result)
+        finally:
+            renewer.cancel()
+
+    async def _worker(self, index: int) -> None:
+        worker_id = f"{self._worker_prefix}-{index}"
+        while True:
+            # 先清除通知再取得工作，取得工作後才新增的工作不會錯過通知
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.claim, worker_id)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to claim a job: {e}", exc_info=True)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, worker_id)
+
+    async def start(self) -> None:
+        """啟動工作者（於應用程式的事件迴圈呼叫）"""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """停止工作者；執行中的工作保留租約，重新啟動後由新的工作者接手"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._wakeup = None
+
+    def stats(self, db: Session, failures: int = 10) -> Dict[str, Any]:
+        """
+        佇列統計：各狀態工作數、等待中工作的類型分布與等待時間、完成速率與最近的失敗
+
+        Args:
+            db: 資料庫 Session
+            failures: 返回的最近失敗工作數
+
+        Returns:
+            統計資訊
+        """
+        now = _utcnow()
+        states = dict(db.execute(select(Job.state, func.count()).group_by(Job.state)).all())
+        pending_by_kind = dict(
+            db.execute(
+                select(Job.kind, func.count()).where(Job.state == PENDING).group_by(Job.kind)
+            ).all()
+        )
+        oldest = db.execute(select(func.min(Job.created_at)).where(Job.state == PENDING)).scalar()
+
+        def completed_since(seconds: int) -> int:
+            return db.execute(
+                select(func.count()).where(
+                    Job.state == SUCCEEDED,
+                    Job.finished_at >= now - timedelta(seconds=seconds),
+                )
+            ).scalar()
+
+        last_hour = completed_since(3600)
+        recent_failures = (
+            db.query(Job)
+            .filter(Job.state == FAILED)
+            .order_by(Job.finished_at.desc())
+            .limit(failures)
+            .all()
+        )
+        return {
+            "workers": len(self._tasks),
+            "depth": states.get(PENDING, 0) + states.get(RUNNING, 0),
+            "states": {state: states.get(state, 0) for state in STATES},
+            "pending_by_kind": pending_by_kind,
+            "oldest_pending_seconds": (
+                (now.replace(tzinfo=None) - oldest.replace(tzinfo=None)).total_seconds()
+                if oldest is not None
+                else None
+            ),
+            "completed_last_minute": completed_since(60),
+            "completed_last_hour": last_hour,
+            "throughput_per_minute": round(last_hour / 60, 2),
+            "recent_failures": recent_failures,
+        }
+
+
+# 全局實例
+_queue_instance: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    獲取全局工作佇列
+
+    Returns:
+        JobQueue 實例
+    """
+    global _queue_instance
+    if _queue_instance is None:
+        from app import config
+
+        _queue_instance = JobQueue(
+            workers=config.JOB_WORKERS,
+            lease_seconds=config.JOB_LEASE_SECONDS,
+            max_attempts=config.JOB_MAX_ATTEMPTS,
+            retry_backoff=config.JOB_RETRY_BACKOFF,
+        )
+    return _queue_instance
@@ -0,0 +1,266 @@
+"""
+相關書籤服務
+預先計算每個書籤相似度最高的 k 個書籤存入 bookmark_neighbors，查詢相關書籤只需讀取 k 列
+
+以向量雜湊找出向量改變或刪除的書籤，只重算這些書籤，以及排名可能因此改變的書籤：
+相關書籤中含有改變書籤的書籤，與改變書籤的新相似度超過其第 k 名的書籤（餘弦相似度對稱）。
+相似度以向量索引的分塊矩陣乘法計算。
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.database import Bookmark, BookmarkNeighbor, BookmarkNeighborState
+
+from .vector_codec import decode_vector
+from .vector_index import get_vector_index
+
+logger = logging.getLogger(__name__)
+
+Neighbors = List[Tuple[int, float]]
+
+# 每次 IN 查詢的書籤數（低於 SQLite 的參數數量上限）
+_IN_CHUNK = 500
+
+# 同一時間只執行一個重算任務；執行期間的新請求由執行中的任務在結束前補做
+_refresh_lock = threading.Lock()
+_refresh_requested = False
+
+
+def vector_hash(model_version: int, data: Optional[bytes]) -> str:
+    """書籤向量與索引模型版本的雜湊（模型切換後所有相關書籤都需重算）"""
+    payload = model_version.to_bytes(8, "little", signed=True) + (data or b"")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _chunks(ids: Iterable[int]) -> Iterable[List[int]]:
+    ids = list(ids)
+    for start in range(0, len(ids), _IN_CHUNK):
+        yield ids[start : start + _IN_CHUNK]
+
+
+def _top_neighbors(row_ids: np.ndarray, scores: np.ndarray, k: int) -> Neighbors:
+    """從一列相似度以 argpartition 選出前 k 名（不含相似度為 0 的書籤）"""
+    top = np.argpartition(scores, -k)[-k:] if k < scores.size else np.arange(scores.size)
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [(int(row_ids[i]), float(scores[i])) for i in top if scores[i] > 0.0]
+
+
+def _store(db: Session, neighbors: Dict[int, Neighbors], hashes: Dict[int, str], k: int) -> None:
+    """取代書籤的相關書籤與計算狀態並提交"""
+    ids = list(neighbors)
+    db.execute(delete(BookmarkNeighbor).where(BookmarkNeighbor.bookmark_id.in_(ids)))
+    db.execute(delete(BookmarkNeighborState).where(BookmarkNeighborState.bookmark_id.in_(ids)))
+    rows = [
+        {"bookmark_id": bookmark_id, "neighbor_id": neighbor_id, "rank": rank, "similarity": score}
+        for bookmark_id, ranked in neighbors.items()
+        for rank, (neighbor_id, score) in enumerate(ranked)
+    ]
+    if rows:
+        db.execute(insert(BookmarkNeighbor), rows)
+    db.execute(
+        insert(BookmarkNeighborState),
+        [
+            {
+                "bookmark_id": bookmark_id,
+                "vector_hash": hashes[bookmark_id],
+                "kth_similarity": ranked[k - 1][1] if len(ranked) >= k else 0.0,
+            }
+            for bookmark_id, ranked in neighbors.items()
+        ],
+    )
+    db.commit()
+
+
+def _remove(db: Session, bookmark_ids: Set[int]) -> None:
+    """刪除已不存在（或已無向量）書籤的相關書籤與計算狀態"""
+    for chunk in _chunks(bookmark_ids):
+        db.execute(delete(BookmarkNeighbor).where(BookmarkNeighbor.bookmark_id.in_(chunk)))
+        db.execute(
+            delete(BookmarkNeighborState).where(BookmarkNeighborState.bookmark_id.in_(chunk))
+        )
+    db.commit()
+
+
+def _referencing(db: Session, bookmark_ids: Set[int]) -> Set[int]:
+    """相關書籤中含有指定書籤的書籤"""
+    found: Set[int] = set()
+    for chunk in _chunks(bookmark_ids):
+        found.update(
+            db.execute(
+                select(BookmarkNeighbor.bookmark_id).where(BookmarkNeighbor.neighbor_id.in_(chunk))
+            ).scalars()
+        )
+    return found
+
+
+def refresh_neighbors(
+    db: Session, k: Optional[int] = None, block_size: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    重算向量改變的書籤與受影響書籤的相關書籤
+
+    Args:
+        db: 資料庫 Session
+        k: 每個書籤保存的相關書籤數量，未提供時使用 RELATED_NEIGHBORS
+        block_size: 每次矩陣乘法的書籤數，未提供時使用 RELATED_BLOCK_SIZE
+
+    Returns:
+        統計資訊：changed（向量改變）、removed（刪除）、affected（排名受影響）
+    """
+    from app import config
+
+    k = k or config.RELATED_NEIGHBORS
+    block_size = block_size or config.RELATED_BLOCK_SIZE
+    index = get_vector_index()
+    model_version = index.model_version
+
+    states = {
+        bookmark_id: (stored_hash, kth)
+        for bookmark_id, stored_hash, kth in db.execute(
+            select(
+                BookmarkNeighborState.bookmark_id,
+                BookmarkNeighborState.vector_hash,
+                BookmarkNeighborState.kth_similarity,
+            )
+        )
+    }
+    hashes = {
+        bookmark_id: vector_hash(model_version, data)
+        for bookmark_id, data in db.execute(
+            select(Bookmark.id, Bookmark.tfidf_vector)
+            .where(Bookmark.tfidf_vector.isnot(None))
+            .execution_options(yield_per=1000)
+        )
+    }
+    changed = {bid for bid, current in hashes.items() if states.get(bid, ("",))[0] != current}
+    removed = set(states) - set(hashes)
+    stats = {"changed": len(changed), "removed": len(removed), "affected": 0}
+    if not changed and not removed:
+        return stats
+
+    affected = _referencing(db, changed | removed)
+    if removed:
+        _remove(db, removed)
+
+    thresholds: Optional[np.ndarray] = None
+    computed: Set[int] = set()
+    for block_ids, row_ids, scores in index.similarity_blocks(sorted(changed), block_size):
+        if index.model_version != model_version:
+            # 模型在計算期間切換，由切換後的重算請求以新模型重算
+            logger.info("Vector model changed during neighbour refresh. Stopping.")
+            return stats
+        if thresholds is None:
+            # 沒有計算狀態的書籤本身就在 changed 中，不需比較
+            thresholds = np.array(
+                [states.get(bid, (None, np.inf))[1] for bid in row_ids.tolist()],
+                dtype=np.float32,
+            )
+        affected.update(row_ids[np.any(scores > thresholds, axis=0)].tolist())
+        _store(
+            db,
+            {bid: _top_neighbors(row_ids, row, k) for bid, row in zip(block_ids, scores)},
+            hashes,
+            k,
+        )
+        computed.update(block_ids)
+
+    # 不在索引中的書籤（空向量或屬於其他模型版本）沒有相關書籤
+    missing = changed - computed
+    for chunk in _chunks(missing):
+        _store(db, {bid: [] for bid in chunk}, hashes, k)
+
+    affected = (affected & hashes.keys()) - changed
+    stats["affected"] = len(affected)
+    for block_ids, row_ids, scores in index.similarity_blocks(sorted(affected), block_size):
+        _store(
+            db,
+            {bid: _top_neighbors(row_ids, row, k) for bid, row in zip(block_ids, scores)},
+            hashes,
+            k,
+        )
+
+    logger.info(
+        f"Related bookmarks refreshed: {len(changed)} changed, {len(removed)} removed, "
+        f"{len(affected)} affected"
+    )
+    return stats
+
+
+def refresh_neighbors_task() -> None:
+    """背景任務：重算相關書籤（執行中時只記錄請求，由執行中的任務結束前再重算一次）"""
+    global _refresh_requested
+    from app.models.database import SessionLocal
+
+    _refresh_requested = True
+    while _refresh_requested and _refresh_lock.acquire(blocking=False):
+        try:
+            while _refresh_requested:
+                _refresh_requested = False
+                db = SessionLocal()
+                try:
+                    refresh_neighbors(db)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error refreshing related bookmarks: {e}", exc_info=True)
+                finally:
+                    db.close()
+        finally:
+            _refresh_lock.release()
+
+
+def is_current(db: Session, bookmark: Bookmark) -> bool:
+    """書籤的相關書籤是否已對應目前的向量"""
+    state = db.get(BookmarkNeighborState, bookmark.id)
+    return state is not None and state.vector_hash == vector_hash(
+        get_vector_index().model_version, bookmark.tfidf_vector
+    )
+
+
+def get_related(db: Session, bookmark: Bookmark, limit: int) -> List[Tuple[Bookmark, float]]:
+    """
+    獲取相關書籤
+
+    相關書籤表已對應目前的向量時只讀取前 limit 列；尚未計算或向量已改變時，
+    以向量索引即時計算這一個書籤（相關書籤表由背景任務更新）。
+
+    Args:
+        db: 資料庫 Session
+        bookmark: 書籤
+        limit: 返回的相關書籤數量
+
+    Returns:
+        依相似度由高到低排序的 (書籤, 相似度)
+    """
+    if bookmark.tfidf_vector is None or limit <= 0:
+        return []
+
+    if is_current(db, bookmark):
+        rows = db.execute(
+            select(Bookmark, BookmarkNeighbor.similarity)
+            .join(BookmarkNeighbor, BookmarkNeighbor.neighbor_id == Bookmark.id)
+            .where(BookmarkNeighbor.bookmark_id == bookmark.id)
+            .order_by(BookmarkNeighbor.rank)
+            .limit(limit)
+        ).all()
+        return [(related, similarity) for related, similarity in rows]
+
+    vector = decode_vector(bookmark.tfidf_vector)
+    if vector is None:
+        return []
+    ranked = [
+        (bookmark_id, score)
+        for bookmark_id, score in get_vector_index().top_k(vector.indices, vector.values, limit + 1)
+        if bookmark_id != bookmark.id
+    ][:limit]
+    bookmarks = {
+        related.id: related
+        for related in db.query(Bookmark).filter(Bookmark.id.in_([bid for bid, _ in ranked]))
+    }
+    return [(bookmarks[bid], score) for bid, score in ranked if bid in bookmarks]
@@ -0,0 +1,176 @@
+"""
+書籤網頁的原始頁面快取
+每個書籤保存最後一次抓取的 HTML（zlib 壓縮）與回應的 ETag、Last-Modified：
+
+- 重新豐富化時送出條件式請求，304 或 HTML 雜湊未改變時略過解析、關鍵字提取與向量化
+- 解析規則改進後可由快取重新解析所有書籤，不需網路請求
+"""
+
+import hashlib
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .content_enricher import FetchedPage
+
+# zlib 壓縮等級：HTML 約可壓縮為原本的 1/4 至 1/6，等級再提高的壓縮率差異很小
+COMPRESSION_LEVEL = 6
+
+
+class CachedPage(NamedTuple):
+    """快取頁面的驗證資訊"""
+
+    etag: Optional[str]
+    last_modified: Optional[str]
+    html_hash: str
+
+
+def compress_html(html: str) -> bytes:
+    return zlib.compress(html.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress_html(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def html_hash(html: str) -> str:
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_cached_page(db: Session, bookmark_id: int, url: str) -> Optional[CachedPage]:
+    """
+    取得書籤快取頁面的驗證資訊
+
+    Args:
+        db: 資料庫 Session
+        bookmark_id: 書籤 ID
+        url: 目前要抓取的 URL（與快取時的 URL 不同時視為沒有快取）
+
+    Returns:
+        快取頁面的驗證資訊，沒有快取時為 None
+    """
+    from app.models.database import BookmarkPage
+
+    row = db.execute(
+        select(
+            BookmarkPage.url,
+            BookmarkPage.etag,
+            BookmarkPage.last_modified,
+            BookmarkPage.html_hash,
+        ).where(BookmarkPage.bookmark_id == bookmark_id)
+    ).first()
+    if row is None or row.url != url:
+        return None
+    return CachedPage(row.etag, row.last_modified, row.html_hash)
+
+
+def store_pages(db: Session, pages: List[Tuple[int, str, FetchedPage]]) -> None:
+    """
+    寫入或取代書籤的快取頁面（不提交交易，由呼叫者提交）
+
+    Args:
+        db: 資料庫 Session
+        pages: (書籤 ID, URL, 狀態碼 200 的抓取結果) 列表
+    """
+    from app.models.database import BookmarkPage
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "bookmark_id": bookmark_id,
+            "url": url,
+            "etag": page.etag,
+            "last_modified": page.last_modified,
+            "html": compress_html(page.html),
+            "html_hash": html_hash(page.html),
+            "raw_size": len(page.html.encode("utf-8")),
+            "fetched_at": now,
+            "checked_at": now,
+        }
+        for bookmark_id, url, page in pages
+        if page.html is not None
+    ]
+    if not rows:
+        return
+
+    statement = insert(BookmarkPage)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[BookmarkPage.bookmark_id],
+            set_={
+                column: statement.excluded[column]
+                for column in rows[0]
+                if column != "bookmark_id"
+            },
+        ),
+        rows,
+    )
+
+
+def mark_checked(db: Session, bookmark_id: int, page: FetchedPage) -> None:
+    """
+    記錄頁面未改變的檢查結果（304 或內容相同的 200），更新回應的驗證標頭
+    （不提交交易，由呼叫者提交）
+    """
+    from app.models.database import BookmarkPage
+
+    values = {"checked_at": datetime.now(timezone.utc)}
+    # 304 回應可省略驗證標頭，只在回應有提供時更新
+    if page.etag:
+        values["etag"] = page.etag
+    if page.last_modified:
+        values["last_modified"] = page.last_modified
+    db.execute(
+        update(BookmarkPage).where(BookmarkPage.bookmark_id == bookmark_id).values(**values)
+    )
+
+
+def iter_cached_pages(
+    db: Session, bookmark_ids: Optional[List[int]] = None, batch_size: int = 100
+) -> Iterator[List[Tuple[int, str, str]]]:
+    """
+    逐批讀取快取頁面並解壓縮
+
+    Args:
+        db: 資料庫 Session
+        bookmark_ids: 只讀取這些書籤，未提供時讀取所有快取頁面
+        batch_size: 每批的頁面數
+
+    Yields:
+        (書籤 ID, URL, HTML) 列表
+    """
+    from app.models.database import BookmarkPage
+
+    statement = select(BookmarkPage.bookmark_id, BookmarkPage.url, BookmarkPage.html).order_by(
+        BookmarkPage.bookmark_id
+    )
+    if bookmark_ids is not None:
+        statement = statement.where(BookmarkPage.bookmark_id.in_(bookmark_ids))
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        yield [(bookmark_id, url, decompress_html(data)) for bookmark_id, url, data in rows]
+
+
+def remove_page(db: Session, bookmark_id: int) -> None:
+    """移除書籤的快取頁面（不提交交易，由呼叫者提交）"""
+    from app.models.database import BookmarkPage
+
+    db.execute(delete(BookmarkPage).where(BookmarkPage.bookmark_id == bookmark_id))
+
+
+def stats(db: Session) -> Dict[str, int]:
+    """快取頁面數、原始與壓縮後的總位元組數"""
+    from app.models.database import BookmarkPage
+
+    pages, raw_bytes, compressed_bytes = db.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(BookmarkPage.raw_size), 0),
+            func.coalesce(func.sum(func.length(BookmarkPage.html)), 0),
+        ).select_from(BookmarkPage)
+    ).one()
+    return {"pages": pages, "raw_bytes": raw_bytes, "compressed_bytes": compressed_bytes}
@@ -0,0 +1,318 @@
+"""
+向量化器藍綠重新訓練
+新模型在影子欄位 tfidf_vector_next 產生所有書籤向量，期間舊模型與舊索引持續提供搜尋；
+完成後在單一交易中切換資料庫向量，再同時替換全局模型與向量索引
+"""
+
+import logging
+import threading
+from typing import Iterator, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .content_enricher import ContentEnricher
+from .inverted_index import sync_document_frequencies
+from .search_cache import bump_generation
+from .tfidf_vectorizer import (
+    TFIDFVectorizer,
+    build_training_text,
+    compute_corpus_fingerprint,
+    create_vectorizer,
+    get_model_dir,
+    get_vectorizer,
+)
+from .token_cache import get_document_tokens
+from .tokenizer import shutdown_pool
+from .vector_codec import UNKNOWN_MODEL_VERSION, decode_vector
+from .vector_index import activate_model, build_vector_index, get_vector_index
+
+logger = logging.getLogger(__name__)
+
+# 同一時間只允許一個重新訓練任務
+_retrain_lock = threading.Lock()
+
+# retrain_in_shadow 的結果
+RETRAINED = "retrained"
+BUSY = "busy"  # 另一個重新訓練任務正在執行
+NOTHING_TO_TRAIN = "nothing_to_train"  # 雜湊模式或沒有可訓練的文本
+FAILED = "failed"
+
+
+def is_retraining() -> bool:
+    """是否有重新訓練任務正在執行"""
+    return _retrain_lock.locked()
+
+
+def _content_bookmark_chunks(db: Session, chunk_size: int, *columns) -> Iterator[list]:
+    """
+    以 yield_per 依 ID 順序串流讀取有內容且非近似重複的書籤，每次產生一批
+
+    db 需綁定單一連線（見 streaming_session），呼叫者才能在批次之間提交。
+    """
+    from app.models.database import Bookmark
+
+    result = db.execute(
+        select(Bookmark.id, *columns)
+        .where(
+            Bookmark.content.isnot(None),
+            Bookmark.content != "",
+            Bookmark.duplicate_of.is_(None),  # 近似重複的書籤不參與訓練也不產生向量
+        )
+        .order_by(Bookmark.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    yield from result.partitions()
+
+
+def _collect_training_texts(db: Session, vectorizer: TFIDFVectorizer, chunk_size: int) -> list:
+    """讀取所有書籤的已分詞訓練文本（分詞結果取自 token_cache，新的結果每批提交一次）"""
+    from app.models.database import Bookmark
+
+    texts = []
+    for rows in _content_bookmark_chunks(
+        db, chunk_size, Bookmark.title, Bookmark.description, Bookmark.content, Bookmark.keywords
+    ):
+        for document in get_document_tokens(db, rows):
+            text = build_training_text(document.normalized(vectorizer.stop_words))
+            if text:
+                texts.append(text)
+        db.commit()
+    return texts
+
+
+def _write_shadow_vectors(
+    db: Session,
+    vectorizer: TFIDFVectorizer,
+    enricher: ContentEnricher,
+    chunk_size: int,
+    only_missing: bool = False,
+) -> int:
+    """
+    以新模型為書籤產生影子向量，每批提交一次
+
+    以 updated_at 做樂觀鎖：書籤在讀取後被豐富化或編輯時不寫入（豐富化會清除影子向量，
+    之後由補寫階段重新產生）。
+
+    Returns:
+        寫入的影子向量數量
+    """
+    from app.models.database import Bookmark
+
+    written = 0
+    for rows in _content_bookmark_chunks(
+        db, chunk_size,
+        Bookmark.title, Bookmark.description, Bookmark.content, Bookmark.keywords,
+        Bookmark.updated_at, Bookmark.tfidf_vector_next.isnot(None).label("has_next"),
+    ):
+        pending = [row for row in rows if not (only_missing and row.has_next)]
+        vectors = enricher.generate_tfidf_vectors(
+            db,
+            pending,
+            vectorizer=vectorizer,
+            assign_new_terms=False,  # 影子模型剛以同一語料訓練，不需預留槽位
+        )
+        for row, vector in zip(pending, vectors):
+            if not vector:
+                continue
+            result = db.execute(
+                update(Bookmark)
+                .where(Bookmark.id == row.id, Bookmark.updated_at == row.updated_at)
+                # 保留原本的 updated_at，影子向量不算書籤內容的變更
+                .values(tfidf_vector_next=vector, updated_at=Bookmark.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            written += result.rowcount
+        db.commit()
+    return written
+
+
+def _promote_shadow_vectors(db: Session) -> int:
+    """在單一交易中以影子向量取代現行向量"""
+    from app.models.database import Bookmark
+
+    result = db.execute(
+        update(Bookmark)
+        .where(Bookmark.tfidf_vector_next.isnot(None))
+        .values(
+            tfidf_vector=Bookmark.tfidf_vector_next,
+            tfidf_vector_next=None,
+            updated_at=Bookmark.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _clear_shadow_vectors(db: Session) -> None:
+    from app.models.database import Bookmark
+
+    db.execute(
+        update(Bookmark)
+        .where(Bookmark.tfidf_vector_next.isnot(None))
+        .values(tfidf_vector_next=None, updated_at=Bookmark.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _refresh_stale_vectors(
+    db: Session, vectorizer: TFIDFVectorizer, enricher: ContentEnricher, chunk_size: int
+) -> int:
+    """
+    切換後以新模型重新產生仍屬於舊模型的向量（切換前一刻才完成豐富化的書籤）
+
+    Returns:
+        重新產生的向量數量
+    """
+    from app.models.database import Bookmark
+
+    index = get_vector_index()
+    refreshed = 0
+    for rows in _content_bookmark_chunks(db, chunk_size, Bookmark.tfidf_vector):
+        stale_ids = []
+        for bookmark_id, data in rows:
+            vector = decode_vector(data)
+            if vector is None or vector.model_version != vectorizer.model_version:
+                stale_ids.append(bookmark_id)
+        if not stale_ids:
+            continue
+
+        bookmarks = db.query(Bookmark).filter(Bookmark.id.in_(stale_ids)).all()
+        vectors = enricher.generate_tfidf_vectors(db, bookmarks, vectorizer=vectorizer)
+        for bookmark, vector in zip(bookmarks, vectors):
+            bookmark.tfidf_vector = vector
+            refreshed += 1
+        db.commit()
+        for bookmark_id, data in db.query(Bookmark.id, Bookmark.tfidf_vector).filter(
+            Bookmark.id.in_(stale_ids)
+        ):
+            index.upsert_encoded(bookmark_id, data)
+        bump_generation()
+    return refreshed
+
+
+def retrain_in_shadow(db: Optional[Session] = None, chunk_size: int = 500) -> str:
+    """
+    在影子欄位訓練新模型並產生向量，完成後原子地切換為現行模型
+
+    流程：
+        1. 以目前語料訓練新的 TFIDFVectorizer（不動全局實例）
+        2. 分批將新向量寫入 tfidf_vector_next，並補寫期間新增或豐富化的書籤
+        3. 存檔模型，以單一 UPDATE 將影子向量切換為現行向量
+        4. 建立新的向量索引，與新模型一起取代全局實例
+
+    搜尋在整個過程中都由舊模型提供服務。
+
+    Args:
+        db: 使用中的資料庫 Session（需綁定單一連線，見 streaming_session），未提供時自行建立
+        chunk_size: 每批處理的書籤數量
+
+    Returns:
+        RETRAINED（已切換到新模型）、BUSY、NOTHING_TO_TRAIN 或 FAILED（訓練或切換失敗，
+        舊模型維持不變）
+    """
+    if db is None:
+        from app.models.database import streaming_session
+
+        with streaming_session() as db:
+            return retrain_in_shadow(db, chunk_size)
+
+    if not _retrain_lock.acquire(blocking=False):
+        logger.info("Vectorizer retraining is already in progress")
+        return BUSY
+
+    try:
+        shadow = create_vectorizer()
+        if shadow.hashing:
+            logger.info("Hashing vectorizer does not need retraining")
+            return NOTHING_TO_TRAIN
+
+        # 捨棄上次未完成的影子向量
+        _clear_shadow_vectors(db)
+
+        corpus_fingerprint = compute_corpus_fingerprint(db)
+        texts = _collect_training_texts(db, shadow, chunk_size)
+        if not texts:
+            logger.info("No texts found for training")
+            return NOTHING_TO_TRAIN
+
+        logger.info(f"Training shadow vectorizer with {len(texts)} texts...")
+        shadow.fit(texts, preprocessed=True)
+        if not shadow.is_trained:
+            logger.error("Shadow vectorizer training failed. Keeping the current model.")
+            return FAILED
+        if shadow.uses_live_idf:
+            sync_document_frequencies(db, shadow)
+
+        enricher = ContentEnricher()
+        written = _write_shadow_vectors(db, shadow, enricher, chunk_size)
+        written += _write_shadow_vectors(db, shadow, enricher, chunk_size, only_missing=True)
+        logger.info(f"Generated {written} shadow vectors for model {shadow.model_version}")
+
+        # 先存檔再切換資料庫向量：兩者之間中斷時，啟動時由 finish_interrupted_swap 完成切換
+        shadow.save(get_model_dir(), corpus_fingerprint)
+        promoted = _promote_shadow_vectors(db)
+        index = build_vector_index(db, shadow)
+        if shadow.uses_live_idf:
+            # 訓練期間提交的文件頻率變化只套用到舊模型，切換前重新統計
+            sync_document_frequencies(db, shadow)
+        activate_model(shadow, index)
+
+        refreshed = _refresh_stale_vectors(db, shadow, enricher, chunk_size)
+        logger.info(
+            f"Retraining completed: {promoted} vectors promoted, "
+            f"{refreshed} stale vectors refreshed"
+        )
+        return RETRAINED
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error in shadow retraining: {e}", exc_info=True)
+        try:
+            _clear_shadow_vectors(db)
+        except Exception:
+            db.rollback()
+        return FAILED
+    finally:
+        shutdown_pool()
+        _retrain_lock.release()
+
+
+def finish_interrupted_swap() -> None:
+    """
+    啟動時處理上次重新訓練留下的影子向量
+
+    影子向量屬於已載入的模型時（模型檔已存檔但資料庫尚未切換）完成切換，否則捨棄。
+    """
+    from app.models.database import Bookmark, SessionLocal
+
+    db = SessionLocal()
+    try:
+        data = (
+            db.query(Bookmark.tfidf_vector_next)
+            .filter(Bookmark.tfidf_vector_next.isnot(None))
+            .limit(1)
+            .scalar()
+        )
+        if data is None:
+            return
+
+        vector = decode_vector(data)
+        live_version = get_vectorizer().model_version
+        if (
+            vector is not None
+            and live_version != UNKNOWN_MODEL_VERSION
+            and vector.model_version == live_version
+        ):
+            promoted = _promote_shadow_vectors(db)
+            logger.info(f"Finished interrupted model swap: {promoted} vectors promoted")
+        else:
+            _clear_shadow_vectors(db)
+            logger.info("Discarded shadow vectors from an interrupted retraining")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error finishing interrupted model swap: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,211 @@
+"""
+搜尋結果快取
+以 (索引世代, 正規化查詢, 結果數量) 為鍵快取搜尋結果
+
+書籤新增、修改、刪除、豐富化、批量向量化與模型切換時遞增索引世代，
+舊世代的結果不會再被命中，不需依賴 TTL 猜測結果何時過期。
+快取未命中時，同時到達的相同查詢由 SingleFlight 合併為一次計算。
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+SearchKey = Tuple[int, str, int]
+
+# 索引世代：任何會改變搜尋結果的寫入都會遞增
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def current_generation() -> int:
+    """目前的索引世代"""
+    return _generation
+
+
+def bump_generation() -> int:
+    """
+    遞增索引世代，使所有已快取的搜尋結果失效
+
+    Returns:
+        新的索引世代
+    """
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        return _generation
+
+
+def normalize_query(query: str) -> str:
+    """正規化查詢：轉小寫並合併空白（搜尋流程對大小寫不敏感）"""
+    return " ".join(query.lower().split())
+
+
+class SearchResultCache:
+    """以結果的序列化大小限制記憶體用量的 LRU 快取"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (搜尋結果, 估計大小)，依最近使用排序
+        self._entries: "OrderedDict[SearchKey, Tuple[List[Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._entries_generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, query: str, limit: int) -> Tuple[Optional[List[Any]], SearchKey]:
+        """
+        以目前的索引世代查詢快取
+
+        Args:
+            query: 搜尋查詢
+            limit: 結果數量
+
+        Returns:
+            (快取的搜尋結果，未命中時為 None；快取鍵，搜尋完成後傳給 store)
+        """
+        key = (current_generation(), normalize_query(query), limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, key
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], key
+
+    def store(self, key: SearchKey, results: List[Any], size: int) -> None:
+        """
+        寫入搜尋結果，超過記憶體上限時淘汰最久未使用的條目
+
+        搜尋期間索引世代已改變時不寫入（結果可能已過期）。
+
+        Args:
+            key: lookup 返回的快取鍵
+            results: 搜尋結果
+            size: 結果的估計大小（位元組）
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key[0] != current_generation():
+                return
+            # 所有條目都屬於同一世代；世代改變後舊條目不會再被命中，直接釋放
+            if key[0] != self._entries_generation:
+                self._entries.clear()
+                self._bytes = 0
+                self._entries_generation = key[0]
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (results, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空快取（統計計數保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """快取統計資訊"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "generation": current_generation(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    """
+    合併同時進行的相同請求
+
+    第一個請求執行計算，計算完成前到達的相同鍵請求等待同一個結果；
+    計算在獨立的 Task 中進行，第一個請求中斷連線不會取消其他請求等待的計算。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Any, "asyncio.Task[Any]"] = {}
+        self.requests = 0
+        self.executions = 0
+
+    async def run(self, key: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        執行或加入相同鍵的計算
+
+        Args:
+            key: 請求鍵（相同鍵的請求共用結果）
+            compute: 產生計算 coroutine 的函式，只有第一個請求會呼叫
+
+        Returns:
+            計算結果（計算拋出的例外會傳給所有等待的請求）
+        """
+        self.requests += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """合併統計資訊"""
+        coalesced = self.requests - self.executions
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "in_flight": len(self._inflight),
+            "dedup_ratio": coalesced / self.requests if self.requests else 0.0,
+        }
+
+
+# 全局實例
+_cache_instance: Optional[SearchResultCache] = None
+_flight_instance: Optional[SingleFlight] = None
+
+
+def get_search_cache() -> SearchResultCache:
+    """
+    獲取全局搜尋結果快取
+
+    Returns:
+        SearchResultCache 實例
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        from app import config
+
+        _cache_instance = SearchResultCache(config.SEARCH_CACHE_MAX_BYTES)
+    return _cache_instance
+
+
+def get_search_flight() -> SingleFlight:
+    """
+    獲取全局搜尋請求合併器
+
+    Returns:
+        SingleFlight 實例
+    """
+    global _flight_instance
+    if _flight_instance is None:
+        _flight_instance = SingleFlight()
+    return _flight_instance
@@ -6,22 +6,58 @@ TF-IDF 向量化服務
 import hashlib
 import json
 import logging
-import time
-from typing import Any, Dict, List, Optional, Tuple
+import math
+import os
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import jieba
 import numpy as np
 from jieba import analyse
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer as SklearnTfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.utils import murmurhash3_32
+
+from .tokenizer import preprocess_many, preprocess_text
+from .vector_codec import UNKNOWN_MODEL_VERSION, decode_vector, pack_vector
 
 logger = logging.getLogger(__name__)
 
+# 模型檔格式版本，格式不相容時遞增
+ARTIFACT_VERSION = 1
+MODEL_FILENAME = "tfidf_model.npz"
+VOCABULARY_FILENAME = "tfidf_vocabulary.json"
+
+
+def _atomic_write(path: Path, write) -> None:
+    """先寫入同目錄的暫存檔再以 os.replace 取代，避免留下寫到一半的檔案"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
 class TFIDFVectorizer:
     """TF-IDF 向量化器，集成中文分詞和向量相似度計算"""
 
-    def __init__(self, max_features: int = 5000, min_df: int = 2, max_df: float = 0.8):
+    def __init__(
+        self,
+        max_features: int = 5000,
+        min_df: int = 2,
+        max_df: float = 0.8,
+        incremental: bool = False,
+        feature_reserve: float = 0.2,
+        hash_bits: int = 0,
+        lsa_components: int = 0,
+    ):
         """
         初始化 TF-IDF 向量化器
 
@@ -29,17 +65,40 @@ class TFIDFVectorizer:
             max_features: 最大特徵數量
             min_df: 最小文檔頻率
             max_df: 最大文檔頻率
+            incremental: 是否使用增量模式（IDF 隨文件頻率即時更新）
+            feature_reserve: 增量模式下為新詞彙預留的槽位（訓練時詞彙數的比例）
+            hash_bits: 大於 0 時使用雜湊模式，特徵維度為 2^hash_bits
+            lsa_components: 大於 0 時訓練 LSA（TruncatedSVD）投影的維度，僅用於詞彙表模式
         """
         self.max_features = max_features
         self.min_df = min_df
         self.max_df = max_df
+        # 詞彙表與增量模式訓練後的 sklearn 向量化器（雜湊模式不使用，見 is_trained）
         self.vectorizer: Optional[SklearnTfidfVectorizer] = None
         self.feature_names: List[str] = []
-
-        # 相似度計算快取
-        self.similarity_cache: Dict[str, Tuple[float, float]] = {}  # key -> (similarity, timestamp)
-        self.cache_max_size = 10000  # 最大快取條目數
-        self.cache_ttl = 3600  # 快取存活時間（秒）
+        self.model_version: int = UNKNOWN_MODEL_VERSION  # 由詞彙表與 IDF 權重計算的模型指紋
+
+        # 增量模式：文件向量只含正規化詞頻，IDF 由即時的文件頻率計算並套用於查詢端
+        self.incremental = incremental
+        self.feature_reserve = feature_reserve
+        self.feature_capacity = 0  # 特徵空間大小（含新詞彙的預留槽位）
+        self.vocabulary: Dict[str, int] = {}  # 詞彙 -> 槽位
+        self.document_frequency: Counter = Counter()  # 詞彙 -> 含該詞彙的書籤數（不限於詞彙表）
+        self.document_count = 0
+        self.artifact_dir: Optional[Path] = None  # 模型檔目錄，新分配的槽位會寫回詞彙表檔
+        self._vocabulary_lock = threading.Lock()
+        self._reserve_exhausted = False
+
+        # 雜湊模式：詞彙以雜湊對應槽位，不需訓練也不會過期；IDF 與增量模式相同於查詢端即時套用
+        self.hash_bits = hash_bits
+        if self.hashing:
+            # 槽位由 _hash_slot 計算，建立後即可使用
+            self.feature_capacity = 1 << hash_bits
+            self.model_version = self._compute_model_version()
+
+        # LSA：訓練時以 TruncatedSVD 求得的投影矩陣 (維度, 特徵數)，新書籤直接投影不需重新分解
+        self.lsa_components = lsa_components
+        self.lsa_projection: Optional[np.ndarray] = None
 
         # 中文停用詞列表
         self.stop_words = {
@@ -157,76 +216,211 @@ class TFIDFVectorizer:
         Returns:
             處理後的文本
         """
-        if not text or not text.strip():
-            return ""
+        return preprocess_text(text, self.stop_words)
 
-        # 使用 jieba 分詞
-        words = jieba.lcut(text.lower())
+    def preprocess_many(self, texts: Sequence[str]) -> List[str]:
+        """
+        批量預處理文本（文件數足夠時以行程池平行分詞，見 tokenizer.preprocess_many）
 
-        # 過濾停用詞和短詞
-        filtered_words = [
-            word.strip()
-            for word in words
-            if word.strip() and len(word.strip()) > 1 and word.strip() not in self.stop_words
-        ]
+        Args:
+            texts: 原始文本列表
 
-        return " ".join(filtered_words)
+        Returns:
+            與輸入順序相同的預處理結果
+        """
+        return preprocess_many(texts, self.stop_words)
+
+    @property
+    def hashing(self) -> bool:
+        """是否為雜湊模式"""
+        return self.hash_bits > 0
+
+    @property
+    def is_trained(self) -> bool:
+        """模型是否可用於向量化（雜湊模式不需訓練）"""
+        return self.hashing or self.vectorizer is not None
+
+    @property
+    def uses_live_idf(self) -> bool:
+        """文件向量不含 IDF、由查詢端套用即時 IDF（增量模式與雜湊模式）"""
+        return self.incremental or self.hashing
+
+    @property
+    def mode(self) -> str:
+        """向量化模式名稱"""
+        if self.hashing:
+            return "hashing"
+        return "incremental" if self.incremental else "vocabulary"
+
+    @property
+    def feature_count(self) -> int:
+        """向量的特徵空間大小（增量模式包含預留槽位）"""
+        return self.feature_capacity if self.uses_live_idf else len(self.feature_names)
+
+    def _compute_model_version(self) -> int:
+        """以詞彙表與 IDF 權重計算模型版本（相同語料訓練出的模型版本相同）"""
+        if self.hashing:
+            # 雜湊模式的向量只取決於維度
+            return zlib.crc32(f"hashing:{self.hash_bits}".encode()) or 1
+
+        checksum = zlib.crc32("\n".join(self.feature_names).encode("utf-8"))
+        if self.incremental:
+            # 增量模式的 IDF 持續變動且不影響文件向量，版本只由訓練時的詞彙表與槽位數決定
+            checksum = zlib.crc32(f"incremental:{self.feature_capacity}".encode(), checksum)
+        else:
+            idf = np.asarray(self.vectorizer.idf_, dtype=np.float64)
+            checksum = zlib.crc32(idf.tobytes(), checksum)
+        # 0 保留給未知版本
+        return checksum or 1
+
+    def _create_sklearn_vectorizer(
+        self, vocabulary: Optional[List[str]] = None
+    ) -> SklearnTfidfVectorizer:
+        """建立 sklearn 向量化器（提供詞彙表時用於載入已訓練的模型）"""
+        return SklearnTfidfVectorizer(
+            max_features=self.max_features,
+            min_df=self.min_df,
+            max_df=self.max_df,
+            tokenizer=str.split,  # 因為已經預處理過了
+            token_pattern=None,
+            lowercase=False,  # 已經轉小寫了
+            stop_words=None,  # 已經去停用詞了
+            vocabulary=vocabulary,
+        )
 
-    def _generate_cache_key(self, vector1_json: str, vector2_json: str) -> str:
+    def save(self, directory: Path, corpus_fingerprint: str) -> None:
         """
-        生成快取鍵值
+        將已訓練的詞彙表、IDF 權重與模型版本存檔
 
         Args:
-            vector1_json: 第一個向量的 JSON 字串
-            vector2_json: 第二個向量的 JSON 字串
-
-        Returns:
-            快取鍵值
+            directory: 存放模型檔的目錄
+            corpus_fingerprint: 訓練語料的指紋，用於判斷啟動時是否需要重新訓練
         """
-        # 確保一致的順序（較小的哈希值在前）
-        hash1 = hashlib.md5(vector1_json.encode()).hexdigest()
-        hash2 = hashlib.md5(vector2_json.encode()).hexdigest()
+        if self.hashing:
+            raise ValueError("Hashing vectorizer has no trained model to save")
+        if not self.vectorizer:
+            raise ValueError("Cannot save an untrained vectorizer")
+
+        directory.mkdir(parents=True, exist_ok=True)
+        self._write_vocabulary(directory)
+        _atomic_write(
+            directory / MODEL_FILENAME,
+            lambda f: np.savez(
+                f,
+                artifact_version=np.int64(ARTIFACT_VERSION),
+                model_version=np.int64(self.model_version),
+                corpus_fingerprint=np.str_(corpus_fingerprint),
+                idf=np.asarray(self.vectorizer.idf_, dtype=np.float64),
+                params=np.array([self.max_features, self.min_df, self.max_df], dtype=np.float64),
+                incremental=np.int64(self.incremental),
+                feature_capacity=np.int64(self.feature_capacity),
+                lsa_components=np.int64(self.lsa_components),
+                lsa_projection=(
+                    self.lsa_projection
+                    if self.lsa_projection is not None
+                    else np.empty((0, 0), dtype=np.float32)
+                ),
+            ),
+        )
+        self.artifact_dir = directory
+        logger.info(f"TF-IDF model {self.model_version} saved to {directory}")
+
+    def _write_vocabulary(self, directory: Path) -> None:
+        with self._vocabulary_lock:
+            vocabulary = {"model_version": self.model_version, "features": list(self.feature_names)}
+        _atomic_write(
+            directory / VOCABULARY_FILENAME,
+            lambda f: f.write(json.dumps(vocabulary, ensure_ascii=False).encode("utf-8")),
+        )
 
-        if hash1 < hash2:
-            return f"{hash1}:{hash2}"
-        else:
-            return f"{hash2}:{hash1}"
+    def load(self, directory: Path) -> Optional[str]:
+        """
+        從模型檔載入已訓練的模型
 
-    def _cleanup_cache(self) -> None:
-        """清理過期的快取條目"""
-        current_time = time.time()
-        expired_keys = []
+        Args:
+            directory: 存放模型檔的目錄
 
-        for key, (similarity, timestamp) in self.similarity_cache.items():
-            if current_time - timestamp > self.cache_ttl:
-                expired_keys.append(key)
+        Returns:
+            訓練語料的指紋，或 None（如果模型檔不存在、版本不符或已損壞）
+        """
+        model_path = directory / MODEL_FILENAME
+        vocabulary_path = directory / VOCABULARY_FILENAME
+        if not model_path.exists() or not vocabulary_path.exists():
+            return None
 
-        for key in expired_keys:
-            del self.similarity_cache[key]
+        try:
+            with np.load(model_path, allow_pickle=False) as model:
+                if int(model["artifact_version"]) != ARTIFACT_VERSION:
+                    logger.warning("Ignoring TF-IDF model with unsupported artifact version")
+                    return None
+                model_version = int(model["model_version"])
+                corpus_fingerprint = str(model["corpus_fingerprint"])
+                idf = model["idf"]
+                max_features, min_df, max_df = model["params"].tolist()
+                incremental = "incremental" in model.files and bool(model["incremental"])
+                feature_capacity = int(model["feature_capacity"]) if incremental else idf.size
+                lsa_components = (
+                    int(model["lsa_components"]) if "lsa_components" in model.files else 0
+                )
+                lsa_projection = model["lsa_projection"] if lsa_components else None
 
-        # 如果快取仍然太大，移除最舊的條目
-        if len(self.similarity_cache) > self.cache_max_size:
-            sorted_items = sorted(self.similarity_cache.items(), key=lambda x: x[1][1])
-            items_to_remove = len(sorted_items) - self.cache_max_size + 100  # 額外清理100個
+            if incremental != self.incremental:
+                logger.info("Saved TF-IDF model was trained in a different mode")
+                return None
+            if lsa_components != self.lsa_components:
+                logger.info("Saved TF-IDF model was trained with different LSA settings")
+                return None
 
-            for key, _ in sorted_items[:items_to_remove]:
-                del self.similarity_cache[key]
+            vocabulary = json.loads(vocabulary_path.read_text(encoding="utf-8"))
+            feature_names = vocabulary["features"]
+            # 增量模式的詞彙表在訓練時的詞彙之後附加了新分配的槽位
+            if (
+                vocabulary["model_version"] != model_version
+                or len(feature_names) < idf.size
+                or len(feature_names) > feature_capacity
+            ):
+                logger.warning("TF-IDF model files do not belong to the same model")
+                return None
 
-        logger.debug(f"Cache cleanup completed. Current size: {len(self.similarity_cache)}")
+            self.max_features, self.min_df, self.max_df = int(max_features), int(min_df), max_df
+            vectorizer = self._create_sklearn_vectorizer(vocabulary=feature_names[: idf.size])
+            vectorizer.idf_ = idf
+        except (OSError, KeyError, ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"Failed to load TF-IDF model from {directory}: {e}")
+            return None
 
-    def fit(self, texts: List[str]) -> None:
+        self.vectorizer = vectorizer
+        if lsa_projection is not None and lsa_projection.size == 0:
+            lsa_projection = None  # 訓練時語料太小，未產生投影
+        self.lsa_projection = lsa_projection
+        with self._vocabulary_lock:
+            self.feature_names = list(feature_names)
+            self.vocabulary = {name: slot for slot, name in enumerate(self.feature_names)}
+            self.feature_capacity = feature_capacity
+            self._reserve_exhausted = False
+        self.model_version = model_version
+        self.artifact_dir = directory
+        logger.info(f"TF-IDF model {model_version} loaded with {len(feature_names)} features")
+        return corpus_fingerprint
+
+    def fit(self, texts: List[str], preprocessed: bool = False) -> None:
         """
         使用文本語料庫訓練 TF-IDF 向量化器
 
         Args:
             texts: 文本列表
+            preprocessed: 文本是否已分詞並去除停用詞（例如由 token_cache 取得）
         """
+        if self.hashing:
+            logger.info("Hashing vectorizer does not need training")
+            return
+
         if not texts:
             logger.warning("No texts provided for TF-IDF training")
             return
 
-        # 預處理所有文本
-        processed_texts = [self._preprocess_text(text) for text in texts]
+        # 預處理所有文本（平行分詞）
+        processed_texts = list(texts) if preprocessed else self.preprocess_many(texts)
 
         # 過濾空文本
         processed_texts = [text for text in processed_texts if text.strip()]
@@ -236,83 +430,175 @@ class TFIDFVectorizer:
             return
 
         # 創建 TF-IDF 向量化器
-        self.vectorizer = SklearnTfidfVectorizer(
-            max_features=self.max_features,
-            min_df=self.min_df,
-            max_df=self.max_df,
-            tokenizer=str.split,  # 因為已經預處理過了
-            lowercase=False,  # 已經轉小寫了
-            stop_words=None,  # 已經去停用詞了
-        )
+        self.vectorizer = self._create_sklearn_vectorizer()
 
         # 訓練向量化器
         try:
-            self.vectorizer.fit(processed_texts)
-            self.feature_names = self.vectorizer.get_feature_names_out().tolist()
+            matrix = self.vectorizer.fit_transform(processed_texts)
+            self._fit_lsa(matrix)
+            feature_names = self.vectorizer.get_feature_names_out().tolist()
+            with self._vocabulary_lock:
+                self.feature_names = feature_names
+                self.vocabulary = {name: slot for slot, name in enumerate(feature_names)}
+                reserve = math.ceil(len(feature_names) * self.feature_reserve)
+                self.feature_capacity = len(feature_names) + (reserve if self.incremental else 0)
+                self._reserve_exhausted = False
+            self.model_version = self._compute_model_version()
+            self.artifact_dir = None  # 尚未存檔
             logger.info(
                 f"TF-IDF vectorizer trained with {len(self.feature_names)} features from {len(processed_texts)} documents"
             )
 
-            # 清空快取（因為特徵空間改變了）
-            self.clear_cache()
-
         except ValueError as e:
             logger.error(
                 f"ValueError during vectorizer training - insufficient or invalid text data: {e}"
             )
             self.vectorizer = None
+            self.model_version = UNKNOWN_MODEL_VERSION
         except MemoryError as e:
             logger.error(
                 f"MemoryError during vectorizer training - consider reducing max_features: {e}"
             )
             self.vectorizer = None
+            self.model_version = UNKNOWN_MODEL_VERSION
         except Exception as e:
             logger.error(f"Unexpected error training TF-IDF vectorizer: {e}", exc_info=True)
             self.vectorizer = None
+            self.model_version = UNKNOWN_MODEL_VERSION
+
+    def _fit_lsa(self, matrix) -> None:
+        """
+        以 TruncatedSVD 訓練 LSA 投影（語料太小時不使用）
 
-    def transform(self, text: str) -> Optional[str]:
+        Args:
+            matrix: 訓練語料的 TF-IDF 矩陣（與文件向量相同，已 L2 正規化）
+        """
+        self.lsa_projection = None
+        if self.lsa_components <= 0 or self.uses_live_idf:
+            return
+
+        components = min(self.lsa_components, matrix.shape[0] - 1, matrix.shape[1] - 1)
+        if components < 2:
+            logger.info("Corpus too small for an LSA projection")
+            return
+
+        try:
+            svd = TruncatedSVD(n_components=components, random_state=42)
+            svd.fit(matrix)
+        except Exception as e:
+            logger.warning(f"LSA training failed, using TF-IDF similarity only: {e}")
+            return
+        self.lsa_projection = np.ascontiguousarray(svd.components_, dtype=np.float32)
+        logger.info(
+            f"LSA projection trained with {components} dimensions "
+            f"({svd.explained_variance_ratio_.sum():.1%} of variance)"
+        )
+
+    def transform(self, text: str, assign_new_terms: bool = False) -> Optional[bytes]:
         """
         將文本轉換為 TF-IDF 向量
 
         Args:
             text: 輸入文本
+            assign_new_terms: 增量模式下是否為詞彙表外的新詞彙分配預留槽位（僅用於書籤文件）
 
         Returns:
-            包含向量資訊的 JSON 字串或 None
+            二進位編碼的稀疏向量（見 vector_codec）或 None
         """
-        if not self.vectorizer:
+        if not self.is_trained:
             logger.warning("TF-IDF vectorizer not trained")
             return None
 
         if not text or not text.strip():
             return None
 
-        processed_text = self._preprocess_text(text)
+        return self._transform_processed(self._preprocess_text(text), assign_new_terms)
+
+    def transform_many(
+        self,
+        texts: Iterable[str],
+        assign_new_terms: bool = False,
+        preprocessed: bool = False,
+        chunk_size: int = 1000,
+    ) -> Iterator[Optional[bytes]]:
+        """
+        批量將文本轉換為 TF-IDF 向量
+
+        每批文本只做一次稀疏矩陣轉換，向量直接由 CSR 結構的每一列編碼，不經過密集陣列。
+        增量與雜湊模式的向量本來就由稀疏的詞頻組成（增量模式還需分配新詞彙槽位），仍逐筆轉換。
+
+        Args:
+            texts: 輸入文本（可為任意可迭代物件，依批次讀取）
+            assign_new_terms: 增量模式下是否為詞彙表外的新詞彙分配預留槽位
+            preprocessed: 文本是否已分詞並去除停用詞
+            chunk_size: 每批轉換的文本數
+
+        Yields:
+            與輸入順序相同的編碼向量（無法向量化的文本為 None）
+        """
+        iterator = iter(texts)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            if not self.is_trained:
+                logger.warning("TF-IDF vectorizer not trained")
+                yield from [None] * len(chunk)
+                continue
+
+            processed_texts = chunk if preprocessed else self.preprocess_many(chunk)
+            if self.uses_live_idf:
+                for processed_text in processed_texts:
+                    yield self._transform_processed(processed_text, assign_new_terms)
+                continue
+
+            try:
+                matrix = self.vectorizer.transform(processed_texts).tocsr()
+            except ValueError as e:
+                logger.error(f"ValueError in batch vector transformation: {e}")
+                yield from [None] * len(chunk)
+                continue
+
+            matrix.eliminate_zeros()
+            matrix.sort_indices()
+            yield from self._pack_rows(matrix)
+
+    def _pack_rows(self, matrix) -> Iterator[Optional[bytes]]:
+        """將 CSR 矩陣的每一列編碼為稀疏向量（空列為 None）"""
+        feature_count = len(self.feature_names)
+        for row in range(matrix.shape[0]):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == end:
+                yield None
+                continue
+            yield pack_vector(
+                matrix.indices[start:end], matrix.data[start:end], self.model_version, feature_count
+            )
+
+    def _transform_processed(self, processed_text: str, assign_new_terms: bool) -> Optional[bytes]:
+        """將已預處理的文本轉換為編碼向量"""
         if not processed_text.strip():
             return None
 
-        try:
-            # 生成 TF-IDF 向量
-            vector_matrix = self.vectorizer.transform([processed_text])
-            vector_dense = vector_matrix.toarray()[0]
+        if self.uses_live_idf:
+            return self._transform_live_idf(processed_text, assign_new_terms, apply_idf=False)
 
-            # 轉換為稀疏格式（只保存非零值）
-            sparse_vector = {}
-            for idx, value in enumerate(vector_dense):
-                if value > 0:
-                    sparse_vector[str(idx)] = float(value)
+        try:
+            # 生成 TF-IDF 向量，直接取用稀疏矩陣的非零值
+            vector_matrix = self.vectorizer.transform([processed_text]).tocsr()
+            vector_matrix.sort_indices()
+            vector_matrix.eliminate_zeros()
 
-            if not sparse_vector:
-                logger.warning(f"Generated empty vector for text: '{text[:50]}...'")
+            if vector_matrix.nnz == 0:
+                logger.warning(f"Generated empty vector for text: '{processed_text[:50]}...'")
                 return None
 
-            vector_data = {
-                "vector": sparse_vector,
-                "feature_count": len(self.feature_names),
-                "non_zero_count": len(sparse_vector),
-            }
-
-            return json.dumps(vector_data)
+            return pack_vector(
+                vector_matrix.indices,
+                vector_matrix.data,
+                self.model_version,
+                len(self.feature_names),
+            )
 
         except ValueError as e:
             logger.error(
@@ -323,123 +609,196 @@ class TFIDFVectorizer:
             logger.error(f"Unexpected error transforming text to vector: {e}", exc_info=True)
             return None
 
-    def calculate_similarity(self, vector1_json: str, vector2_json: str) -> float:
+    def transform_query(self, text: str) -> Optional[bytes]:
         """
-        計算兩個 JSON 格式向量之間的餘弦相似度（支援快取）
+        將搜尋查詢轉換為向量
+
+        一般模式與 transform 相同。增量與雜湊模式的文件向量只含 L2 正規化的詞頻，查詢端改以
+        即時 IDF 的平方加權後正規化；內積的分子與兩端都以 IDF 加權的 TF-IDF 內積相同，但文件端
+        以詞頻而非 TF-IDF 的範數正規化，因此只是近似的 TF-IDF 餘弦相似度（仍介於 0 與 1 之間）。
 
         Args:
-            vector1_json: 第一個向量的 JSON 字串
-            vector2_json: 第二個向量的 JSON 字串
+            text: 查詢文本
 
         Returns:
-            相似度分數 (0-1)
+            二進位編碼的稀疏向量或 None
         """
-        if not vector1_json or not vector2_json:
-            return 0.0
+        if not self.uses_live_idf:
+            return self.transform(text)
 
-        if not self.vectorizer:
-            return 0.0
+        if not self.is_trained or not text or not text.strip():
+            return None
+
+        processed_text = self._preprocess_text(text)
+        if not processed_text.strip():
+            return None
+        return self._transform_live_idf(processed_text, assign_new_terms=False, apply_idf=True)
+
+    def _hash_slot(self, term: str) -> int:
+        return murmurhash3_32(term, positive=True) & (self.feature_capacity - 1)
+
+    def _transform_live_idf(
+        self, processed_text: str, assign_new_terms: bool, apply_idf: bool
+    ) -> Optional[bytes]:
+        """增量與雜湊模式的向量化：詞頻向量（查詢時乘上 IDF 平方）後做 L2 正規化"""
+        term_counts = Counter(processed_text.split())
+        weights = {term: float(count) for term, count in term_counts.items()}
+        if apply_idf:
+            idf = self.live_idf(list(weights))
+            for i, term in enumerate(weights):
+                weights[term] *= idf[i] ** 2
+
+        slots: Dict[int, float] = {}
+        for term, weight in weights.items():
+            if self.hashing:
+                slot = self._hash_slot(term)
+            else:
+                slot = self.vocabulary.get(term)
+                if slot is None and assign_new_terms:
+                    slot = self._assign_slot(term)
+            if slot is not None:
+                # 雜湊碰撞的詞彙權重相加
+                slots[slot] = slots.get(slot, 0.0) + weight
+
+        if not slots:
+            return None
 
-        # 檢查快取
-        cache_key = self._generate_cache_key(vector1_json, vector2_json)
-        current_time = time.time()
+        indices = np.fromiter(slots.keys(), dtype=np.int32, count=len(slots))
+        values = np.fromiter(slots.values(), dtype=np.float64, count=len(slots))
 
-        if cache_key in self.similarity_cache:
-            similarity, timestamp = self.similarity_cache[cache_key]
-            if current_time - timestamp <= self.cache_ttl:
-                logger.debug("Cache hit for similarity calculation")
-                return similarity
+        norm = float(np.linalg.norm(values))
+        if norm == 0.0:
+            return None
 
-        try:
-            # 解析 JSON 向量
-            try:
-                vector1 = json.loads(vector1_json)
-                vector2 = json.loads(vector2_json)
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON in vector data: {e}")
-                return 0.0
-
-            # 提取稀疏向量
-            sparse1 = vector1.get("vector", {})
-            sparse2 = vector2.get("vector", {})
-
-            if not sparse1 or not sparse2:
-                logger.debug("One or both vectors are empty")
-                return 0.0
-
-            # 確保特徵數量一致
-            feature_count = max(
-                vector1.get("feature_count", 0),
-                vector2.get("feature_count", 0),
-                len(self.feature_names),
-            )
-            if feature_count == 0:
-                logger.warning("Feature count is 0 - vectorizer may not be properly trained")
-                return 0.0
+        order = np.argsort(indices)
+        return pack_vector(
+            indices[order], values[order] / norm, self.model_version, self.feature_capacity
+        )
 
-            # 轉換為密集向量
-            try:
-                dense1 = np.zeros(feature_count)
-                dense2 = np.zeros(feature_count)
-
-                for idx_str, value in sparse1.items():
-                    try:
-                        idx = int(idx_str)
-                        if 0 <= idx < feature_count:
-                            dense1[idx] = float(value)
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid index or value in vector1: {idx_str}={value}")
-
-                for idx_str, value in sparse2.items():
-                    try:
-                        idx = int(idx_str)
-                        if 0 <= idx < feature_count:
-                            dense2[idx] = float(value)
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid index or value in vector2: {idx_str}={value}")
-
-            except MemoryError as e:
-                logger.error(
-                    f"MemoryError creating dense vectors (feature_count={feature_count}): {e}"
-                )
-                return 0.0
+    def _assign_slot(self, term: str) -> Optional[int]:
+        """
+        為新詞彙分配預留槽位
+
+        套用與訓練相同的 min_df / max_df 規則（計入正在向量化的文件），
+        預留槽位用完時返回 None，需重新訓練以壓縮詞彙表。
+        """
+        with self._vocabulary_lock:
+            slot = self.vocabulary.get(term)
+            if slot is not None:
+                return slot
+
+            document_count = self.document_count + 1
+            frequency = self.document_frequency.get(term, 0) + 1
+            # 與 sklearn 相同：浮點數為文件比例，整數為文件數
+            min_df, max_df = self.min_df, self.max_df
+            min_count = min_df * document_count if isinstance(min_df, float) else min_df
+            max_count = max_df * document_count if isinstance(max_df, float) else max_df
+            if frequency < min_count or frequency > max_count:
+                return None
 
-            # 檢查向量是否有效（非全零）
-            if np.allclose(dense1, 0) or np.allclose(dense2, 0):
-                logger.debug("One or both dense vectors are all zeros")
-                return 0.0
+            if len(self.feature_names) >= self.feature_capacity:
+                if not self._reserve_exhausted:
+                    self._reserve_exhausted = True
+                    logger.warning(
+                        "Feature reserve exhausted, new terms are ignored. "
+                        "Retrain the vectorizer to compact the vocabulary."
+                    )
+                return None
 
-            # 計算餘弦相似度
-            try:
-                similarity = cosine_similarity([dense1], [dense2])[0][0]
+            slot = len(self.feature_names)
+            self.feature_names.append(term)
+            self.vocabulary[term] = slot
 
-                # 檢查相似度是否為有效數值
-                if np.isnan(similarity) or np.isinf(similarity):
-                    logger.warning("Similarity calculation resulted in NaN or Inf")
-                    return 0.0
+        self._persist_vocabulary()
+        return slot
 
-                similarity_float = float(similarity)
+    def _persist_vocabulary(self) -> None:
+        """將新分配的槽位寫回詞彙表檔，重新啟動後已存的向量仍對應相同詞彙"""
+        if self.artifact_dir is None:
+            return
+
+        path = self.artifact_dir / VOCABULARY_FILENAME
+        try:
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            if saved.get("model_version") != self.model_version:
+                # 模型檔已由重新訓練的新模型取代
+                self.artifact_dir = None
+                return
+            self._write_vocabulary(self.artifact_dir)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to persist TF-IDF vocabulary: {e}")
+
+    def live_idf(self, terms: Sequence[str]) -> np.ndarray:
+        """
+        以即時文件頻率計算詞彙的 IDF（與 sklearn smooth_idf 相同公式）
+
+        Args:
+            terms: 詞彙列表
 
-                # 確保相似度在合理範圍內
-                similarity_float = max(0.0, min(1.0, similarity_float))
+        Returns:
+            各詞彙的 IDF 權重
+        """
+        with self._vocabulary_lock:
+            document_count = self.document_count
+            frequencies = np.array(
+                [self.document_frequency.get(term, 0) for term in terms], dtype=np.float64
+            )
+        return np.log((1.0 + document_count) / (1.0 + frequencies)) + 1.0
 
-            except Exception as e:
-                logger.error(f"Error in cosine similarity calculation: {e}")
-                return 0.0
+    def set_document_frequencies(self, frequencies: Dict[str, int], document_count: int) -> None:
+        """
+        以完整統計取代文件頻率
 
-            # 儲存到快取
-            self.similarity_cache[cache_key] = (similarity_float, current_time)
+        Args:
+            frequencies: 詞彙 -> 含該詞彙的書籤數
+            document_count: 書籤總數
+        """
+        with self._vocabulary_lock:
+            self.document_frequency = Counter(frequencies)
+            self.document_count = document_count
 
-            # 定期清理快取（每100次計算清理一次）
-            if len(self.similarity_cache) % 100 == 0:
-                self._cleanup_cache()
+    def apply_document_frequency_delta(self, frequencies: Dict[str, int], documents: int) -> None:
+        """
+        套用書籤新增、更新或刪除造成的文件頻率變化
 
-            logger.debug(f"Calculated and cached similarity: {similarity_float:.4f}")
-            return similarity_float
+        Args:
+            frequencies: 詞彙 -> 文件頻率的增減
+            documents: 書籤數的增減
+        """
+        with self._vocabulary_lock:
+            for term, delta in frequencies.items():
+                count = self.document_frequency.get(term, 0) + delta
+                if count > 0:
+                    self.document_frequency[term] = count
+                else:
+                    self.document_frequency.pop(term, None)
+            self.document_count = max(0, self.document_count + documents)
+
+    def get_vocabulary_stats(self) -> Dict[str, Any]:
+        """
+        獲取詞彙表與增量模式統計資訊
 
-        except Exception as e:
-            logger.error(f"Unexpected error calculating similarity: {e}", exc_info=True)
-            return 0.0
+        Returns:
+            統計資訊字典
+        """
+        with self._vocabulary_lock:
+            feature_count = len(self.feature_names)
+            reserve_remaining = (
+                max(0, self.feature_capacity - feature_count) if self.incremental else 0
+            )
+            return {
+                "mode": self.mode,
+                "incremental": self.incremental,
+                "hash_bits": self.hash_bits,
+                "feature_count": feature_count,
+                "feature_capacity": self.feature_capacity,
+                "reserve_remaining": reserve_remaining,
+                "document_count": self.document_count,
+                "needs_compaction": self.incremental and reserve_remaining == 0,
+                "lsa_dimensions": (
+                    0 if self.lsa_projection is None else self.lsa_projection.shape[0]
+                ),
+            }
 
     def get_top_keywords(self, text: str, top_k: int = 10) -> List[Tuple[str, float]]:
         """
@@ -452,13 +811,23 @@ class TFIDFVectorizer:
         Returns:
             (關鍵詞, 分數) 的列表
         """
-        if not self.vectorizer or not text:
+        if not self.is_trained or not text:
             return []
 
         processed_text = self._preprocess_text(text)
         if not processed_text.strip():
             return []
 
+        if self.hashing:
+            # 雜湊模式沒有詞彙表，直接以詞頻乘上即時 IDF 計分
+            term_counts = Counter(processed_text.split())
+            idf = self.live_idf(list(term_counts))
+            word_scores = [
+                (term, float(count * idf[i])) for i, (term, count) in enumerate(term_counts.items())
+            ]
+            word_scores.sort(key=lambda x: x[1], reverse=True)
+            return word_scores[:top_k]
+
         try:
             # 生成向量
             vector_matrix = self.vectorizer.transform([processed_text])
@@ -478,235 +847,178 @@ class TFIDFVectorizer:
             logger.error(f"Error extracting keywords: {e}")
             return []
 
-    def calculate_batch_similarity(
-        self, query_vector_json: str, bookmark_vectors: List[Tuple[str, str]]
-    ) -> List[Tuple[str, float]]:
-        """
-        批量計算查詢向量與多個書籤向量的相似度
 
-        Args:
-            query_vector_json: 查詢向量的 JSON 字串
-            bookmark_vectors: (bookmark_id, vector_json) 的列表
+# 全局實例
+_vectorizer_instance: Optional[TFIDFVectorizer] = None
 
-        Returns:
-            (bookmark_id, similarity_score) 的列表
-        """
-        if not query_vector_json or not bookmark_vectors:
-            return []
 
-        if not self.vectorizer:
-            logger.warning("Vectorizer not trained for batch similarity calculation")
-            return [(bid, 0.0) for bid, _ in bookmark_vectors]
+def get_vectorizer() -> TFIDFVectorizer:
+    """
+    獲取全局 TF-IDF 向量化器實例
 
-        try:
-            # 解析查詢向量
-            query_vector = json.loads(query_vector_json)
-            query_sparse = query_vector.get("vector", {})
-
-            if not query_sparse:
-                return [(bid, 0.0) for bid, _ in bookmark_vectors]
-
-            # 確定特徵空間大小
-            feature_count = max(query_vector.get("feature_count", 0), len(self.feature_names))
-
-            if feature_count == 0:
-                return [(bid, 0.0) for bid, _ in bookmark_vectors]
-
-            # 轉換查詢向量為密集格式
-            query_dense = np.zeros(feature_count)
-            for idx_str, value in query_sparse.items():
-                try:
-                    idx = int(idx_str)
-                    if 0 <= idx < feature_count:
-                        query_dense[idx] = float(value)
-                except (ValueError, TypeError):
-                    continue
-
-            # 檢查查詢向量是否有效
-            if np.allclose(query_dense, 0):
-                return [(bid, 0.0) for bid, _ in bookmark_vectors]
-
-            results = []
-            valid_vectors = []
-            valid_ids = []
-            current_time = time.time()
-
-            # 批量處理書籤向量
-            for bookmark_id, vector_json in bookmark_vectors:
-                # 首先檢查快取
-                cache_key = self._generate_cache_key(query_vector_json, vector_json)
-                if cache_key in self.similarity_cache:
-                    similarity, timestamp = self.similarity_cache[cache_key]
-                    if current_time - timestamp <= self.cache_ttl:
-                        results.append((bookmark_id, similarity))
-                        continue
-
-                # 解析書籤向量
-                try:
-                    bookmark_vector = json.loads(vector_json)
-                    bookmark_sparse = bookmark_vector.get("vector", {})
-
-                    if not bookmark_sparse:
-                        results.append((bookmark_id, 0.0))
-                        continue
-
-                    # 轉換為密集向量
-                    bookmark_dense = np.zeros(feature_count)
-                    for idx_str, value in bookmark_sparse.items():
-                        try:
-                            idx = int(idx_str)
-                            if 0 <= idx < feature_count:
-                                bookmark_dense[idx] = float(value)
-                        except (ValueError, TypeError):
-                            continue
-
-                    if np.allclose(bookmark_dense, 0):
-                        results.append((bookmark_id, 0.0))
-                        continue
-
-                    valid_vectors.append(bookmark_dense)
-                    valid_ids.append((bookmark_id, cache_key))
-
-                except (json.JSONDecodeError, Exception) as e:
-                    logger.warning(f"Error parsing bookmark vector for {bookmark_id}: {e}")
-                    results.append((bookmark_id, 0.0))
-
-            # 批量計算餘弦相似度
-            if valid_vectors:
-                try:
-                    # 使用 sklearn 的向量化相似度計算
-                    similarities = cosine_similarity([query_dense], valid_vectors)[0]
-
-                    for i, (bookmark_id, cache_key) in enumerate(valid_ids):
-                        similarity = float(similarities[i])
-
-                        # 確保相似度在合理範圍內
-                        if np.isnan(similarity) or np.isinf(similarity):
-                            similarity = 0.0
-                        else:
-                            similarity = max(0.0, min(1.0, similarity))
-
-                        results.append((bookmark_id, similarity))
-
-                        # 儲存到快取
-                        self.similarity_cache[cache_key] = (similarity, current_time)
-
-                    logger.debug(f"Batch calculated {len(valid_vectors)} similarities")
-
-                except Exception as e:
-                    logger.error(f"Error in batch cosine similarity calculation: {e}")
-                    # 回退到個別計算
-                    for bookmark_id, _ in valid_ids:
-                        results.append((bookmark_id, 0.0))
-
-            # 定期清理快取
-            if len(self.similarity_cache) % 100 == 0:
-                self._cleanup_cache()
-
-            return results
+    Returns:
+        TFIDFVectorizer 實例
+    """
+    global _vectorizer_instance
+    if _vectorizer_instance is None:
+        _vectorizer_instance = create_vectorizer()
+    return _vectorizer_instance
 
-        except Exception as e:
-            logger.error(f"Error in batch similarity calculation: {e}", exc_info=True)
-            return [(bid, 0.0) for bid, _ in bookmark_vectors]
 
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """
-        獲取快取統計資訊
+def create_vectorizer() -> TFIDFVectorizer:
+    """依設定建立新的（未訓練）向量化器"""
+    from app import config
 
-        Returns:
-            快取統計資訊字典
-        """
-        current_time = time.time()
-        expired_count = 0
+    return TFIDFVectorizer(
+        incremental=config.VECTORIZER_INCREMENTAL,
+        feature_reserve=config.VECTORIZER_FEATURE_RESERVE,
+        hash_bits=config.VECTORIZER_HASH_BITS if config.VECTORIZER_MODE == "hashing" else 0,
+        lsa_components=config.VECTORIZER_LSA_COMPONENTS,
+    )
 
-        for similarity, timestamp in self.similarity_cache.values():
-            if current_time - timestamp > self.cache_ttl:
-                expired_count += 1
 
-        return {
-            "cache_size": len(self.similarity_cache),
-            "max_cache_size": self.cache_max_size,
-            "expired_entries": expired_count,
-            "cache_ttl_seconds": self.cache_ttl,
-            "cache_utilization": len(self.similarity_cache) / self.cache_max_size,
-        }
+def set_vectorizer(vectorizer: TFIDFVectorizer) -> None:
+    """以已訓練的向量化器取代全局實例（由 vector_index.activate_model 與索引一起切換）"""
+    global _vectorizer_instance
+    _vectorizer_instance = vectorizer
 
-    def clear_cache(self) -> None:
-        """清空相似度快取"""
-        self.similarity_cache.clear()
-        logger.info("Similarity cache cleared")
 
+def build_training_text(bookmark) -> str:
+    """
+    組合書籤的訓練文本（標題、描述、內容與關鍵字）
 
-# 全局實例
-_vectorizer_instance: Optional[TFIDFVectorizer] = None
+    Args:
+        bookmark: 具有 title、description、content、keywords 屬性的書籤或查詢列
 
+    Returns:
+        以空白連接的文本，沒有任何文字時為空字串
+    """
+    text_parts = [part for part in (bookmark.title, bookmark.description, bookmark.content) if part]
+    if bookmark.keywords and isinstance(bookmark.keywords, list):
+        text_parts.extend(bookmark.keywords)
+    return " ".join(text_parts)
 
-def get_vectorizer() -> TFIDFVectorizer:
+
+def get_model_dir() -> Path:
+    """TF-IDF 模型檔目錄（預設與資料庫檔案放在一起）"""
+    from app import config
+    from app.models.database import get_data_dir
+
+    if config.VECTORIZER_MODEL_DIR:
+        return Path(config.VECTORIZER_MODEL_DIR)
+    return get_data_dir()
+
+
+def compute_corpus_fingerprint(db) -> str:
     """
-    獲取全局 TF-IDF 向量化器實例
+    以聚合查詢計算訓練語料的指紋（書籤數、ID 總和與各文字欄位長度總和）
 
-    Returns:
-        TFIDFVectorizer 實例
+    不需載入或分詞任何文件，書籤新增、刪除或文字內容變更都會改變指紋。
+    與訓練語料相同，不含近似重複的書籤。
     """
-    global _vectorizer_instance
-    if _vectorizer_instance is None:
-        _vectorizer_instance = TFIDFVectorizer()
-    return _vectorizer_instance
+    from sqlalchemy import func
+
+    from app.models.database import Bookmark
+
+    row = (
+        db.query(
+            func.count(Bookmark.id),
+            func.total(Bookmark.id),
+            func.total(func.length(Bookmark.title)),
+            func.total(func.length(Bookmark.description)),
+            func.total(func.length(Bookmark.content)),
+            func.total(func.length(Bookmark.keywords)),
+        )
+        .filter(
+            Bookmark.content.isnot(None),
+            Bookmark.content != "",
+            Bookmark.duplicate_of.is_(None),
+        )
+        .one()
+    )
+    return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()
 
 
-def reset_vectorizer() -> None:
-    """重置全局向量化器實例（用於重新訓練）"""
-    global _vectorizer_instance
-    _vectorizer_instance = None
+def _has_stale_vectors(model_version: int) -> bool:
+    """抽查一筆書籤向量是否屬於其他模型版本"""
+    from app.models.database import Bookmark, SessionLocal
+
+    db = SessionLocal()
+    try:
+        data = (
+            db.query(Bookmark.tfidf_vector)
+            .filter(Bookmark.tfidf_vector.isnot(None))
+            .limit(1)
+            .scalar()
+        )
+    finally:
+        db.close()
+
+    vector = decode_vector(data)
+    return vector is not None and vector.model_version != model_version
 
 
-def train_vectorizer_if_needed():
+def load_vectorizer() -> Optional[str]:
     """
-    如果向量化器尚未訓練且資料庫中有數據，則進行訓練。
+    啟動時載入 TF-IDF 模型檔，不在啟動時訓練。
+
+    模型檔不存在或語料指紋改變時仍以已存檔的模型提供服務，由背景的藍綠重新訓練
+    （retrain_in_shadow）產生新模型與向量後再切換，不會就地重新訓練全局實例。
+    增量模式的詞彙表與文件頻率隨書籤即時維護，語料改變不需重新訓練，
+    只有預留槽位用完時才重新訓練以壓縮詞彙表。
+
+    Returns:
+        需排入的背景工作："retrain"（需要重新訓練）或 "batch_vectorize"
+        （雜湊模式下資料庫向量屬於其他模型），不需要時為 None
     """
     from app.models.database import Bookmark, SessionLocal
 
     vectorizer = get_vectorizer()
-    if vectorizer.vectorizer:
+    if vectorizer.hashing:
+        # 雜湊模式不需訓練；資料庫向量屬於其他模型（例如剛切換模式）時需重新產生
+        return "batch_vectorize" if _has_stale_vectors(vectorizer.model_version) else None
+
+    if vectorizer.is_trained:
         logger.info("TF-IDF vectorizer is already trained.")
-        return
+        return None
 
     db = SessionLocal()
     try:
-        logger.info("Checking for data to train TF-IDF vectorizer...")
-        bookmarks = (
-            db.query(Bookmark).filter(Bookmark.content.isnot(None), Bookmark.content != "").all()
-        )
-
-        if not bookmarks:
+        saved_fingerprint = vectorizer.load(get_model_dir())
+        if saved_fingerprint is None:
+            has_content = (
+                db.query(Bookmark.id)
+                .filter(
+                    Bookmark.content.isnot(None),
+                    Bookmark.content != "",
+                    Bookmark.duplicate_of.is_(None),
+                )
+                .first()
+            )
+            if has_content is None:
+                logger.info("No bookmarks with content found. Vectorizer remains untrained.")
+                return None
+            logger.info("No saved TF-IDF model. Scheduling training in the background.")
+            return "retrain"
+        if vectorizer.incremental:
+            if vectorizer.get_vocabulary_stats()["needs_compaction"]:
+                logger.info(
+                    "Feature reserve of the TF-IDF model is exhausted. "
+                    "Retraining in the background to compact the vocabulary."
+                )
+                return "retrain"
+            logger.info("Incremental TF-IDF model loaded.")
+            return None
+        if saved_fingerprint != compute_corpus_fingerprint(db):
             logger.info(
-                "No bookmarks with content found for training. Vectorizer remains untrained."
+                "Corpus changed since the TF-IDF model was saved. "
+                "Serving the saved model and retraining in the background."
             )
-            return
-
-        texts = []
-        for bookmark in bookmarks:
-            text_parts = []
-            if bookmark.title:
-                text_parts.append(bookmark.title)
-            if bookmark.description:
-                text_parts.append(bookmark.description)
-            if bookmark.content:
-                text_parts.append(bookmark.content)
-            if bookmark.keywords and isinstance(bookmark.keywords, list):
-                text_parts.extend(bookmark.keywords)
-
-            if text_parts:
-                texts.append(" ".join(text_parts))
-
-        if texts:
-            logger.info(f"Found {len(texts)} documents. Training TF-IDF vectorizer...")
-            vectorizer.fit(texts)
-            logger.info("TF-IDF vectorizer training complete.")
-        else:
-            logger.info("No text data found for training.")
-
+            return "retrain"
+        logger.info("TF-IDF model is up to date with the corpus.")
+        return None
     except Exception as e:
-        logger.error(f"An error occurred during vectorizer training: {e}")
+        logger.error(f"An error occurred while loading the TF-IDF model: {e}")
+        return None
     finally:
         db.close()
@@ -0,0 +1,216 @@
+"""
+書籤分詞快取
+每個書籤的分詞結果以內容雜湊為鍵存放於 bookmark_tokens 資料表，
+訓練、向量化、倒排索引、關鍵字提取與摘要共用同一份分詞結果，內容未改變的書籤不會重新分詞
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import AbstractSet, Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .tokenizer import TOKENIZER_VERSION, normalize_tokens, segment_many
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentTokens(NamedTuple):
+    """
+    書籤各欄位以空白連接的詞彙
+
+    欄位名稱與書籤相同，可直接傳給 build_training_text 與 ContentEnricher.build_vector_text，
+    組出的文本即為已分詞的結果。
+    """
+
+    title: str
+    description: str
+    content: str
+    keywords: List[str]  # 關鍵字的分詞結果（單一元素），沒有關鍵字時為空列表
+
+    def normalized(self, stop_words: AbstractSet[str]) -> "DocumentTokens":
+        """轉小寫並去除停用詞，結果與 TFIDFVectorizer 預處理各欄位相同"""
+
+        def normalize(value: str) -> str:
+            return " ".join(normalize_tokens(value.split(), stop_words))
+
+        keywords = [normalize(value) for value in self.keywords]
+        return DocumentTokens(
+            normalize(self.title),
+            normalize(self.description),
+            normalize(self.content),
+            [value for value in keywords if value],
+        )
+
+    def terms(self, stop_words: AbstractSet[str]) -> Counter:
+        """正規化後的詞彙及詞頻（所有欄位）"""
+        normalized = self.normalized(stop_words)
+        return Counter(
+            " ".join(
+                [normalized.title, normalized.description, normalized.content, *normalized.keywords]
+            ).split()
+        )
+
+
+def _keywords_text(keywords) -> str:
+    return " ".join(keywords) if keywords and isinstance(keywords, list) else ""
+
+
+def compute_content_hash(
+    title: Optional[str], description: Optional[str], content: Optional[str], keywords
+) -> str:
+    """
+    計算書籤文字欄位的內容雜湊（包含分詞規則版本）
+
+    Returns:
+        十六進位的 SHA-1 雜湊
+    """
+    fields = [title or "", description or "", content or "", _keywords_text(keywords)]
+    payload = json.dumps([TOKENIZER_VERSION, *fields], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def tokenize_documents(
+    bookmarks: Sequence, content_tokens: Optional[Dict[int, List[str]]] = None
+) -> List[DocumentTokens]:
+    """
+    為多個書籤分詞（所有欄位一起交給行程池平行處理）
+
+    Args:
+        bookmarks: 具有 title、description、content、keywords 屬性的書籤或查詢列
+        content_tokens: 已分詞的內容（書籤在列表中的位置 -> 詞彙），提供時不重新分詞
+
+    Returns:
+        與輸入順序相同的分詞結果
+    """
+    content_tokens = content_tokens or {}
+    texts = []
+    for position, bookmark in enumerate(bookmarks):
+        texts.extend([bookmark.title or "", bookmark.description or ""])
+        texts.append("" if position in content_tokens else bookmark.content or "")
+        texts.append(_keywords_text(bookmark.keywords))
+
+    segmented = segment_many(texts)
+    documents = []
+    for position in range(len(bookmarks)):
+        title, description, content, keywords = segmented[position * 4 : position * 4 + 4]
+        if position in content_tokens:
+            content = content_tokens[position]
+        documents.append(
+            DocumentTokens(
+                " ".join(title),
+                " ".join(description),
+                " ".join(content),
+                [" ".join(keywords)] if keywords else [],
+            )
+        )
+    return documents
+
+
+def store_document_tokens(
+    db: Session, bookmark_ids: Sequence[int], content_hashes: Sequence[str], documents
+) -> None:
+    """寫入或取代書籤的分詞結果（不提交交易，由呼叫者提交）"""
+    rows = [
+        {
+            "bookmark_id": bookmark_id,
+            "content_hash": content_hash,
+            "title": document.title,
+            "description": document.description,
+            "content": document.content,
+            "keywords": " ".join(document.keywords),
+        }
+        for bookmark_id, content_hash, document in zip(bookmark_ids, content_hashes, documents)
+    ]
+    if not rows:
+        return
+
+    from app.models.database import BookmarkTokens
+
+    statement = insert(BookmarkTokens)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[BookmarkTokens.bookmark_id],
+            set_={
+                column: statement.excluded[column]
+                for column in ("content_hash", "title", "description", "content", "keywords")
+            },
+        ),
+        rows,
+    )
+
+
+def get_document_tokens(
+    db: Session, bookmarks: Sequence, content_tokens: Optional[Dict[int, List[str]]] = None
+) -> List[DocumentTokens]:
+    """
+    取得書籤的分詞結果，優先使用快取
+
+    快取不存在或內容雜湊不符的書籤才重新分詞，並寫回快取（不提交交易，由呼叫者提交）。
+
+    Args:
+        db: 資料庫 Session
+        bookmarks: 具有 id、title、description、content、keywords 屬性的書籤或查詢列
+        content_tokens: 已分詞的內容（書籤 ID -> 詞彙），例如豐富化時提取關鍵字的分詞結果
+
+    Returns:
+        與輸入順序相同的分詞結果
+    """
+    from app.models.database import BookmarkTokens
+
+    content_tokens = content_tokens or {}
+    hashes = [
+        compute_content_hash(
+            bookmark.title, bookmark.description, bookmark.content, bookmark.keywords
+        )
+        for bookmark in bookmarks
+    ]
+    cached = {
+        row.bookmark_id: row
+        for row in db.query(BookmarkTokens).filter(
+            BookmarkTokens.bookmark_id.in_([bookmark.id for bookmark in bookmarks])
+        )
+    }
+
+    documents: List[Optional[DocumentTokens]] = []
+    missing = []
+    for position, (bookmark, content_hash) in enumerate(zip(bookmarks, hashes)):
+        row = cached.get(bookmark.id)
+        if row is not None and row.content_hash == content_hash:
+            keywords = [row.keywords] if row.keywords else []
+            documents.append(DocumentTokens(row.title, row.description, row.content, keywords))
+        else:
+            documents.append(None)
+            missing.append(position)
+
+    if missing:
+        tokenized = tokenize_documents(
+            [bookmarks[position] for position in missing],
+            {
+                i: content_tokens[bookmarks[position].id]
+                for i, position in enumerate(missing)
+                if bookmarks[position].id in content_tokens
+            },
+        )
+        for position, document in zip(missing, tokenized):
+            documents[position] = document
+        store_document_tokens(
+            db,
+            [bookmarks[position].id for position in missing],
+            [hashes[position] for position in missing],
+            tokenized,
+        )
+        logger.debug(f"Tokenized {len(missing)} of {len(bookmarks)} bookmarks")
+
+    return documents
+
+
+def remove_document_tokens(db: Session, bookmark_id: int) -> None:
+    """移除書籤的分詞結果（不提交交易，由呼叫者提交）"""
+    from app.models.database import BookmarkTokens
+
+    db.execute(delete(BookmarkTokens).where(BookmarkTokens.bookmark_id == bookmark_id))
@@ -0,0 +1,178 @@
+"""
+分詞服務
+jieba 分詞與停用詞過濾；大量文件時以多個行程平行分詞，不受單一 GIL 限制
+
+分詞分為兩步：segment 保留原始大小寫（供關鍵字提取與摘要使用，並存入 token_cache），
+normalize_tokens 再轉小寫並去除停用詞（供 TF-IDF 與倒排索引使用）。
+
+工作行程只匯入本模組與 jieba，避免每個行程都載入 sklearn 與資料庫模型。
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import AbstractSet, Iterable, List, Optional, Sequence
+
+import jieba
+
+logger = logging.getLogger(__name__)
+
+# 分詞規則版本，segment 的結果改變時遞增（使 token_cache 中的分詞結果失效）
+TOKENIZER_VERSION = 1
+
+# 共用的分詞行程池
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def segment(text: str) -> List[str]:
+    """
+    以 jieba 分詞，去除空白與單一字元的詞（保留原始大小寫）
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        詞彙列表
+    """
+    if not text or not text.strip():
+        return []
+
+    tokens = []
+    for word in jieba.lcut(text):
+        word = word.strip()
+        if len(word) > 1:
+            tokens.append(word)
+    return tokens
+
+
+def normalize_tokens(tokens: Iterable[str], stop_words: AbstractSet[str]) -> List[str]:
+    """將分詞結果轉小寫並去除停用詞"""
+    normalized = []
+    for token in tokens:
+        token = token.lower()
+        if token not in stop_words:
+            normalized.append(token)
+    return normalized
+
+
+def preprocess_text(text: str, stop_words: AbstractSet[str]) -> str:
+    """
+    預處理文本：分詞、去停用詞、清理
+
+    Args:
+        text: 原始文本
+        stop_words: 停用詞集合
+
+    Returns:
+        以空白連接的詞彙
+    """
+    return " ".join(normalize_tokens(segment(text), stop_words))
+
+
+def _init_worker() -> None:
+    jieba.initialize()
+
+
+def _segment_chunk(texts: List[str]) -> List[List[str]]:
+    return [segment(text) for text in texts]
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """設定的分詞行程數，0 表示使用全部 CPU 核心"""
+    from app import config
+
+    if workers is None:
+        workers = config.TOKENIZER_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """取得共用的分詞行程池（行程數改變時重建）"""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        # 以 spawn 建立工作行程，避免在持有執行緒鎖的服務行程中 fork
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown_pool() -> None:
+    """關閉分詞行程池，釋放工作行程的記憶體（下次批量分詞時重新建立）"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+        _executor_workers = 0
+
+
+def segment_many(
+    texts: Sequence[str], workers: Optional[int] = None, chunk_size: Optional[int] = None
+) -> List[List[str]]:
+    """
+    批量分詞，文件數足夠時分批交給行程池平行處理
+
+    文件數少於兩批或只有一個行程時直接在目前行程處理（行程啟動與 jieba 詞典載入的成本較高）；
+    行程池在多次呼叫間共用，直到 shutdown_pool。行程池無法使用時退回循序處理。
+
+    Args:
+        texts: 原始文本列表
+        workers: 分詞行程數，未提供時使用 TOKENIZER_WORKERS
+        chunk_size: 每批交給工作行程的文件數，未提供時使用 TOKENIZER_CHUNK_SIZE
+
+    Returns:
+        與輸入順序相同的分詞結果
+    """
+    from app import config
+
+    workers = resolve_workers(workers)
+    chunk_size = max(1, chunk_size or config.TOKENIZER_CHUNK_SIZE)
+    chunks = [list(texts[i : i + chunk_size]) for i in range(0, len(texts), chunk_size)]
+    if workers <= 1 or len(chunks) < 2:
+        return [segment(text) for text in texts]
+
+    try:
+        with _executor_lock:
+            executor = _get_executor(workers)
+            results = list(executor.map(_segment_chunk, chunks))
+        return [tokens for result in results for tokens in result]
+    except Exception as e:
+        logger.warning(f"Parallel tokenization failed, falling back to a single process: {e}")
+        shutdown_pool()
+        return [segment(text) for text in texts]
+
+
+def preprocess_many(
+    texts: Sequence[str],
+    stop_words: AbstractSet[str],
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> List[str]:
+    """
+    批量預處理文本（分詞由 segment_many 平行處理）
+
+    Args:
+        texts: 原始文本列表
+        stop_words: 停用詞集合
+        workers: 分詞行程數，未提供時使用 TOKENIZER_WORKERS
+        chunk_size: 每批交給工作行程的文件數，未提供時使用 TOKENIZER_CHUNK_SIZE
+
+    Returns:
+        與輸入順序相同的預處理結果
+    """
+    return [
+        " ".join(normalize_tokens(tokens, stop_words))
+        for tokens in segment_many(texts, workers, chunk_size)
+    ]
@@ -0,0 +1,149 @@
+"""
+向量編碼服務
+以緊湊的二進位格式存儲稀疏 TF-IDF 向量：固定長度標頭 + int32 索引陣列 + float32 權重陣列
+"""
+
+import json
+import logging
+import struct
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 標頭：魔術字串、格式版本、保留欄位、模型版本、特徵數、非零值數量（共 20 bytes，4 bytes 對齊）
+_HEADER = struct.Struct("<4sHHIII")
+_MAGIC = b"WBVC"
+FORMAT_VERSION = 1
+
+# 舊格式（JSON）轉換而來、無法得知模型版本的向量
+UNKNOWN_MODEL_VERSION = 0
+
+_INDEX_DTYPE = np.dtype("<i4")
+_VALUE_DTYPE = np.dtype("<f4")
+
+
+class PackedVector(NamedTuple):
+    """解碼後的稀疏向量（陣列直接引用原始 bytes，唯讀）"""
+
+    model_version: int
+    feature_count: int
+    indices: np.ndarray
+    values: np.ndarray
+
+
+def pack_vector(
+    indices: np.ndarray, values: np.ndarray, model_version: int, feature_count: int
+) -> bytes:
+    """
+    將稀疏向量編碼為二進位格式
+
+    Args:
+        indices: 特徵索引
+        values: 對應的權重
+        model_version: 產生此向量的模型版本
+        feature_count: 特徵空間大小
+
+    Returns:
+        編碼後的 bytes
+    """
+    indices = np.ascontiguousarray(indices, dtype=_INDEX_DTYPE)
+    values = np.ascontiguousarray(values, dtype=_VALUE_DTYPE)
+    if indices.shape != values.shape:
+        raise ValueError("indices and values must have the same length")
+
+    header = _HEADER.pack(_MAGIC, FORMAT_VERSION, 0, model_version, feature_count, indices.size)
+    return header + indices.tobytes() + values.tobytes()
+
+
+def unpack_vector(data: bytes) -> PackedVector:
+    """
+    解碼二進位向量（以 np.frombuffer 零拷貝讀取）
+
+    Args:
+        data: pack_vector 產生的 bytes
+
+    Returns:
+        PackedVector
+
+    Raises:
+        ValueError: 資料格式錯誤
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Packed vector is shorter than its header")
+
+    magic, format_version, _, model_version, feature_count, nnz = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Invalid packed vector magic")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed vector format version: {format_version}")
+    if len(data) != _HEADER.size + nnz * 8:
+        raise ValueError("Packed vector length does not match its header")
+
+    indices = np.frombuffer(data, dtype=_INDEX_DTYPE, count=nnz, offset=_HEADER.size)
+    values = np.frombuffer(data, dtype=_VALUE_DTYPE, count=nnz, offset=_HEADER.size + nnz * 4)
+    return PackedVector(model_version, feature_count, indices, values)
+
+
+def convert_legacy_json(vector_json: str) -> Optional[bytes]:
+    """
+    將舊版 JSON 向量（{"vector": {"123": 0.04, ...}}）轉換為二進位格式
+
+    Args:
+        vector_json: 舊版 JSON 字串
+
+    Returns:
+        編碼後的 bytes，或 None（如果資料無效或為空）
+    """
+    try:
+        data = json.loads(vector_json)
+        sparse_vector = data.get("vector", {})
+        pairs = sorted((int(idx), float(value)) for idx, value in sparse_vector.items())
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        logger.warning(f"Invalid legacy vector data: {e}")
+        return None
+
+    if not pairs:
+        return None
+
+    indices = np.fromiter((idx for idx, _ in pairs), dtype=_INDEX_DTYPE, count=len(pairs))
+    values = np.fromiter((value for _, value in pairs), dtype=_VALUE_DTYPE, count=len(pairs))
+    feature_count = int(data.get("feature_count") or indices[-1] + 1)
+    return pack_vector(indices, values, UNKNOWN_MODEL_VERSION, feature_count)
+
+
+def is_compatible(model_version: int, expected_version: int) -> bool:
+    """判斷向量的模型版本是否與預期版本相容（任一方為未知版本時視為相容）"""
+    if UNKNOWN_MODEL_VERSION in (model_version, expected_version):
+        return True
+    return model_version == expected_version
+
+
+def decode_vector(data: Union[bytes, str, None]) -> Optional[PackedVector]:
+    """
+    解碼資料庫中的向量，兼容舊版 JSON 字串
+
+    Args:
+        data: 二進位向量或舊版 JSON 字串
+
+    Returns:
+        PackedVector，或 None（如果向量無效或為空）
+    """
+    if not data:
+        return None
+
+    if isinstance(data, str):
+        data = convert_legacy_json(data)
+        if data is None:
+            return None
+
+    try:
+        vector = unpack_vector(data)
+    except ValueError as e:
+        logger.warning(f"Invalid packed vector data: {e}")
+        return None
+
+    if vector.indices.size == 0:
+        return None
+    return vector
@@ -0,0 +1,686 @@
+"""
+書籤向量索引服務
+將所有書籤的 TF-IDF 向量常駐於記憶體中的 CSR 稀疏矩陣，搜尋時只需一次稀疏矩陣向量乘法；
+另保存一份 CSC（依特徵分列）副本，全語料檢索時只需讀取查詢詞彙所在的欄
+
+提供 LSA 投影時，向量另投影為連續的 float32 密集矩陣（每列一個書籤），
+相似度與全語料檢索改以一次密集矩陣乘法計算潛在語義空間的餘弦值。
+提供 LSH 索引時，approximate_top_k 只重新計分與查詢同桶的書籤（近似最近鄰）
+"""
+
+import heapq
+import logging
+import random
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+
+from .ann_index import ANN_FILENAME, LSHIndex
+from .search_cache import bump_generation
+from .vector_codec import UNKNOWN_MODEL_VERSION, decode_vector, is_compatible
+
+logger = logging.getLogger(__name__)
+
+SparseRow = Tuple[np.ndarray, np.ndarray]  # (特徵索引, 權重)
+
+
+def _normalize_row(indices: np.ndarray, values: np.ndarray) -> Optional[SparseRow]:
+    """將稀疏向量轉為 int32/float32 並做 L2 正規化，空向量返回 None"""
+    indices = np.asarray(indices, dtype=np.int32)
+    values = np.asarray(values, dtype=np.float32)
+    if indices.size == 0:
+        return None
+
+    norm = float(np.linalg.norm(values))
+    if norm == 0.0 or not np.isfinite(norm):
+        return None
+
+    order = np.argsort(indices, kind="stable")
+    return indices[order], values[order] / norm
+
+
+def _embed_rows(matrix: sparse.csr_matrix, projection: np.ndarray) -> np.ndarray:
+    """將稀疏向量投影到 LSA 空間並做 L2 正規化（零向量保持為零）"""
+    features = min(matrix.shape[1], projection.shape[1])
+    embeddings = np.asarray(matrix[:, :features] @ projection[:, :features].T, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+    return np.ascontiguousarray(embeddings)
+
+
+class VectorIndex:
+    """常駐記憶體的書籤向量索引：L2 正規化的 CSR 矩陣 + 列號對應書籤 ID"""
+
+    def __init__(self, compact_threshold: int = 1024, ann: Optional[LSHIndex] = None):
+        """
+        初始化向量索引
+
+        Args:
+            compact_threshold: 待合併列數達到此值時重建主矩陣
+            ann: 近似最近鄰索引，隨向量索引同步新增與刪除
+        """
+        self.compact_threshold = compact_threshold
+        self.ann = ann
+        self.feature_count = 0
+        self.model_version = UNKNOWN_MODEL_VERSION
+        self._lock = threading.RLock()
+
+        # 主矩陣：每列一個書籤，刪除或更新過的列以 _alive 標記失效
+        self._matrix: sparse.csr_matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self._columns: sparse.csc_matrix = sparse.csc_matrix((0, 0), dtype=np.float32)
+        self._row_ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._id_to_row: Dict[int, int] = {}
+
+        # 新增或更新後尚未合併進主矩陣的列
+        self._pending: Dict[int, SparseRow] = {}
+
+        # LSA：投影矩陣 (維度, 特徵數) 與每列書籤的正規化嵌入 (列數, 維度)
+        self._projection: Optional[np.ndarray] = None
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._pending_embeddings: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._id_to_row) + len(self._pending)
+
+    def __contains__(self, bookmark_id: int) -> bool:
+        with self._lock:
+            return bookmark_id in self._id_to_row or bookmark_id in self._pending
+
+    def build(
+        self,
+        rows: Iterable[Tuple[int, np.ndarray, np.ndarray]],
+        feature_count: int,
+        model_version: Optional[int] = None,
+        projection: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        以全部書籤向量重建索引
+
+        Args:
+            rows: (bookmark_id, 特徵索引, 權重) 的可迭代物件
+            feature_count: 特徵空間大小（會依實際出現的最大索引擴充）
+            model_version: 索引向量所屬的模型版本，未提供時沿用目前版本
+            projection: LSA 投影矩陣 (維度, 特徵數)，未提供時不使用 LSA
+        """
+        row_ids: List[int] = []
+        indptr = [0]
+        index_chunks: List[np.ndarray] = []
+        value_chunks: List[np.ndarray] = []
+
+        for bookmark_id, indices, values in rows:
+            row = _normalize_row(indices, values)
+            if row is None:
+                continue
+            row_indices, row_values = row
+            feature_count = max(feature_count, int(row_indices[-1]) + 1)
+            row_ids.append(int(bookmark_id))
+            index_chunks.append(row_indices)
+            value_chunks.append(row_values)
+            indptr.append(indptr[-1] + row_indices.size)
+
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate(value_chunks) if value_chunks else np.empty(0, dtype=np.float32),
+                np.concatenate(index_chunks) if index_chunks else np.empty(0, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(row_ids), feature_count),
+            dtype=np.float32,
+        )
+        columns = matrix.tocsc()
+        embeddings = (
+            _embed_rows(matrix, projection)
+            if projection is not None
+            else np.empty((0, 0), dtype=np.float32)
+        )
+
+        with self._lock:
+            if model_version is not None:
+                self.model_version = model_version
+            self.feature_count = feature_count
+            self._matrix = matrix
+            self._columns = columns
+            self._row_ids = np.asarray(row_ids, dtype=np.int64)
+            self._alive = np.ones(len(row_ids), dtype=bool)
+            self._id_to_row = {bookmark_id: row for row, bookmark_id in enumerate(row_ids)}
+            self._pending.clear()
+            self._projection = projection
+            self._embeddings = embeddings
+            self._pending_embeddings.clear()
+            if self.ann is not None:
+                self.ann.build(row_ids, embeddings if projection is not None else matrix)
+
+        logger.info(f"Vector index built with {len(row_ids)} rows ({matrix.nnz} non-zeros)")
+
+    def upsert(self, bookmark_id: int, indices: np.ndarray, values: np.ndarray) -> None:
+        """新增或更新單一書籤的向量"""
+        row = _normalize_row(indices, values)
+        with self._lock:
+            self._drop(bookmark_id)
+            if row is None:
+                return
+            self.feature_count = max(self.feature_count, int(row[0][-1]) + 1)
+            self._pending[bookmark_id] = row
+            if self._projection is not None:
+                embedding = self._embed_query(*row)
+                if embedding is None:
+                    embedding = np.zeros(self._projection.shape[0], dtype=np.float32)
+                self._pending_embeddings[bookmark_id] = embedding
+                if self.ann is not None:
+                    self.ann.insert(bookmark_id, embedding)
+            elif self.ann is not None:
+                self.ann.insert(bookmark_id, self._ann_input(row))
+            if len(self._pending) >= self.compact_threshold:
+                self._compact()
+
+    def upsert_encoded(self, bookmark_id: int, data: Optional[bytes]) -> None:
+        """
+        以資料庫中的編碼向量新增或更新書籤
+
+        無效向量或由其他模型版本產生的向量會將書籤移出索引。
+        """
+        vector = decode_vector(data)
+        if vector is None or not is_compatible(vector.model_version, self.model_version):
+            self.remove(bookmark_id)
+            return
+        self.upsert(bookmark_id, vector.indices, vector.values)
+
+    def remove(self, bookmark_id: int) -> None:
+        """將書籤移出索引"""
+        with self._lock:
+            self._drop(bookmark_id)
+
+    def clear(self) -> None:
+        """清空索引"""
+        self.build([], 0, UNKNOWN_MODEL_VERSION)
+
+    def similarities(
+        self, query_indices: np.ndarray, query_values: np.ndarray, bookmark_ids: Sequence[int]
+    ) -> Dict[int, float]:
+        """
+        計算查詢向量與指定書籤的餘弦相似度
+
+        只取出候選書籤的列組成子矩陣，以一次稀疏矩陣向量乘法完成計算。
+        不在索引中的書籤不會出現在結果中。
+
+        Args:
+            query_indices: 查詢向量的特徵索引
+            query_values: 查詢向量的權重
+            bookmark_ids: 候選書籤 ID
+
+        Returns:
+            bookmark_id -> 相似度 (0-1)
+        """
+        with self._lock:
+            if self._projection is not None:
+                return self._embedding_similarities(query_indices, query_values, bookmark_ids)
+
+            query = self._query_vector(query_indices, query_values)
+            if query is None:
+                return {}
+
+            main_ids = []
+            main_rows = []
+            pending_ids = []
+            for bookmark_id in bookmark_ids:
+                row = self._id_to_row.get(bookmark_id)
+                if row is not None:
+                    main_ids.append(bookmark_id)
+                    main_rows.append(row)
+                elif bookmark_id in self._pending:
+                    pending_ids.append(bookmark_id)
+
+            scores: Dict[int, float] = {}
+            if main_rows:
+                submatrix = self._matrix[np.asarray(main_rows, dtype=np.int64)]
+                products = submatrix @ query[: submatrix.shape[1]]
+                scores.update(zip(main_ids, products.tolist()))
+            if pending_ids:
+                products = self._pending_matrix(pending_ids) @ query
+                scores.update(zip(pending_ids, products.tolist()))
+
+        return {bookmark_id: min(max(score, 0.0), 1.0) for bookmark_id, score in scores.items()}
+
+    def top_k(
+        self, query_indices: np.ndarray, query_values: np.ndarray, k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        在整個索引中找出與查詢最相似的 k 個書籤
+
+        只讀取 CSC 副本中查詢詞彙所在的欄計算所有列的分數，
+        再以 argpartition 選出前 k 名（不需排序整個語料）。
+
+        Args:
+            query_indices: 查詢向量的特徵索引
+            query_values: 查詢向量的權重
+            k: 返回的書籤數量
+
+        Returns:
+            依相似度由高到低排序的 (bookmark_id, 相似度)，不含相似度為 0 的書籤
+        """
+        row = _normalize_row(query_indices, query_values)
+        if row is None or k <= 0:
+            return []
+        row_indices, row_values = row
+
+        with self._lock:
+            candidate_ids: List[np.ndarray] = []
+            candidate_scores: List[np.ndarray] = []
+
+            keep = row_indices < self._columns.shape[1]
+            embedded_query = None
+            if self._projection is not None:
+                embedded_query = self._embed_query(row_indices, row_values)
+                if embedded_query is None:
+                    return []
+            if self._matrix.shape[0] and np.any(keep):
+                if embedded_query is not None:
+                    # LSA：一次密集矩陣向量乘法計算所有書籤
+                    scores = self._embeddings @ embedded_query
+                else:
+                    scores = self._columns[:, row_indices[keep]] @ row_values[keep]
+                scores[~self._alive] = 0.0
+                if k < scores.size:
+                    top = np.argpartition(scores, -k)[-k:]
+                else:
+                    top = np.arange(scores.size)
+                candidate_ids.append(self._row_ids[top])
+                candidate_scores.append(scores[top])
+
+            if self._pending:
+                pending_ids = list(self._pending)
+                candidate_ids.append(np.asarray(pending_ids, dtype=np.int64))
+                if embedded_query is not None:
+                    pending = np.stack([self._pending_embeddings[bid] for bid in pending_ids])
+                    candidate_scores.append(pending @ embedded_query)
+                else:
+                    query = self._query_vector(query_indices, query_values)
+                    candidate_scores.append(self._pending_matrix(pending_ids) @ query)
+
+        if not candidate_ids:
+            return []
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(ids[i]), min(float(scores[i]), 1.0)) for i in order if scores[i] > 0.0]
+
+    def approximate_top_k(
+        self, query_indices: np.ndarray, query_values: np.ndarray, k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        以 LSH 索引找出候選書籤，再以精確相似度選出前 k 名
+
+        未設定 LSH 索引時等同 top_k。
+
+        Args:
+            query_indices: 查詢向量的特徵索引
+            query_values: 查詢向量的權重
+            k: 返回的書籤數量
+
+        Returns:
+            依相似度由高到低排序的 (bookmark_id, 相似度)，不含相似度為 0 的書籤
+        """
+        if self.ann is None:
+            return self.top_k(query_indices, query_values, k)
+
+        row = _normalize_row(query_indices, query_values)
+        if row is None or k <= 0:
+            return []
+        with self._lock:
+            query = self._ann_input(row)
+            if query is None:
+                return []
+            candidates = self.ann.candidates(query)
+            scores = self.similarities(query_indices, query_values, list(candidates))
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(bookmark_id, score) for bookmark_id, score in top if score > 0.0]
+
+    def similarity_blocks(
+        self, bookmark_ids: Sequence[int], block_size: int = 128
+    ) -> Iterator[Tuple[List[int], np.ndarray, np.ndarray]]:
+        """
+        以分塊矩陣乘法計算指定書籤與索引中所有書籤的相似度
+
+        先合併待合併列再取得主矩陣的快照，之後在鎖外逐塊計算
+        （build 與 _compact 只替換矩陣，不原地修改），每塊的記憶體用量為 區塊大小 × 書籤數。
+
+        Args:
+            bookmark_ids: 要計算的書籤 ID（不在索引中的書籤略過）
+            block_size: 每塊的書籤數
+
+        Yields:
+            (區塊的書籤 ID, 索引中所有書籤 ID, 相似度矩陣 (區塊書籤數, 書籤數))，
+            自身與已刪除書籤的相似度為 0
+        """
+        with self._lock:
+            if self._pending:
+                self._compact()
+            matrix = self._matrix
+            columns = self._columns
+            embeddings = self._embeddings if self._projection is not None else None
+            row_ids = self._row_ids
+            alive = self._alive.copy()
+            rows = [
+                (bookmark_id, self._id_to_row[bookmark_id])
+                for bookmark_id in bookmark_ids
+                if bookmark_id in self._id_to_row
+            ]
+
+        transposed = columns.T  # CSC 副本的轉置即為 CSR 格式的 (特徵數, 書籤數)，不需複製
+        for start in range(0, len(rows), block_size):
+            block = rows[start : start + block_size]
+            block_rows = np.fromiter((row for _, row in block), dtype=np.int64, count=len(block))
+            if embeddings is not None:
+                scores = embeddings[block_rows] @ embeddings.T
+            else:
+                scores = (matrix[block_rows] @ transposed).toarray()
+            scores[:, ~alive] = 0.0
+            scores[np.arange(len(block)), block_rows] = 0.0
+            np.clip(scores, 0.0, 1.0, out=scores)
+            yield [bookmark_id for bookmark_id, _ in block], row_ids, scores
+
+    def measure_ann_recall(self, k: int = 10, samples: int = 32, seed: int = 0) -> Optional[float]:
+        """
+        以索引中隨機抽樣的書籤向量為查詢，量測 approximate_top_k 相對於精確 top_k 的 recall@k
+
+        結果記錄於 LSH 索引的統計資訊。
+
+        Returns:
+            平均 recall@k，未設定 LSH 索引或索引為空時返回 None
+        """
+        if self.ann is None:
+            return None
+        with self._lock:
+            alive = np.flatnonzero(self._alive)
+            rows = random.Random(seed).sample(alive.tolist(), min(samples, alive.size))
+            queries = []
+            for row in rows:
+                start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+                queries.append((self._matrix.indices[start:end], self._matrix.data[start:end]))
+
+        recalls = []
+        for indices, values in queries:
+            exact = {bookmark_id for bookmark_id, _ in self.top_k(indices, values, k)}
+            if exact:
+                approximate = self.approximate_top_k(indices, values, k)
+                found = {bookmark_id for bookmark_id, _ in approximate}
+                recalls.append(len(exact & found) / len(exact))
+        if not recalls:
+            return None
+
+        recall = float(np.mean(recalls))
+        self.ann.recall_at_k = {"k": k, "recall": recall, "samples": len(recalls)}
+        logger.info(f"LSH recall@{k}: {recall:.3f} over {len(recalls)} sampled queries")
+        return recall
+
+    def stats(self) -> Dict[str, int]:
+        """獲取索引統計資訊"""
+        with self._lock:
+            return {
+                "rows": len(self._id_to_row) + len(self._pending),
+                "matrix_rows": int(self._matrix.shape[0]),
+                "dead_rows": int(self._matrix.shape[0] - len(self._id_to_row)),
+                "pending_rows": len(self._pending),
+                "non_zeros": int(self._matrix.nnz),
+                "feature_count": self.feature_count,
+                "model_version": self.model_version,
+                "lsa_dimensions": 0 if self._projection is None else self._projection.shape[0],
+                "ann": self.ann.stats() if self.ann is not None else None,
+            }
+
+    def _drop(self, bookmark_id: int) -> None:
+        row = self._id_to_row.pop(bookmark_id, None)
+        if row is not None:
+            self._alive[row] = False
+        self._pending.pop(bookmark_id, None)
+        self._pending_embeddings.pop(bookmark_id, None)
+        if self.ann is not None:
+            self.ann.remove(bookmark_id)
+
+    def _query_vector(self, indices: np.ndarray, values: np.ndarray) -> Optional[np.ndarray]:
+        """建立 L2 正規化的密集查詢向量（長度為特徵數，僅在搜尋時配置一次）"""
+        row = _normalize_row(indices, values)
+        if row is None or self.feature_count == 0:
+            return None
+        row_indices, row_values = row
+        keep = row_indices < self.feature_count
+        query = np.zeros(self.feature_count, dtype=np.float32)
+        query[row_indices[keep]] = row_values[keep]
+        return query
+
+    def _embed_query(self, indices: np.ndarray, values: np.ndarray) -> Optional[np.ndarray]:
+        """將正規化的稀疏向量投影為 L2 正規化的 LSA 嵌入，投影後為零向量時返回 None"""
+        keep = indices < self._projection.shape[1]
+        embedding = self._projection[:, indices[keep]] @ values[keep]
+        norm = float(np.linalg.norm(embedding))
+        if norm == 0.0 or not np.isfinite(norm):
+            return None
+        return (embedding / norm).astype(np.float32)
+
+    def _ann_input(self, row: SparseRow):
+        """LSH 索引的輸入：LSA 嵌入，或單列的稀疏向量（呼叫者持有鎖）"""
+        if self._projection is not None:
+            return self._embed_query(*row)
+        row_indices, row_values = row
+        return sparse.csr_matrix(
+            (row_values, row_indices, [0, row_indices.size]),
+            shape=(1, max(self.feature_count, int(row_indices[-1]) + 1)),
+        )
+
+    def _embedding_similarities(
+        self, query_indices: np.ndarray, query_values: np.ndarray, bookmark_ids: Sequence[int]
+    ) -> Dict[int, float]:
+        """以 LSA 嵌入計算查詢與指定書籤的餘弦相似度（呼叫者持有鎖）"""
+        row = _normalize_row(query_indices, query_values)
+        query = self._embed_query(*row) if row is not None else None
+        if query is None:
+            return {}
+
+        scores: Dict[int, float] = {}
+        main_ids = [bid for bid in bookmark_ids if bid in self._id_to_row]
+        if main_ids:
+            rows = np.fromiter((self._id_to_row[bid] for bid in main_ids), dtype=np.int64)
+            scores.update(zip(main_ids, (self._embeddings[rows] @ query).tolist()))
+        for bookmark_id in bookmark_ids:
+            embedding = self._pending_embeddings.get(bookmark_id)
+            if embedding is not None:
+                scores[bookmark_id] = float(embedding @ query)
+        return {bookmark_id: min(max(score, 0.0), 1.0) for bookmark_id, score in scores.items()}
+
+    def _pending_matrix(self, bookmark_ids: Sequence[int]) -> sparse.csr_matrix:
+        indptr = [0]
+        index_chunks = []
+        value_chunks = []
+        for bookmark_id in bookmark_ids:
+            row_indices, row_values = self._pending[bookmark_id]
+            index_chunks.append(row_indices)
+            value_chunks.append(row_values)
+            indptr.append(indptr[-1] + row_indices.size)
+        return sparse.csr_matrix(
+            (np.concatenate(value_chunks), np.concatenate(index_chunks), indptr),
+            shape=(len(bookmark_ids), self.feature_count),
+            dtype=np.float32,
+        )
+
+    def _compact(self) -> None:
+        """將待合併列與存活列合併為新的主矩陣"""
+        alive_rows = np.flatnonzero(self._alive)
+        kept = self._matrix[alive_rows]
+        rows = []
+        for i, row in enumerate(alive_rows):
+            start, end = kept.indptr[i], kept.indptr[i + 1]
+            rows.append((int(self._row_ids[row]), kept.indices[start:end], kept.data[start:end]))
+        rows.extend(
+            (bookmark_id, row_indices, row_values)
+            for bookmark_id, (row_indices, row_values) in self._pending.items()
+        )
+        self.build(rows, self.feature_count, projection=self._projection)
+
+
+# 全局實例
+_index_instance: Optional[VectorIndex] = None
+_activation_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """
+    獲取全局書籤向量索引實例
+
+    Returns:
+        VectorIndex 實例
+    """
+    global _index_instance
+    if _index_instance is None:
+        with _activation_lock:
+            if _index_instance is None:
+                _index_instance = VectorIndex(ann=create_ann_index())
+    return _index_instance
+
+
+def create_ann_index() -> Optional[LSHIndex]:
+    """依設定建立 LSH 索引（SEARCH_ANN 未啟用時返回 None）"""
+    from app import config
+
+    if not config.SEARCH_ANN:
+        return None
+    return LSHIndex(tables=config.ANN_TABLES, bits=config.ANN_BITS, probes=config.ANN_PROBES)
+
+
+def _ann_metadata(db: Session, vectorizer) -> Dict[str, object]:
+    """LSH 存檔的適用條件：模型版本、LSA 維度與語料指紋"""
+    from .tfidf_vectorizer import compute_corpus_fingerprint
+
+    projection = vectorizer.lsa_projection
+    return {
+        "model_version": vectorizer.model_version,
+        "lsa_dimensions": 0 if projection is None else projection.shape[0],
+        "corpus": compute_corpus_fingerprint(db),
+    }
+
+
+def _ann_path() -> Path:
+    from .tfidf_vectorizer import get_model_dir
+
+    return get_model_dir() / ANN_FILENAME
+
+
+def save_ann_index() -> None:
+    """將全局索引的 LSH 桶編號存檔，下次啟動時不需重新投影整個語料"""
+    from app.models.database import SessionLocal
+
+    from .tfidf_vectorizer import get_vectorizer
+
+    index = get_vector_index()
+    vectorizer = get_vectorizer()
+    if index.ann is None or not vectorizer.is_trained:
+        return
+
+    db = SessionLocal()
+    try:
+        metadata = _ann_metadata(db, vectorizer)
+        with index._lock:
+            index.ann.save(_ann_path(), metadata)
+    except Exception as e:
+        logger.error(f"An error occurred while saving the LSH index: {e}")
+    finally:
+        db.close()
+
+
+def _load_vectors(db: Session, model_version: int):
+    """逐列讀取資料庫中與指定模型版本相容的書籤向量"""
+    from app.models.database import Bookmark
+
+    query = db.query(Bookmark.id, Bookmark.tfidf_vector).filter(Bookmark.tfidf_vector.isnot(None))
+    for bookmark_id, data in query.yield_per(1000):
+        vector = decode_vector(data)
+        # 略過無效或由其他模型版本產生的過期向量
+        if vector is None or not is_compatible(vector.model_version, model_version):
+            continue
+        yield bookmark_id, vector.indices, vector.values
+
+
+def build_vector_index(db: Session, vectorizer) -> VectorIndex:
+    """
+    以指定的向量化器建立新的向量索引（不影響全局索引）
+
+    Args:
+        db: 資料庫 Session
+        vectorizer: 已訓練的 TFIDFVectorizer
+
+    Returns:
+        新建立的 VectorIndex
+    """
+    index = VectorIndex(ann=create_ann_index())
+    index.build(
+        _load_vectors(db, vectorizer.model_version),
+        vectorizer.feature_count,
+        vectorizer.model_version,
+        projection=vectorizer.lsa_projection,
+    )
+    index.measure_ann_recall()
+    return index
+
+
+def activate_model(vectorizer, index: VectorIndex) -> None:
+    """
+    同時將全局向量化器與向量索引切換為新模型
+
+    查詢向量與索引的模型版本不一致時搜尋會退回關鍵字分數，
+    因此讀取端不需加鎖，只有切換本身需要互斥。
+    """
+    global _index_instance
+    from .tfidf_vectorizer import set_vectorizer
+
+    with _activation_lock:
+        _index_instance = index
+        set_vectorizer(vectorizer)
+        bump_generation()
+    logger.info(f"Activated TF-IDF model {vectorizer.model_version} with {len(index)} vectors")
+
+
+def rebuild_vector_index(db: Optional[Session] = None) -> None:
+    """
+    從資料庫載入所有書籤向量並重建全局索引
+
+    Args:
+        db: 使用中的資料庫 Session，未提供時自行建立
+    """
+    from app.models.database import SessionLocal
+
+    from .tfidf_vectorizer import get_vectorizer
+
+    index = get_vector_index()
+    vectorizer = get_vectorizer()
+    feature_count = vectorizer.feature_count
+    if feature_count == 0:
+        index.clear()
+        logger.info("Vectorizer not trained. Vector index left empty.")
+        return
+
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
+    try:
+        model_version = vectorizer.model_version
+        if index.ann is not None:
+            # 沿用存檔的桶編號，只為存檔後新增的書籤重新投影
+            index.ann.load(_ann_path(), _ann_metadata(db, vectorizer))
+        index.build(
+            _load_vectors(db, model_version),
+            feature_count,
+            model_version,
+            projection=vectorizer.lsa_projection,
+        )
+        index.measure_ann_recall()
+        bump_generation()
+    except Exception as e:
+        logger.error(f"An error occurred while rebuilding the vector index: {e}")
+    finally:
+        if owns_session:
+            db.close()
@@ -0,0 +1,97 @@
+"""
+近似最近鄰基準測試：LSH 候選檢索（SEARCH_ANN）與精確全語料檢索的 recall@k 與延遲
+
+以合成的 Zipf 分布稀疏向量建立索引，對每組 (tables, bits, probes) 設定量測
+approximate_top_k 的延遲、平均候選數量，以及與 top_k 精確結果相比的 recall@k。
+查詢取自語料中的書籤向量加上少量雜訊（與「相關書籤」及長查詢相近）。
+
+執行方式（於 backend 目錄）：
+    python -m benchmarks.bench_ann_recall --documents 50000 --top-k 10
+"""
+
+import argparse
+import statistics
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.ann_index import LSHIndex
+from app.services.vector_index import VectorIndex
+from benchmarks.bench_full_corpus_retrieval import build_rows, percentile
+
+SETTINGS = [(8, 8, 0), (16, 8, 2), (16, 10, 2), (32, 10, 4)]
+
+
+def build_queries(rows: List[Tuple], count: int, seed: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """從語料抽樣書籤向量，隨機捨棄約兩成詞彙作為查詢"""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for row in rng.choice(len(rows), size=count, replace=False):
+        _, indices, values = rows[row]
+        keep = rng.random(indices.size) > 0.2
+        queries.append((indices[keep], values[keep]))
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--features", type=int, default=5000)
+    parser.add_argument("--terms", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = build_rows(args.documents, args.features, args.terms, args.seed)
+    queries = build_queries(rows, args.queries, args.seed)
+
+    exact_index = VectorIndex()
+    exact_index.build(rows, args.features, model_version=1)
+    latencies = []
+    exact = []
+    for indices, values in queries:
+        start = time.perf_counter()
+        exact.append({bid for bid, _ in exact_index.top_k(indices, values, args.top_k)})
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"{args.documents} documents, {args.features} features, top-{args.top_k}\n")
+    print(
+        f"{'method':<24}{'build s':>9}{'candidates':>12}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'recall':>9}"
+    )
+    print(
+        f"{'exact top_k':<24}{'':>9}{args.documents:>12}{statistics.median(latencies):>9.2f}"
+        f"{percentile(latencies, 0.95):>9.2f}{1.0:>9.3f}"
+    )
+
+    for tables, bits, probes in SETTINGS:
+        ann = LSHIndex(tables=tables, bits=bits, probes=probes)
+        index = VectorIndex(ann=ann)
+        start = time.perf_counter()
+        index.build(rows, args.features, model_version=1)
+        build_time = time.perf_counter() - start
+
+        latencies = []
+        candidates = []
+        recalls = []
+        for (indices, values), expected in zip(queries, exact):
+            start = time.perf_counter()
+            ranked = index.approximate_top_k(indices, values, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            candidates.append(len(ann.candidates(index._ann_input((indices, values)))))
+            if expected:
+                found = {bid for bid, _ in ranked}
+                recalls.append(len(expected & found) / len(expected))
+
+        name = f"LSH {tables}x{bits} probes={probes}"
+        print(
+            f"{name:<24}{build_time:>9.2f}{statistics.mean(candidates):>12.0f}"
+            f"{statistics.median(latencies):>9.2f}{percentile(latencies, 0.95):>9.2f}"
+            f"{statistics.mean(recalls):>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
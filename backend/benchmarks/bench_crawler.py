@@ -0,0 +1,90 @@
+"""
+批量抓取基準測試：依序抓取（每個書籤一個背景任務）與 BulkCrawler 的每秒頁數
+
+啟動本機 HTTP 伺服器，以固定延遲模擬遠端網站的回應時間，頁面分布在多個虛擬主機
+（以 Host 名稱 127.0.0.N 區分）。依序抓取與原本逐一執行的背景任務相同：
+每個頁面抓取並解析完才抓下一個。
+
+執行方式（於 backend 目錄）：
+    python -m benchmarks.bench_crawler --pages 500 --latency 0.2 --hosts 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from app.services.content_enricher import ContentEnricher
+from app.services.crawler import BulkCrawler
+
+PAGE = (
+    "<html><head><title>Page {name}</title></head><body><article>"
+    + "<p>Bookmark manager benchmark paragraph about search and retrieval.</p>" * 20
+    + "</article></body></html>"
+)
+
+
+async def serve(latency: float):
+    async def handler(request):
+        await asyncio.sleep(latency)
+        name = request.match_info["name"]
+        return web.Response(text=PAGE.format(name=name), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def run(args) -> None:
+    runner, port = await serve(args.latency)
+    urls = [
+        (i, f"http://127.0.0.{i % args.hosts + 1}:{port}/page{i}") for i in range(args.pages)
+    ]
+    enricher = ContentEnricher()
+    await enricher.open_session()
+    try:
+        sequential = urls[: args.sequential_pages]
+        start = time.perf_counter()
+        for _, url in sequential:
+            await enricher.extract_content(url)
+        sequential_rate = len(sequential) / (time.perf_counter() - start)
+
+        crawler = BulkCrawler(
+            enricher,
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            host_delay=args.host_delay,
+            batch_size=50,
+        )
+        stats = await crawler.crawl(urls, lambda batch: None)
+    finally:
+        await enricher.close_session()
+        await runner.cleanup()
+
+    print(f"{args.pages} pages on {args.hosts} hosts, {args.latency * 1000:.0f} ms latency\n")
+    print(f"{'method':<36}{'pages/s':>10}{'est. total s':>14}")
+    print(f"{'sequential':<36}{sequential_rate:>10.1f}{args.pages / sequential_rate:>14.1f}")
+    name = f"crawler c={args.concurrency} host={args.per_host}"
+    print(f"{name:<36}{stats.pages_per_second:>10.1f}{stats.elapsed:>14.1f}")
+    print(f"\nfetched={stats.fetched} failed={stats.failed} retries={stats.retries}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--sequential-pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--host-delay", type=float, default=0.5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+全語料檢索基準測試：VectorIndex.top_k 與整個 CSR 矩陣乘法加完整排序
+
+以合成的 Zipf 分布稀疏向量建立索引，量測混合檢索（SEARCH_RETRIEVAL=hybrid）
+每次查詢在整個語料中選出前 k 名的延遲，並確認稀疏計算的前 k 名與完整排序一致。
+另量測 LSA 索引（VECTORIZER_LSA_COMPONENTS）以一次密集矩陣乘法檢索的延遲；
+延遲只與維度有關，因此以隨機正交投影代替實際的 SVD。
+
+執行方式（於 backend 目錄）：
+    python -m benchmarks.bench_full_corpus_retrieval --documents 100000 --top-k 30
+"""
+
+import argparse
+import statistics
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+
+
+def build_rows(documents: int, features: int, terms: int, seed: int) -> List[Tuple]:
+    """產生每篇文件約 terms 個詞彙（Zipf 分布）的稀疏向量"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, features + 1)
+    weights /= weights.sum()
+    rows = []
+    for bookmark_id in range(documents):
+        indices = np.unique(rng.choice(features, size=terms, p=weights))
+        rows.append((bookmark_id, indices, rng.random(indices.size) + 0.01))
+    return rows
+
+
+def random_projection(dimensions: int, features: int, seed: int) -> np.ndarray:
+    """列向量互相正交的隨機投影（與 TruncatedSVD 的 components_ 形狀相同）"""
+    rng = np.random.default_rng(seed + 2)
+    basis, _ = np.linalg.qr(rng.standard_normal((features, dimensions)))
+    return np.ascontiguousarray(basis.T, dtype=np.float32)
+
+
+def build_queries(count: int, features: int, seed: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """每個查詢取 2-5 個詞彙，偏向中低頻詞彙（與一般搜尋詞相近）"""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(count):
+        size = int(rng.integers(2, 6))
+        indices = rng.choice(np.arange(10, features), size=size, replace=False)
+        queries.append((indices, np.ones(size)))
+    return queries
+
+
+def exact_top_k(index: VectorIndex, indices: np.ndarray, values: np.ndarray, k: int):
+    """基準做法：整個 CSR 矩陣乘以密集查詢向量，再完整排序"""
+    query = index._query_vector(indices, values)
+    scores = index._matrix @ query
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [(int(index._row_ids[i]), float(scores[i])) for i in order if scores[i] > 0.0]
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    return sorted(values)[max(0, int(len(values) * ratio) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--features", type=int, default=5000)
+    parser.add_argument("--terms", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=30)
+    parser.add_argument("--lsa-dimensions", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = build_rows(args.documents, args.features, args.terms, args.seed)
+    start = time.perf_counter()
+    index = VectorIndex()
+    index.build(rows, args.features, model_version=1)
+    build_time = time.perf_counter() - start
+    queries = build_queries(args.queries, args.features, args.seed)
+
+    methods = [
+        ("top_k (CSC + argpartition)", lambda q: index.top_k(q[0], q[1], args.top_k)),
+        ("CSR matvec + argsort", lambda q: exact_top_k(index, q[0], q[1], args.top_k)),
+    ]
+    if args.lsa_dimensions:
+        lsa_index = VectorIndex()
+        lsa_index.build(
+            rows,
+            args.features,
+            model_version=1,
+            projection=random_projection(args.lsa_dimensions, args.features, args.seed),
+        )
+        methods.append(
+            (
+                f"top_k (LSA {args.lsa_dimensions}-d)",
+                lambda q: lsa_index.top_k(q[0], q[1], args.top_k),
+            )
+        )
+
+    results = {}
+    for name, search in methods:
+        latencies = []
+        rankings = []
+        for query in queries:
+            start = time.perf_counter()
+            rankings.append(search(query))
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = (latencies, rankings)
+
+    stats = index.stats()
+    print(
+        f"{args.documents} documents, {stats['non_zeros']} non-zeros, "
+        f"built in {build_time:.2f}s, top-{args.top_k}\n"
+    )
+    print(f"{'method':<28}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, (latencies, _) in results.items():
+        print(
+            f"{name:<28}{statistics.median(latencies):>10.2f}"
+            f"{percentile(latencies, 0.95):>10.2f}{max(latencies):>10.2f}"
+        )
+
+    fast, exact = (results[name][1] for name, _ in methods[:2])
+    agreement = [
+        np.allclose([score for _, score in a], [score for _, score in b], atol=1e-5)
+        for a, b in zip(fast, exact)
+    ]
+    print(f"\ntop-{args.top_k} scores identical: {sum(agreement)}/{len(agreement)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+網頁解析後端基準測試：各後端的每秒頁數與記憶體峰值
+
+以合成頁面（多層巢狀 div、段落、連結、script/style 雜訊）比較 html_parser.py 中
+已安裝的解析後端。每個後端在獨立的子行程執行，記憶體峰值以 ru_maxrss 相對於
+解析前的增量（含 C 擴充配置的記憶體）與 tracemalloc 峰值（只含 Python 物件）表示。
+
+執行方式（於 backend 目錄）：
+    python -m benchmarks.bench_html_parsers --sizes 20 200 2000 --repeat 5
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from app.services.html_parser import PARSERS, available_parsers
+
+PARAGRAPH = (
+    '<div class="block"><p>書籤管理器基準測試段落，包含 <a href="/link/{i}">連結 {i}</a> '
+    "與 <b>search</b> and <i>retrieval</i> text.</p><span>{i}</span></div>"
+)
+
+
+def synthetic_page(kilobytes: int) -> str:
+    """約 kilobytes KB 的合成網頁"""
+    head = (
+        "<html><head><title>Benchmark</title>"
+        '<meta name="description" content="synthetic page">'
+        '<meta property="og:image" content="/cover.png">'
+        "<style>.block { margin: 0 }</style><script>var x = 1;</script></head><body>"
+        "<header><h1>Site</h1><nav>" + "<a href='/'>menu</a>" * 20 + "</nav></header>"
+        '<div class="post-content">'
+    )
+    parts = [head]
+    size = len(head)
+    i = 0
+    while size < kilobytes * 1024:
+        paragraph = PARAGRAPH.format(i=i)
+        parts.append(paragraph)
+        size += len(paragraph.encode("utf-8"))
+        i += 1
+    parts.append("</div><footer>footer</footer></body></html>")
+    return "".join(parts)
+
+
+def _max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以位元組回報，Linux 以 KB 回報
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _measure(name: str, kilobytes: int, repeat: int, output) -> None:
+    """在子行程中量測單一後端（記憶體峰值不受其他後端影響）"""
+    parser = PARSERS[name]()
+    html = synthetic_page(kilobytes)
+    parser.parse(html, "https://example.com/")  # 預熱
+
+    rss_before = _max_rss_bytes()
+    tracemalloc.start()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parser.parse(html, "https://example.com/")
+        timings.append(time.perf_counter() - started)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    output.send(
+        {
+            "pages_per_second": 1 / median if median > 0 else float("inf"),
+            "ms_per_page": median * 1000,
+            "rss_delta_mb": (_max_rss_bytes() - rss_before) / 2**20,
+            "traced_peak_mb": traced_peak / 2**20,
+        }
+    )
+
+
+def run(name: str, kilobytes: int, repeat: int) -> Dict:
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure, args=(name, kilobytes, repeat, sender))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000], help="頁面 KB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names: List[str] = available_parsers()
+    missing = [name for name in PARSERS if name not in names]
+    if missing:
+        print(f"Not installed (skipped): {', '.join(missing)}")
+
+    print(
+        f"{'size':>8} {'parser':>12} {'pages/s':>10} {'ms/page':>10} "
+        f"{'rss Δ MB':>10} {'traced MB':>10}"
+    )
+    for kilobytes in args.sizes:
+        for name in names:
+            result = run(name, kilobytes, args.repeat)
+            print(
+                f"{kilobytes:>6}KB {name:>12} {result['pages_per_second']:>10.1f} "
+                f"{result['ms_per_page']:>10.2f} {result['rss_delta_mb']:>10.1f} "
+                f"{result['traced_peak_mb']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+向量化模式基準測試：詞彙表模型（max_features=5000）與特徵雜湊模式
+
+以合成的主題語料比較訓練、文件向量化與查詢延遲、記憶體用量，
+以及兩種模式搜尋結果前 k 名的重疊率。
+
+執行方式（於 backend 目錄）：
+    python -m benchmarks.bench_vectorizer_modes --documents 2000 --hash-bits 18
+"""
+
+import argparse
+import heapq
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Set
+
+from app.services.tfidf_vectorizer import TFIDFVectorizer
+from app.services.vector_codec import decode_vector
+from app.services.vector_index import VectorIndex
+
+
+def build_corpus(documents: int, topics: int, vocabulary_size: int, seed: int) -> List[str]:
+    """產生合成語料：每篇文件取自一個主題的 Zipf 分布詞彙，並混入共同詞彙"""
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocabulary_size)]
+    common = words[:50]
+    topic_words = [rng.sample(words[50:], 300) for _ in range(topics)]
+    zipf = [1.0 / (rank + 1) for rank in range(300)]
+
+    corpus = []
+    for _ in range(documents):
+        topic = rng.randrange(topics)
+        length = rng.randint(50, 300)
+        tokens = rng.choices(topic_words[topic], weights=zipf, k=length)
+        tokens += rng.choices(common, k=length // 5)
+        corpus.append(" ".join(tokens))
+    return corpus
+
+
+def build_queries(corpus: List[str], count: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    queries = []
+    for document in rng.sample(corpus, min(count, len(corpus))):
+        tokens = document.split()
+        queries.append(" ".join(rng.sample(tokens, min(3, len(tokens)))))
+    return queries
+
+
+def run_mode(
+    vectorizer: TFIDFVectorizer,
+    corpus: List[str],
+    queries: List[str],
+    frequencies: Dict[str, int],
+    top_k: int,
+) -> Dict:
+    """訓練（必要時）、向量化、建立索引並執行查詢，返回量測結果"""
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    vectorizer.fit(corpus)
+    fit_time = time.perf_counter() - start
+    if vectorizer.uses_live_idf:
+        vectorizer.set_document_frequencies(frequencies, len(corpus))
+    model_bytes = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    vectors = [vectorizer.transform(document) for document in corpus]
+    transform_time = time.perf_counter() - start
+    tracemalloc.stop()
+
+    rows = []
+    for bookmark_id, data in enumerate(vectors):
+        vector = decode_vector(data)
+        if vector is not None:
+            rows.append((bookmark_id, vector.indices, vector.values))
+    index = VectorIndex()
+    index.build(rows, vectorizer.feature_count, vectorizer.model_version)
+    matrix = index._matrix
+    index_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    bookmark_ids = [row[0] for row in rows]
+    latencies = []
+    rankings: List[Set[int]] = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vector = decode_vector(vectorizer.transform_query(query))
+        scores = {}
+        if query_vector is not None:
+            scores = index.similarities(query_vector.indices, query_vector.values, bookmark_ids)
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        latencies.append(time.perf_counter() - start)
+        rankings.append({bookmark_id for bookmark_id, _ in top})
+
+    return {
+        "fit_s": fit_time,
+        "transform_ms_per_doc": transform_time / len(corpus) * 1000,
+        "query_ms_p50": statistics.median(latencies) * 1000,
+        "query_ms_p95": sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000,
+        "feature_count": vectorizer.feature_count,
+        "model_kib": model_bytes / 1024,
+        "stored_vectors_kib": sum(len(data or b"") for data in vectors) / 1024,
+        "index_kib": index_bytes / 1024,
+        "query_vector_kib": vectorizer.feature_count * 4 / 1024,
+        "rankings": rankings,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--vocabulary-size", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--hash-bits", type=int, default=18)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.documents, args.topics, args.vocabulary_size, args.seed)
+    queries = build_queries(corpus, args.queries, args.seed)
+
+    # 與倒排索引相同的文件頻率統計（供雜湊模式的查詢端 IDF 使用）
+    preprocessor = TFIDFVectorizer()
+    frequencies: Counter = Counter()
+    for document in corpus:
+        frequencies.update(set(preprocessor._preprocess_text(document).split()))
+
+    results = {
+        "vocabulary": run_mode(
+            TFIDFVectorizer(max_features=5000), corpus, queries, frequencies, args.top_k
+        ),
+        f"hashing 2^{args.hash_bits}": run_mode(
+            TFIDFVectorizer(hash_bits=args.hash_bits), corpus, queries, frequencies, args.top_k
+        ),
+    }
+
+    names = list(results)
+    metrics = [key for key in results[names[0]] if key != "rankings"]
+    print(f"{len(corpus)} documents, {len(queries)} queries, top-{args.top_k}\n")
+    print(f"{'metric':<24}" + "".join(f"{name:>18}" for name in names))
+    for metric in metrics:
+        print(f"{metric:<24}" + "".join(f"{results[name][metric]:>18.3f}" for name in names))
+
+    overlaps = [
+        len(a & b) / args.top_k
+        for a, b in zip(results[names[0]]["rankings"], results[names[1]]["rankings"])
+    ]
+    print(f"\nmean top-{args.top_k} overlap: {statistics.mean(overlaps):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.models.database import Base, get_db
+from app.models.database import Base, get_db, get_session_factory
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -39,6 +39,10 @@ def client(db_session):
         finally:
             pass
     app.dependency_overrides[get_db] = override_get_db
+    # 自行開啟 Session 的工作（共用的搜尋計算）使用同一個測試連線與交易
+    app.dependency_overrides[get_session_factory] = lambda: sessionmaker(
+        autocommit=False, autoflush=False, bind=db_session.get_bind()
+    )
     with TestClient(app) as c:
         yield c
 
@@ -134,3 +134,140 @@ def test_update_nonexistent_bookmark(client):
 
     response = client.put("/api/v1/bookmarks/999999", json=update_data)
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# 測試重新訓練進行中時拒絕重複觸發
+def test_retrain_vectorizer_in_progress(client, db_session, monkeypatch):
+    """測試重新訓練進行中時拒絕重複觸發"""
+    from app.api import bookmarks as bookmarks_api
+    from app.models.database import Bookmark
+
+    db_session.add(Bookmark(url="https://example.com/retrain", title="Retrain", content="內容"))
+    db_session.commit()
+    monkeypatch.setattr(bookmarks_api, "is_retraining", lambda: True)
+
+    response = client.post("/api/v1/bookmarks/retrain-vectorizer")
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+# 測試批量向量化分批串流並為每個書籤寫入向量
+def test_batch_vectorize_in_chunks(db_session, monkeypatch):
+    """測試批量向量化分批串流並為每個書籤寫入向量"""
+    from app.api import bookmarks as bookmarks_api
+    from app.models.database import Bookmark
+    from app.services import tfidf_vectorizer, vector_index
+    from app.services.vector_codec import decode_vector
+
+    monkeypatch.setattr(tfidf_vectorizer, "_vectorizer_instance", None)
+    monkeypatch.setattr(vector_index, "_index_instance", None)
+    contents = ["Python 機器學習", "Python 資料分析", "料理 食譜", "料理 家常菜"]
+    for i, content in enumerate(contents):
+        db_session.add(
+            Bookmark(url=f"https://example.com/batch/{i}", title="書籤", content=content)
+        )
+    db_session.commit()
+    vectorizer = tfidf_vectorizer.get_vectorizer()
+    vectorizer.fit(contents)
+
+    bookmarks_api._batch_vectorize(db_session, chunk_size=3)
+
+    bookmarks = db_session.query(Bookmark).all()
+    for bookmark in bookmarks:
+        assert decode_vector(bookmark.tfidf_vector).model_version == vectorizer.model_version
+        assert bookmark.id in vector_index.get_vector_index()
+
+
+# 測試相關書籤 API 讀取預先計算的相關書籤
+def test_get_related_bookmarks(client, db_session, monkeypatch):
+    """測試相關書籤 API 讀取預先計算的相關書籤"""
+    import numpy as np
+
+    from app.models.database import Bookmark
+    from app.services import neighbor_graph, vector_index
+    from app.services.vector_codec import pack_vector
+
+    index = vector_index.VectorIndex()
+    monkeypatch.setattr(vector_index, "_index_instance", index)
+    rows = [([0, 1], [1.0, 1.0]), ([0, 1], [1.0, 0.5]), ([2], [1.0])]
+    bookmarks = []
+    for i, (indices, values) in enumerate(rows):
+        bookmark = Bookmark(
+            url=f"https://example.com/related/{i}",
+            title=f"書籤 {i}",
+            tfidf_vector=pack_vector(np.array(indices), np.array(values), 3, 3),
+        )
+        db_session.add(bookmark)
+        bookmarks.append(bookmark)
+    db_session.commit()
+    index.build(
+        [(b.id, np.array(r[0]), np.array(r[1])) for b, r in zip(bookmarks, rows)],
+        feature_count=3,
+        model_version=3,
+    )
+    neighbor_graph.refresh_neighbors(db_session)
+
+    response = client.get(f"/api/v1/bookmarks/{bookmarks[0].id}/related")
+    assert response.status_code == status.HTTP_200_OK
+    related = response.json()
+    assert [item["bookmark"]["id"] for item in related] == [bookmarks[1].id]
+    assert 0.0 < related[0]["similarity"] <= 1.0
+
+    response = client.get("/api/v1/bookmarks/999999/related")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # limit 超出相關書籤表保存的數量或不是正數時拒絕
+    from app import config
+
+    for limit in (0, config.RELATED_NEIGHBORS + 1):
+        response = client.get(f"/api/v1/bookmarks/{bookmarks[0].id}/related?limit={limit}")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# 測試追蹤參數不同的 URL 視為重複書籤
+def test_create_bookmark_tracking_variant(client, db_session):
+    """測試追蹤參數不同的 URL 視為重複書籤"""
+    client.post("/api/v1/bookmarks", json={"url": "https://variant.com/a?id=1", "title": "A"})
+    response = client.post(
+        "/api/v1/bookmarks",
+        json={"url": "https://variant.com/a/?id=1&utm_source=newsletter", "title": "A"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# 測試重複書籤報告依原始書籤分組
+def test_get_duplicate_bookmarks(client, db_session):
+    """測試重複書籤報告依原始書籤分組"""
+    from app.models.database import Bookmark
+
+    original = Bookmark(url="https://example.com/original", title="原文")
+    db_session.add(original)
+    db_session.commit()
+    for i in range(2):
+        db_session.add(
+            Bookmark(url=f"https://mirror{i}.com/copy", title="鏡像", duplicate_of=original.id)
+        )
+    db_session.commit()
+
+    response = client.get("/api/v1/bookmarks/duplicates")
+    assert response.status_code == status.HTTP_200_OK
+    groups = response.json()
+    assert [group["bookmark"]["id"] for group in groups] == [original.id]
+    assert len(groups[0]["duplicates"]) == 2
+    assert all(item["duplicate_of"] == original.id for item in groups[0]["duplicates"])
+
+
+# 測試手動豐富化排入持久化工作佇列，並可查詢工作與佇列狀態
+def test_enrich_bookmark_enqueues_job(client, test_bookmark):
+    """測試手動豐富化排入持久化工作佇列，並可查詢工作與佇列狀態"""
+    response = client.post(f"/api/v1/bookmarks/{test_bookmark.id}/enrich")
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()["job_id"]
+
+    job = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert job["kind"] == "enrich"
+    assert job["state"] == "pending"
+
+    stats = client.get("/api/v1/jobs").json()
+    assert stats["depth"] >= 1
+    assert stats["pending_by_kind"]["enrich"] >= 1
+    assert client.get("/api/v1/jobs/999999").status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,50 @@
+from fastapi import status
+
+from app.services.search_cache import get_search_cache
+
+
+# 測試相同查詢使用結果快取，書籤更新後重新搜尋
+def test_search_results_cached_until_bookmark_changes(client, test_bookmark):
+    """測試相同查詢使用結果快取，書籤更新後重新搜尋"""
+    cache = get_search_cache()
+    cache.clear()
+    hits = cache.hits
+
+    # 測試書籤直接寫入資料庫，尚未建立倒排索引
+    response = client.post("/api/v1/search/", json={"query": "Example", "limit": 5})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+    response = client.post("/api/v1/search/", json={"query": "  example ", "limit": 5})
+    assert response.json() == []
+    assert cache.hits == hits + 1
+
+    # 更新書籤會建立倒排索引並使快取失效
+    client.put(
+        f"/api/v1/bookmarks/{test_bookmark.id}",
+        json={"title": "Example Updated", "description": "An example bookmark"},
+    )
+    response = client.post("/api/v1/search/", json={"query": "Example", "limit": 5})
+    assert [result["bookmark"]["id"] for result in response.json()] == [test_bookmark.id]
+    assert cache.hits == hits + 1
+
+
+# 測試共用的搜尋計算自行開啟並關閉 Session，不使用發起請求的 Session
+def test_run_search_uses_own_session(db_session):
+    """測試共用的搜尋計算自行開啟並關閉 Session，不使用發起請求的 Session"""
+    from sqlalchemy.orm import Session, sessionmaker
+
+    from app.api.search import _run_search
+
+    closed = []
+
+    class TrackingSession(Session):
+        def close(self):
+            closed.append(self)
+            super().close()
+
+    factory = sessionmaker(bind=db_session.get_bind(), class_=TrackingSession)
+    _, cache_key = get_search_cache().lookup("own session", 5)
+
+    assert _run_search(factory, "own session", 5, cache_key) == []
+    assert len(closed) == 1 and closed[0] is not db_session
@@ -0,0 +1,71 @@
+import json
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import config
+from app.models.fts import FTS_TABLE
+from app.models.migrations import run_migrations
+from app.services.vector_codec import decode_vector
+
+
+# 測試舊版 JSON 向量欄位遷移為二進位欄位
+def test_migrate_tfidf_vector_to_blob(tmp_path):
+    """測試舊版 JSON 向量欄位遷移為二進位欄位"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, url VARCHAR NOT NULL, "
+                "title VARCHAR NOT NULL, description TEXT, content TEXT, keywords JSON, "
+                "tfidf_vector TEXT)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO bookmarks (id, url, title, tfidf_vector) "
+                "VALUES (1, 'https://a.com', 'A', :vector)"
+            ),
+            {"vector": json.dumps({"vector": {"2": 0.6, "0": 0.8}, "feature_count": 3})},
+        )
+        conn.execute(
+            text("INSERT INTO bookmarks (id, url, title) VALUES (2, 'https://b.com', 'B')")
+        )
+
+    run_migrations(engine)
+    run_migrations(engine)  # 遷移必須是冪等的
+
+    columns = {column["name"] for column in inspect(engine).get_columns("bookmarks")}
+    assert "tfidf_vector" not in columns
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, tfidf_vector_blob FROM bookmarks ORDER BY id")).all()
+
+    assert decode_vector(rows[0][1]).indices.tolist() == [0, 2]
+    assert rows[1][1] is None
+
+
+# 測試只在 FTS5 引擎下建立 FTS 索引並匯入現有書籤，改回倒排索引時移除
+def test_fts_index_follows_keyword_engine(tmp_path, monkeypatch):
+    """測試只在 FTS5 引擎下建立 FTS 索引並匯入現有書籤，改回倒排索引時移除"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fts.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, url VARCHAR NOT NULL, "
+                "title VARCHAR NOT NULL, description TEXT, content TEXT, keywords JSON)"
+            )
+        )
+        conn.execute(
+            text("INSERT INTO bookmarks (id, url, title) VALUES (1, 'https://a.com', '機器學習')")
+        )
+
+    monkeypatch.setattr(config, "KEYWORD_ENGINE", "fts5")
+    run_migrations(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT rowid FROM {FTS_TABLE}")).scalars().all() == [1]
+
+    monkeypatch.setattr(config, "KEYWORD_ENGINE", "inverted")
+    run_migrations(engine)
+    with engine.connect() as conn:
+        names = conn.execute(text("SELECT name FROM sqlite_master")).scalars().all()
+    assert not any(name.startswith(FTS_TABLE) for name in names)
+    assert "bookmarks_fts_ai" not in names
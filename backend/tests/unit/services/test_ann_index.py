@@ -0,0 +1,55 @@
+import numpy as np
+from scipy import sparse
+
+from app.services.ann_index import LSHIndex
+
+
+def _vectors():
+    return np.array(
+        [[1.0, 0.9, 0.0, 0.0], [0.9, 1.0, 0.1, 0.0], [0.0, 0.0, 1.0, 0.8], [0.0, 0.1, 0.9, 1.0]],
+        dtype=np.float32,
+    )
+
+
+# 測試相近的向量落在相同的桶，插入與刪除即時反映在候選中
+def test_candidates_insert_and_remove():
+    """測試相近的向量落在相同的桶，插入與刪除即時反映在候選中"""
+    index = LSHIndex(tables=8, bits=4, probes=1)
+    index.build([1, 2, 3, 4], _vectors())
+
+    assert 1 in index.candidates(np.array([1.0, 1.0, 0.0, 0.0]))
+
+    index.insert(5, np.array([1.0, 1.0, 0.0, 0.0], dtype=np.float32))
+    index.remove(1)
+    found = index.candidates(np.array([1.0, 1.0, 0.0, 0.0]))
+    assert 5 in found and 1 not in found
+    assert len(index) == 4
+
+
+# 測試稀疏向量的特徵數增加時以取餘數摺疊，不捨棄已分桶的書籤
+def test_sparse_vectors_fold_new_features():
+    """測試稀疏向量的特徵數增加時以取餘數摺疊，不捨棄已分桶的書籤"""
+    index = LSHIndex(tables=4, bits=4)
+    index.build([1, 2], sparse.csr_matrix(_vectors()[:2]))
+    index.insert(3, sparse.csr_matrix(([1.0], ([0], [6])), shape=(1, 8)))
+
+    assert len(index) == 3
+    assert index.dimensions == 4
+
+
+# 測試存檔與載入，metadata 不符時不載入
+def test_save_and_load(tmp_path):
+    """測試存檔與載入，metadata 不符時不載入"""
+    index = LSHIndex(tables=4, bits=6)
+    index.build([1, 2, 3, 4], _vectors())
+    path = tmp_path / "ann_index.npz"
+    index.save(path, {"model_version": 3, "corpus": "abc"})
+
+    restored = LSHIndex(tables=4, bits=6)
+    assert restored.load(path, {"model_version": 3, "corpus": "abc"})
+    assert restored._codes.keys() == index._codes.keys()
+    query = np.array([0.0, 0.0, 1.0, 1.0])
+    assert restored.candidates(query) == index.candidates(query)
+
+    assert not LSHIndex(tables=4, bits=6).load(path, {"model_version": 4, "corpus": "abc"})
+    assert not LSHIndex(tables=4, bits=5).load(path, {"model_version": 3, "corpus": "abc"})
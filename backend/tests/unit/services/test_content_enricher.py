@@ -0,0 +1,96 @@
+import asyncio
+
+from aiohttp import web
+
+from app.services.content_enricher import ContentEnricher, decode_body
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+# 測試共用 session 在多次抓取間重複使用同一條 TCP 連線
+def test_shared_session_reuses_connection():
+    """測試共用 session 在多次抓取間重複使用同一條 TCP 連線"""
+    client_ports = []
+
+    async def handler(request):
+        client_ports.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(text=f"<html><title>{request.match_info['name']}</title></html>")
+
+    async def run():
+        runner, base_url = await _serve(handler)
+        enricher = ContentEnricher()
+        await enricher.open_session()
+        try:
+            pages = [await enricher._fetch_page(f"{base_url}/page{i}") for i in range(3)]
+        finally:
+            await enricher.close_session()
+            await runner.cleanup()
+        return pages
+
+    pages = asyncio.run(run())
+
+    assert all("<title>page" in page for page in pages)
+    assert len(set(client_ports)) == 1
+
+
+# 測試超過大小上限的網頁只下載上限內的內容
+def test_fetch_truncates_at_max_bytes():
+    """測試超過大小上限的網頁只下載上限內的內容"""
+
+    async def handler(request):
+        body = "<html><title>big</title><body>" + "x" * 500_000 + "</body></html>"
+        return web.Response(text=body, content_type="text/html")
+
+    async def run():
+        runner, base_url = await _serve(handler)
+        enricher = ContentEnricher()
+        enricher.max_bytes = 1000
+        try:
+            return await enricher.fetch(f"{base_url}/big")
+        finally:
+            await runner.cleanup()
+
+    page = asyncio.run(run())
+
+    assert page.status == 200 and page.skipped is None
+    assert len(page.html) == 1000
+    assert page.html.startswith("<html><title>big</title>")
+
+
+# 測試不是 HTML 的回應不下載內容並標示略過原因
+def test_fetch_skips_non_html():
+    """測試不是 HTML 的回應不下載內容並標示略過原因"""
+
+    async def handler(request):
+        return web.Response(body=b"%PDF-1.7" + b"\0" * 10_000, content_type="application/pdf")
+
+    async def run():
+        runner, base_url = await _serve(handler)
+        enricher = ContentEnricher()
+        try:
+            return await enricher.fetch(f"{base_url}/doc")
+        finally:
+            await runner.cleanup()
+
+    page = asyncio.run(run())
+
+    assert page.status == 200 and page.html is None
+    assert "application/pdf" in page.skipped
+
+
+# 測試回應未指定編碼時依 <meta charset> 解碼
+def test_decode_body_uses_meta_charset():
+    """測試回應未指定編碼時依 <meta charset> 解碼"""
+    body = '<html><head><meta charset="big5"><title>書籤</title></head></html>'.encode("big5")
+
+    assert "<title>書籤</title>" in decode_body(body, None)
+    assert "書籤" not in decode_body(body, "utf-8")
@@ -0,0 +1,84 @@
+import asyncio
+
+from aiohttp import web
+
+from app.services.content_enricher import ContentEnricher
+from app.services.crawler import BulkCrawler
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _crawl(handler, names, **options):
+    batches = []
+
+    async def run():
+        runner, base_url = await _serve(handler)
+        enricher = ContentEnricher()
+        await enricher.open_session()
+        try:
+            crawler = BulkCrawler(enricher, **options)
+            bookmarks = [(i, f"{base_url}/{name}") for i, name in enumerate(names)]
+            return await crawler.crawl(bookmarks, lambda batch: batches.append(list(batch)))
+        finally:
+            await enricher.close_session()
+            await runner.cleanup()
+
+    return asyncio.run(run()), batches
+
+
+# 測試暫時性錯誤會重試、永久性錯誤不重試，且結果分批寫入
+def test_crawl_retries_transient_errors_and_stores_in_batches():
+    """測試暫時性錯誤會重試、永久性錯誤不重試，且結果分批寫入"""
+    requests = {}
+
+    async def handler(request):
+        name = request.match_info["name"]
+        requests[name] = requests.get(name, 0) + 1
+        if name == "missing":
+            return web.Response(status=404)
+        if name == "flaky" and requests[name] == 1:
+            return web.Response(status=503)
+        return web.Response(text=f"<html><title>{name}</title><body>hello {name}</body></html>")
+
+    names = ["flaky", "missing"] + [f"page{i}" for i in range(5)]
+    stats, batches = _crawl(handler, names, host_delay=0, backoff=0.01, batch_size=2)
+
+    assert requests["flaky"] == 2
+    assert requests["missing"] == 1
+    assert stats.fetched == 6 and stats.failed == 1 and stats.retries == 1
+    assert stats.stored == 6
+    assert [len(batch) for batch in batches] == [2, 2, 2]
+    stored = {bookmark_id: content for batch in batches for bookmark_id, content in batch}
+    assert stored[0]["title"] == "flaky"
+    assert 1 not in stored
+
+
+# 測試每個主機的同時抓取數不超過上限
+def test_crawl_limits_concurrency_per_host():
+    """測試每個主機的同時抓取數不超過上限"""
+    active = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return web.Response(text="<html><title>page</title></html>")
+
+    stats, _ = _crawl(
+        handler, [f"page{i}" for i in range(8)], concurrency=8, per_host=2, host_delay=0
+    )
+
+    assert stats.fetched == 8
+    assert peak == 2
@@ -0,0 +1,60 @@
+from app.models.database import Bookmark
+from app.services.dedup import SimHashIndex, canonicalize_url, hamming_distance, simhash
+
+
+# 測試 URL 正規化移除追蹤參數、片段與結尾斜線
+def test_canonicalize_url():
+    """測試 URL 正規化移除追蹤參數、片段與結尾斜線"""
+    canonical = canonicalize_url("https://Example.com:443/post/?utm_source=x&id=2&fbclid=y#top")
+
+    assert canonical == "https://example.com/post?id=2"
+    assert canonicalize_url("https://example.com/post?id=2&utm_medium=rss") == canonical
+    assert canonicalize_url("https://example.com/post?id=3") != canonical
+    assert canonicalize_url("http://example.com:8080/") == "http://example.com:8080"
+
+
+# 測試近似重複內容的 SimHash 距離小，不同內容的距離大
+def test_simhash_distance():
+    """測試近似重複內容的 SimHash 距離小，不同內容的距離大"""
+    article = [f"詞彙{i}" for i in range(200)]
+    mirror = article[:-3] + ["版權", "轉載", "鏡像"]
+    other = [f"其他{i}" for i in range(200)]
+
+    assert hamming_distance(simhash(article), simhash(mirror)) <= 3
+    assert hamming_distance(simhash(article), simhash(other)) > 10
+    assert simhash(article[:5], min_tokens=30) is None
+
+
+# 測試分段索引找出近似重複的原始書籤
+def test_simhash_index_assign():
+    """測試分段索引找出近似重複的原始書籤"""
+    index = SimHashIndex(max_distance=3)
+    original = 0xF0F0_0000_FFFF_1234
+
+    assert index.assign(1, original) is None
+    assert index.assign(2, original ^ 0b101) == 1
+    assert index.assign(3, original ^ 0xFF) is None
+    assert len(index) == 2
+
+    index.remove(1)
+    assert index.assign(2, original ^ 0b101) is None
+
+
+# 測試交易回滾時復原索引變更，提交後保留
+def test_simhash_index_undo_on_rollback(db_session):
+    """測試交易回滾時復原索引變更，提交後保留"""
+    index = SimHashIndex(max_distance=3)
+    original = 0xF0F0_0000_FFFF_1234
+    index.assign(1, original)
+    db_session.query(Bookmark).count()  # 開始交易
+
+    assert index.assign(2, original ^ 0xFF, db_session) is None
+    index.remove(1, db_session)
+    db_session.rollback()
+    assert index.assign(3, original ^ 0b101) == 1
+    assert index.assign(4, original ^ 0xFF ^ 0b1) is None
+
+    db_session.query(Bookmark).count()
+    index.remove(1, db_session)
+    db_session.commit()
+    assert index.assign(5, original ^ 0b101) is None
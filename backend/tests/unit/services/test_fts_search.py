@@ -0,0 +1,50 @@
+import pytest
+
+from app import config
+from app.models.database import Bookmark
+from app.models.fts import create_fts_index
+from app.services.fts_search import build_match_expression, search_fts
+
+
+@pytest.fixture
+def fts_index(db_session, monkeypatch):
+    """在測試交易中建立 FTS5 索引（預設的倒排索引引擎不建立），測試結束時隨交易回滾"""
+    monkeypatch.setattr(config, "KEYWORD_ENGINE", "fts5")
+    create_fts_index(db_session.connection())
+
+
+def _add_bookmark(db_session, url, title, content):
+    bookmark = Bookmark(url=url, title=title, description="", content=content)
+    db_session.add(bookmark)
+    db_session.commit()
+    return bookmark
+
+
+# 測試查詢分詞後組成 MATCH 運算式
+def test_build_match_expression():
+    """測試查詢分詞後組成 MATCH 運算式"""
+    assert build_match_expression("機器學習 教學") == '"機器" OR "學習" OR "教學"'
+    assert build_match_expression("的 !!") == ""
+
+
+# 測試觸發器同步 FTS 索引並以 bm25 排序
+def test_search_fts_ranks_with_bm25(db_session, fts_index):
+    """測試觸發器同步 FTS 索引並以 bm25 排序"""
+    in_title = _add_bookmark(db_session, "https://a.org", "機器學習筆記", "整理 常用 演算法")
+    in_content = _add_bookmark(db_session, "https://b.org", "讀書心得", "最近 在 讀 機器學習")
+
+    results = search_fts(db_session, "機器學習", 10)
+    assert [bookmark_id for bookmark_id, _ in results] == [in_title.id, in_content.id]
+    assert results[0][1] == 1.0
+    assert 0.0 < results[1][1] < 1.0
+
+    in_content.content = "最近 在 讀 小說"
+    db_session.commit()
+    assert [bookmark_id for bookmark_id, _ in search_fts(db_session, "機器學習", 10)] == [
+        in_title.id
+    ]
+
+    db_session.delete(in_title)
+    db_session.commit()
+    assert search_fts(db_session, "機器學習", 10) == []
+    assert search_fts(db_session, "的", 10) is None
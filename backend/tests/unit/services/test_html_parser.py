@@ -0,0 +1,96 @@
+import pytest
+
+from app.services.html_parser import (
+    PARSERS,
+    HtmlParser,
+    SoupParser,
+    available_parsers,
+    create_parser,
+)
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+  <title>頁面標題</title>
+  <meta name="description" content="  頁面描述  ">
+  <link rel="shortcut icon" href="/favicon.ico">
+  <style>body { color: red; }</style>
+</head>
+<body>
+  <header><h1>網站名稱</h1></header>
+  <nav>選單</nav>
+  <div class="post-content"><p>第一段</p><!-- 註解 --><p>第二段</p></div>
+  <footer>頁尾</footer>
+  <script>var tracking = 1;</script>
+</body>
+</html>"""
+
+
+@pytest.fixture(params=list(PARSERS))
+def parser(request):
+    """每個已安裝的解析後端各執行一次"""
+    if request.param not in available_parsers():
+        pytest.skip(f"{request.param} is not installed")
+    return PARSERS[request.param]()
+
+
+# 測試各解析後端提取相同的標題、描述、圖片與正文
+def test_parse_page(parser):
+    """測試各解析後端提取相同的標題、描述、圖片與正文"""
+    parsed = parser.parse(PAGE, "https://example.com/posts/1")
+
+    assert parsed.title == "頁面標題"
+    assert parsed.description == "頁面描述"
+    assert parsed.image_url == "https://example.com/favicon.ico"
+    assert parsed.content == "第一段 第二段"
+    assert parsed == SoupParser().parse(PAGE, "https://example.com/posts/1")
+
+
+# 測試 og 標籤優先，缺少正文區域時使用整個 body
+def test_parse_prefers_open_graph(parser):
+    """測試 og 標籤優先，缺少正文區域時使用整個 body"""
+    html = (
+        '<html><head><meta property="og:title" content="OG 標題">'
+        '<meta property="og:image" content="img/cover.png"><title>標題</title></head>'
+        "<body><p>內容</p></body></html>"
+    )
+    parsed = parser.parse(html, "https://example.com/a/")
+
+    assert parsed.title == "OG 標題"
+    assert parsed.description is None
+    assert parsed.image_url == "https://example.com/a/img/cover.png"
+    assert parsed.content == "內容"
+
+
+# 測試註解切開的文字、被移除標籤之後的文字與 template 內容和 html.parser 的結果一致
+def test_parse_text_boundaries(parser):
+    """測試註解切開的文字、被移除標籤之後的文字與 template 內容和 html.parser 的結果一致"""
+    html = (
+        "<html><body><p>前<!-- 註解 -->後</p>"
+        "<p>甲<script>x = 1;</script>乙</p>"
+        "<template><p>範本</p></template><p>丙</p></body></html>"
+    )
+    parsed = parser.parse(html, "https://example.com/")
+
+    assert parsed.content == "前 後 甲 乙 丙"
+    assert parsed == SoupParser().parse(html, "https://example.com/")
+
+
+# 測試預設使用 html.parser，指定的後端未安裝或名稱不明時也改用 html.parser
+def test_create_parser_falls_back():
+    """測試預設使用 html.parser，指定的後端未安裝或名稱不明時也改用 html.parser"""
+    assert isinstance(create_parser(), SoupParser)
+    assert isinstance(create_parser("unknown"), SoupParser)
+    assert create_parser("auto").name == available_parsers()[0]
+
+
+# 測試缺少查詢方法的解析後端無法建立
+def test_parser_requires_all_primitives():
+    """測試缺少查詢方法的解析後端無法建立"""
+
+    class PartialParser(HtmlParser):
+        def _document(self, html):
+            return html
+
+    with pytest.raises(TypeError):
+        PartialParser()
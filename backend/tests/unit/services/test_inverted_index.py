@@ -0,0 +1,65 @@
+from app.models.database import Bookmark, BookmarkTerm
+from app.services import inverted_index
+
+
+def _add_bookmark(db_session, url, title, content):
+    bookmark = Bookmark(url=url, title=title, description="", content=content)
+    db_session.add(bookmark)
+    db_session.flush()
+    inverted_index.index_bookmark(db_session, bookmark)
+    db_session.commit()
+    return bookmark
+
+
+# 測試依查詢詞彙取得候選書籤
+def test_find_candidate_ids(db_session):
+    """測試依查詢詞彙取得候選書籤"""
+    python = _add_bookmark(db_session, "https://py.org", "Python 教學", "機器學習 與 Python")
+    cooking = _add_bookmark(db_session, "https://cook.org", "料理食譜", "紅燒肉 做法")
+
+    terms = inverted_index.query_terms("Python 機器學習")
+    assert inverted_index.find_candidate_ids(db_session, terms, 10) == [python.id]
+
+    terms = inverted_index.query_terms("紅燒肉")
+    assert inverted_index.find_candidate_ids(db_session, terms, 10) == [cooking.id]
+
+
+# 測試更新與刪除時同步維護 postings
+def test_reindex_and_remove(db_session):
+    """測試更新與刪除時同步維護 postings"""
+    bookmark = _add_bookmark(db_session, "https://js.org", "JavaScript 入門", "")
+    terms = inverted_index.query_terms("javascript")
+
+    bookmark.title = "TypeScript 入門"
+    inverted_index.index_bookmark(db_session, bookmark)
+    assert inverted_index.find_candidate_ids(db_session, terms, 10) == []
+
+    inverted_index.remove_bookmark(db_session, bookmark.id)
+    remaining = db_session.query(BookmarkTerm).filter_by(bookmark_id=bookmark.id).count()
+    assert remaining == 0
+
+
+# 測試提交後才將文件頻率變化套用到增量模式的向量化器
+def test_document_frequency_follows_commits(db_session, monkeypatch):
+    """測試提交後才將文件頻率變化套用到增量模式的向量化器"""
+    from app.services import tfidf_vectorizer
+    from app.services.tfidf_vectorizer import TFIDFVectorizer
+
+    vectorizer = TFIDFVectorizer(incremental=True)
+    monkeypatch.setattr(tfidf_vectorizer, "_vectorizer_instance", vectorizer)
+    inverted_index.sync_document_frequencies(db_session, vectorizer)
+    documents = vectorizer.document_count
+
+    bookmark = _add_bookmark(db_session, "https://rs.org", "Rust 教學", "所有權 與 借用")
+    assert vectorizer.document_frequency["rust"] == 1
+    assert vectorizer.document_count == documents + 1
+
+    inverted_index.remove_bookmark(db_session, bookmark.id)
+    db_session.commit()
+    assert "rust" not in vectorizer.document_frequency
+    assert vectorizer.document_count == documents
+
+    # 回滾的變更不影響文件頻率
+    inverted_index.index_bookmark(db_session, bookmark)
+    db_session.rollback()
+    assert "rust" not in vectorizer.document_frequency
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Job
+from app.services.job_queue import FAILED, PENDING, SUCCEEDED, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # 工作者在其他執行緒存取資料庫，使用檔案資料庫而非各執行緒獨立的記憶體資料庫
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Job.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    yield JobQueue(workers=2, lease_seconds=60, retry_backoff=10.0, session_factory=factory)
+    engine.dispose()
+
+
+def _job(queue, job_id):
+    db = queue._session()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+
+def _set(queue, job_id, **values):
+    db = queue._session()
+    try:
+        db.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+
+# 測試工作只能被一個工作者取得，失敗後延後重試，用完嘗試次數後標記為失敗
+def test_claim_retry_and_fail(queue):
+    """測試工作只能被一個工作者取得，失敗後延後重試，用完嘗試次數後標記為失敗"""
+    db = queue._session()
+    job_id = queue.enqueue(db, "enrich", {"bookmark_id": 1}, max_attempts=2).id
+    db.close()
+
+    job = queue.claim("worker-1")
+    assert job["id"] == job_id and job["payload"] == {"bookmark_id": 1}
+    assert queue.claim("worker-2") is None
+
+    queue.fail(job, "worker-1", "RuntimeError: boom")
+    stored = _job(queue, job_id)
+    assert stored.state == PENDING and stored.last_error == "RuntimeError: boom"
+    assert queue.claim("worker-2") is None  # 退避時間未到
+
+    _set(queue, job_id, run_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    job = queue.claim("worker-2")
+    assert job["attempts"] == 2
+    queue.fail(job, "worker-2", "RuntimeError: boom again")
+    assert _job(queue, job_id).state == FAILED
+
+
+# 測試租約到期的工作由其他工作者接手，原持有者無法再更新工作
+def test_expired_lease_is_reclaimed(queue):
+    """測試租約到期的工作由其他工作者接手，原持有者無法再更新工作"""
+    db = queue._session()
+    job_id = queue.enqueue(db, "crawl", {"bookmark_ids": [1, 2]}).id
+    db.close()
+
+    assert queue.claim("worker-1")["id"] == job_id
+    _set(queue, job_id, lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    job = queue.claim("worker-2")
+    assert job["id"] == job_id and job["attempts"] == 2
+    assert not queue.heartbeat(job_id, "worker-1")
+    queue.complete(job_id, "worker-1", {"fetched": 0})
+    assert _job(queue, job_id).state != SUCCEEDED
+
+    queue.complete(job_id, "worker-2", {"fetched": 2})
+    stored = _job(queue, job_id)
+    assert stored.state == SUCCEEDED and stored.result == {"fetched": 2}
+
+
+# 測試工作者執行同步與非同步的處理函式並更新佇列統計
+def test_workers_run_handlers(queue):
+    """測試工作者執行同步與非同步的處理函式並更新佇列統計"""
+    calls = []
+
+    async def enrich(bookmark_id):
+        calls.append(("enrich", bookmark_id))
+        return {"bookmark_id": bookmark_id}
+
+    def vectorize():
+        calls.append(("vectorize", None))
+
+    queue.register("enrich", enrich)
+    queue.register("batch_vectorize", vectorize)
+
+    async def run():
+        await queue.start()
+        db = queue._session()
+        try:
+            ids = [queue.enqueue(db, "enrich", {"bookmark_id": i}).id for i in range(3)]
+            ids.append(queue.enqueue(db, "batch_vectorize").id)
+            for _ in range(200):
+                if all(_job(queue, job_id).state == SUCCEEDED for job_id in ids):
+                    break
+                await asyncio.sleep(0.01)
+            return queue.stats(db)
+        finally:
+            db.close()
+            await queue.stop()
+
+    stats = asyncio.run(run())
+
+    assert sorted(calls, key=str) == [
+        ("enrich", 0),
+        ("enrich", 1),
+        ("enrich", 2),
+        ("vectorize", None),
+    ]
+    assert stats["depth"] == 0
+    assert stats["states"][SUCCEEDED] == 4
+    assert stats["completed_last_minute"] == 4
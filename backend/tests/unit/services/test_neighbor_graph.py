@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.models.database import Bookmark, BookmarkNeighbor
+from app.services import neighbor_graph, vector_index
+from app.services.vector_codec import pack_vector
+
+VECTORS = {
+    "a": ([0, 1], [1.0, 1.0]),
+    "b": ([0, 1], [1.0, 0.8]),
+    "c": ([2, 3], [1.0, 1.0]),
+    "d": ([2, 3], [0.7, 1.0]),
+}
+
+
+@pytest.fixture
+def bookmarks(db_session, monkeypatch):
+    index = vector_index.VectorIndex()
+    monkeypatch.setattr(vector_index, "_index_instance", index)
+    created = {}
+    for name, (indices, values) in VECTORS.items():
+        bookmark = Bookmark(
+            url=f"https://example.com/related/{name}",
+            title=name,
+            tfidf_vector=pack_vector(np.array(indices), np.array(values), 7, 4),
+        )
+        db_session.add(bookmark)
+        created[name] = bookmark
+    db_session.commit()
+    index.build(
+        [(b.id, np.array(VECTORS[n][0]), np.array(VECTORS[n][1])) for n, b in created.items()],
+        feature_count=4,
+        model_version=7,
+    )
+    return created
+
+
+def _neighbor_ids(db_session, bookmark):
+    rows = (
+        db_session.query(BookmarkNeighbor.neighbor_id)
+        .filter(BookmarkNeighbor.bookmark_id == bookmark.id)
+        .order_by(BookmarkNeighbor.rank)
+    )
+    return [neighbor_id for neighbor_id, in rows]
+
+
+# 測試分塊計算每個書籤的相關書籤
+def test_refresh_builds_neighbors(db_session, bookmarks):
+    """測試分塊計算每個書籤的相關書籤"""
+    stats = neighbor_graph.refresh_neighbors(db_session, k=2, block_size=3)
+
+    assert stats == {"changed": 4, "removed": 0, "affected": 0}
+    assert _neighbor_ids(db_session, bookmarks["a"]) == [bookmarks["b"].id]
+    assert _neighbor_ids(db_session, bookmarks["d"]) == [bookmarks["c"].id]
+
+    related = neighbor_graph.get_related(db_session, bookmarks["c"], 5)
+    assert [bookmark.id for bookmark, _ in related] == [bookmarks["d"].id]
+    assert related[0][1] == pytest.approx(1.7 / np.sqrt(2 * 1.49), rel=1e-5)
+
+
+# 測試只重算向量改變的書籤與排名受影響的書籤
+def test_refresh_only_changed(db_session, bookmarks):
+    """測試只重算向量改變的書籤與排名受影響的書籤"""
+    neighbor_graph.refresh_neighbors(db_session, k=2)
+    assert neighbor_graph.refresh_neighbors(db_session, k=2)["changed"] == 0
+
+    # b 改為與 c、d 相近：a 失去相關書籤，c、d 的相關書籤加入 b
+    blob = pack_vector(np.array([2, 3]), np.array([1.0, 0.9]), 7, 4)
+    bookmarks["b"].tfidf_vector = blob
+    db_session.commit()
+    vector_index.get_vector_index().upsert_encoded(bookmarks["b"].id, blob)
+
+    stats = neighbor_graph.refresh_neighbors(db_session, k=2)
+    assert stats == {"changed": 1, "removed": 0, "affected": 3}
+    assert _neighbor_ids(db_session, bookmarks["a"]) == []
+    assert bookmarks["b"].id in _neighbor_ids(db_session, bookmarks["c"])
+
+    # 刪除書籤時移除其相關書籤，並重算含有它的書籤
+    db_session.delete(bookmarks["d"])
+    db_session.commit()
+    vector_index.get_vector_index().remove(bookmarks["d"].id)
+    stats = neighbor_graph.refresh_neighbors(db_session, k=2)
+    assert stats == {"changed": 0, "removed": 1, "affected": 2}
+    assert _neighbor_ids(db_session, bookmarks["c"]) == [bookmarks["b"].id]
@@ -0,0 +1,75 @@
+import asyncio
+
+from aiohttp import web
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import BookmarkPage
+from app.services import page_cache
+from app.services.content_enricher import ContentEnricher, FetchedPage
+
+HTML = "<html><head><title>頁面</title></head><body>" + "<p>書籤內容</p>" * 200 + "</body></html>"
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+# 測試快取頁面壓縮保存、驗證資訊讀取與離線讀取原始 HTML
+def test_store_and_read_cached_pages():
+    """測試快取頁面壓縮保存、驗證資訊讀取與離線讀取原始 HTML"""
+    engine = create_engine("sqlite://")
+    BookmarkPage.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+
+    page = FetchedPage(200, HTML, '"v1"', "Wed, 01 Jan 2025 00:00:00 GMT")
+    page_cache.store_pages(db, [(1, "https://example.com/a", page)])
+    db.commit()
+
+    cached = page_cache.get_cached_page(db, 1, "https://example.com/a")
+    assert cached == ('"v1"', "Wed, 01 Jan 2025 00:00:00 GMT", page_cache.html_hash(HTML))
+    assert page_cache.get_cached_page(db, 1, "https://example.com/moved") is None
+
+    page_cache.mark_checked(db, 1, FetchedPage(304, None, '"v2"'))
+    db.commit()
+    assert page_cache.get_cached_page(db, 1, "https://example.com/a").etag == '"v2"'
+
+    assert list(page_cache.iter_cached_pages(db)) == [[(1, "https://example.com/a", HTML)]]
+    stats = page_cache.stats(db)
+    assert stats["pages"] == 1
+    assert stats["compressed_bytes"] < stats["raw_bytes"] / 4
+    db.close()
+
+
+# 測試帶驗證標頭的條件式請求在頁面未改變時收到 304 且不下載內容
+def test_conditional_fetch_not_modified():
+    """測試帶驗證標頭的條件式請求在頁面未改變時收到 304 且不下載內容"""
+
+    async def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(text=HTML, content_type="text/html", headers={"ETag": '"v1"'})
+
+    async def run():
+        runner, base_url = await _serve(handler)
+        enricher = ContentEnricher()
+        await enricher.open_session()
+        try:
+            first = await enricher.fetch(f"{base_url}/page")
+            second = await enricher.fetch(f"{base_url}/page", etag=first.etag)
+        finally:
+            await enricher.close_session()
+            await runner.cleanup()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.status == 200 and first.html == HTML and first.etag == '"v1"'
+    assert second.status == 304 and second.html is None
@@ -0,0 +1,122 @@
+import pytest
+
+from app import config
+from app.models.database import Bookmark
+from app.services import retraining, tfidf_vectorizer, vector_index
+from app.services.tfidf_vectorizer import TFIDFVectorizer, get_vectorizer
+from app.services.vector_codec import decode_vector
+from app.services.vector_index import get_vector_index
+
+CONTENTS = [
+    "Python 程式設計 機器學習 資料分析",
+    "Python 機器學習 模型 訓練",
+    "Python 資料分析 模型 視覺化",
+    "料理 食譜 紅燒肉 家常菜",
+    "料理 食譜 蛋糕 烘焙",
+    "家常菜 烘焙 料理 技巧",
+]
+
+
+@pytest.fixture
+def live_model(db_session, tmp_path, monkeypatch):
+    """以部分語料訓練現行模型，並在測試結束後還原全局實例"""
+    monkeypatch.setattr(config, "VECTORIZER_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(tfidf_vectorizer, "_vectorizer_instance", None)
+    monkeypatch.setattr(vector_index, "_index_instance", None)
+
+    live = get_vectorizer()
+    live.fit(CONTENTS[:4])
+    for i, content in enumerate(CONTENTS):
+        bookmark = Bookmark(
+            url=f"https://example.com/{i}", title=f"書籤 {i}", description="", content=content
+        )
+        bookmark.tfidf_vector = live.transform(content)
+        db_session.add(bookmark)
+    db_session.commit()
+    return live
+
+
+# 測試重新訓練完成後新模型與新向量同時生效
+def test_retrain_swaps_model_and_vectors(db_session, live_model):
+    """測試重新訓練完成後新模型與新向量同時生效"""
+    assert retraining.retrain_in_shadow(db_session) == retraining.RETRAINED
+
+    active = get_vectorizer()
+    assert active is not live_model
+    assert active.model_version != live_model.model_version
+    assert get_vector_index().model_version == active.model_version
+
+    bookmarks = db_session.query(Bookmark).all()
+    assert all(bookmark.tfidf_vector_next is None for bookmark in bookmarks)
+    versions = {decode_vector(bookmark.tfidf_vector).model_version for bookmark in bookmarks}
+    assert versions == {active.model_version}
+
+    # 新模型已存檔
+    assert TFIDFVectorizer().load(tfidf_vectorizer.get_model_dir()) is not None
+
+
+# 測試切換失敗時舊模型與舊向量維持不變
+def test_failed_swap_keeps_current_model(db_session, live_model, monkeypatch):
+    """測試切換失敗時舊模型與舊向量維持不變"""
+
+    def fail(db):
+        raise RuntimeError("swap failed")
+
+    monkeypatch.setattr(retraining, "_promote_shadow_vectors", fail)
+    assert retraining.retrain_in_shadow(db_session) == retraining.FAILED
+
+    assert get_vectorizer() is live_model
+    for bookmark in db_session.query(Bookmark).all():
+        assert bookmark.tfidf_vector_next is None
+        if bookmark.tfidf_vector is not None:
+            assert decode_vector(bookmark.tfidf_vector).model_version == live_model.model_version
+
+
+# 測試重新訓練期間提交的文件頻率變化也套用到切換後的增量模型
+def test_retrain_keeps_frequency_changes_during_training(db_session, live_model, monkeypatch):
+    """測試重新訓練期間提交的文件頻率變化也套用到切換後的增量模型"""
+    from app.services import inverted_index
+
+    monkeypatch.setattr(config, "VECTORIZER_INCREMENTAL", True)
+    write_shadow_vectors = retraining._write_shadow_vectors
+
+    def write_and_add_bookmark(db, *args, only_missing=False):
+        written = write_shadow_vectors(db, *args, only_missing=only_missing)
+        if only_missing:
+            return written
+        # 影子模型統計文件頻率之後才提交的書籤
+        bookmark = Bookmark(url="https://rs.org", title="Rust 教學", description="", content="")
+        db.add(bookmark)
+        db.flush()
+        inverted_index.index_bookmark(db, bookmark)
+        db.commit()
+        return written
+
+    monkeypatch.setattr(retraining, "_write_shadow_vectors", write_and_add_bookmark)
+    assert retraining.retrain_in_shadow(db_session) == retraining.RETRAINED
+
+    active = get_vectorizer()
+    assert active.incremental
+    assert active.document_frequency["rust"] == 1
+
+
+# 測試另一個重新訓練正在執行或沒有可訓練的文本時，重新訓練工作正常結束而不重試
+def test_retrain_task_skips_benign_cases(monkeypatch):
+    """測試另一個重新訓練正在執行或沒有可訓練的文本時，重新訓練工作正常結束而不重試"""
+    from app.api import bookmarks
+
+    for outcome in (retraining.BUSY, retraining.NOTHING_TO_TRAIN):
+        monkeypatch.setattr(bookmarks, "retrain_in_shadow", lambda: outcome)
+        assert bookmarks.retrain_and_vectorize_task() == {"outcome": outcome}
+
+    monkeypatch.setattr(bookmarks, "retrain_in_shadow", lambda: retraining.FAILED)
+    with pytest.raises(RuntimeError):
+        bookmarks.retrain_and_vectorize_task()
+
+
+# 測試另一個重新訓練持有鎖時返回 BUSY
+def test_retrain_reports_busy(db_session):
+    """測試另一個重新訓練持有鎖時返回 BUSY"""
+    with retraining._retrain_lock:
+        assert retraining.retrain_in_shadow(db_session) == retraining.BUSY
+    assert retraining.retrain_in_shadow(db_session) == retraining.NOTHING_TO_TRAIN
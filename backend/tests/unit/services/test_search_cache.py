@@ -0,0 +1,59 @@
+import asyncio
+
+from app.services.search_cache import SearchResultCache, SingleFlight, bump_generation
+
+
+# 測試索引世代改變後不再命中舊結果
+def test_generation_invalidates_results():
+    """測試索引世代改變後不再命中舊結果"""
+    cache = SearchResultCache(max_bytes=1000)
+    _, key = cache.lookup("Python", 10)
+    cache.store(key, ["result"], 10)
+    assert cache.lookup("python", 10)[0] == ["result"]
+    assert cache.lookup("python", 20)[0] is None
+
+    bump_generation()
+    cache.store(key, ["stale"], 10)  # 搜尋期間世代已改變，不寫入
+    results, key = cache.lookup("python", 10)
+    assert results is None
+    assert key[0] != 0
+    assert cache.stats()["hit_rate"] == 0.25
+
+
+# 測試超過記憶體上限時淘汰最久未使用的結果
+def test_evicts_by_size():
+    """測試超過記憶體上限時淘汰最久未使用的結果"""
+    cache = SearchResultCache(max_bytes=100)
+    for query in ("a", "b", "c"):
+        _, key = cache.lookup(query, 10)
+        cache.store(key, [query], 40)
+
+    assert cache.lookup("a", 10)[0] is None
+    assert cache.lookup("c", 10)[0] == ["c"]
+    assert cache.stats()["bytes"] == 80
+    assert cache.stats()["evictions"] == 1
+
+
+# 測試同時進行的相同請求只計算一次
+def test_single_flight_coalesces_concurrent_requests():
+    """測試同時進行的相同請求只計算一次"""
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def burst():
+        return await asyncio.gather(
+            *(flight.run("q", lambda: compute(1)) for _ in range(4)),
+            flight.run("other", lambda: compute(5)),
+        )
+
+    assert asyncio.run(burst()) == [2, 2, 2, 2, 10]
+    assert calls == [1, 5]
+    stats = flight.stats()
+    assert stats["coalesced"] == 3
+    assert stats["in_flight"] == 0
+    assert stats["dedup_ratio"] == 0.6
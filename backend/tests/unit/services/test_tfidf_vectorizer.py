@@ -0,0 +1,203 @@
+import numpy as np
+import pytest
+
+from app.services.tfidf_vectorizer import TFIDFVectorizer
+from app.services.vector_codec import decode_vector
+
+CORPUS = [
+    "Python 程式設計 入門 教學",
+    "機器學習 使用 Python 與 scikit-learn",
+    "JavaScript 前端 開發 教學",
+]
+
+
+# 測試模型存檔後可完整載入
+def test_save_and_load_roundtrip(tmp_path):
+    """測試模型存檔後可完整載入"""
+    trained = TFIDFVectorizer(min_df=1, max_df=1.0)
+    trained.fit(CORPUS)
+    trained.save(tmp_path, "fingerprint-1")
+
+    loaded = TFIDFVectorizer()
+    assert loaded.load(tmp_path) == "fingerprint-1"
+    assert loaded.model_version == trained.model_version
+    assert loaded.feature_names == trained.feature_names
+    assert (loaded.min_df, loaded.max_df) == (1, 1.0)
+
+    expected = decode_vector(trained.transform("Python 教學"))
+    actual = decode_vector(loaded.transform("Python 教學"))
+    assert actual.model_version == expected.model_version
+    assert actual.indices.tolist() == expected.indices.tolist()
+    assert actual.values.tolist() == expected.values.tolist()
+
+
+# 測試模型檔不存在或損壞時不載入
+def test_load_missing_or_corrupt(tmp_path):
+    """測試模型檔不存在或損壞時不載入"""
+    vectorizer = TFIDFVectorizer()
+    assert vectorizer.load(tmp_path) is None
+
+    (tmp_path / "tfidf_model.npz").write_bytes(b"broken")
+    (tmp_path / "tfidf_vocabulary.json").write_text("{}")
+    assert vectorizer.load(tmp_path) is None
+    assert vectorizer.vectorizer is None
+
+
+def _incremental_vectorizer(feature_reserve=0.5):
+    vectorizer = TFIDFVectorizer(
+        min_df=1, max_df=1.0, incremental=True, feature_reserve=feature_reserve
+    )
+    vectorizer.fit(CORPUS)
+    vectorizer.set_document_frequencies({}, len(CORPUS))
+    return vectorizer
+
+
+# 測試增量模式為新詞彙分配預留槽位，且不超過預留數量
+def test_incremental_assigns_reserved_slots():
+    """測試增量模式為新詞彙分配預留槽位，且不超過預留數量"""
+    vectorizer = _incremental_vectorizer()
+    fitted_count = len(vectorizer.feature_names)
+    version = vectorizer.model_version
+
+    vector = decode_vector(vectorizer.transform("Rust 系統 程式設計", assign_new_terms=True))
+    assert vector.feature_count == vectorizer.feature_capacity
+    assert "rust" in vectorizer.vocabulary
+    assert vectorizer.vocabulary["rust"] >= fitted_count
+    assert vectorizer.vocabulary["rust"] in vector.indices.tolist()
+    assert vectorizer.model_version == version
+
+    # 查詢不分配槽位
+    vectorizer.transform_query("golang")
+    assert "golang" not in vectorizer.vocabulary
+
+    for i in range(vectorizer.feature_capacity):
+        vectorizer.transform(f"新詞彙{i}號", assign_new_terms=True)
+    assert len(vectorizer.feature_names) == vectorizer.feature_capacity
+    assert vectorizer.get_vocabulary_stats()["needs_compaction"]
+
+
+# 測試增量模式的查詢權重跟隨即時文件頻率
+def test_incremental_query_uses_live_idf():
+    """測試增量模式的查詢權重跟隨即時文件頻率"""
+    vectorizer = _incremental_vectorizer()
+    python_slot = vectorizer.vocabulary["python"]
+
+    def python_weight():
+        vector = decode_vector(vectorizer.transform_query("Python 教學"))
+        return dict(zip(vector.indices.tolist(), vector.values.tolist()))[python_slot]
+
+    vectorizer.set_document_frequencies({"python": 1, "教學": 2}, 10)
+    rare = python_weight()
+    vectorizer.apply_document_frequency_delta({"python": 8}, 0)
+    assert python_weight() < rare
+
+    # 文件向量不含 IDF，不受文件頻率影響
+    document = decode_vector(vectorizer.transform("Python 教學"))
+    assert document.values.tolist() == pytest.approx([2 ** -0.5] * 2)
+
+
+# 測試增量模式存檔後新分配的槽位寫回詞彙表檔
+def test_incremental_slots_persisted(tmp_path):
+    """測試增量模式存檔後新分配的槽位寫回詞彙表檔"""
+    vectorizer = _incremental_vectorizer()
+    vectorizer.save(tmp_path, "fingerprint-1")
+    vectorizer.transform("Rust 入門", assign_new_terms=True)
+
+    loaded = TFIDFVectorizer(incremental=True)
+    assert loaded.load(tmp_path) == "fingerprint-1"
+    assert loaded.model_version == vectorizer.model_version
+    assert loaded.feature_capacity == vectorizer.feature_capacity
+    assert loaded.vocabulary["rust"] == vectorizer.vocabulary["rust"]
+
+    # 模式不同的模型檔不載入
+    assert TFIDFVectorizer().load(tmp_path) is None
+
+
+# 測試增量模式收錄新書籤後重新啟動不排入重新訓練，預留槽位用完時才重新訓練
+def test_incremental_restart_skips_retrain(db_session, tmp_path, monkeypatch):
+    """測試增量模式收錄新書籤後重新啟動不排入重新訓練，預留槽位用完時才重新訓練"""
+    from sqlalchemy.orm import sessionmaker
+
+    from app import config
+    from app.models import database
+    from app.models.database import Bookmark
+    from app.services import tfidf_vectorizer
+    from app.services.tfidf_vectorizer import compute_corpus_fingerprint, load_vectorizer
+
+    monkeypatch.setattr(config, "VECTORIZER_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "VECTORIZER_INCREMENTAL", True)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    monkeypatch.setattr(tfidf_vectorizer, "_vectorizer_instance", None)
+
+    db_session.add(Bookmark(url="https://example.com/1", title="Python", content=CORPUS[0]))
+    db_session.commit()
+    _incremental_vectorizer().save(tmp_path, compute_corpus_fingerprint(db_session))
+
+    # 增量收錄新書籤，語料指紋改變
+    db_session.add(Bookmark(url="https://example.com/2", title="Rust", content="Rust 入門"))
+    db_session.commit()
+    assert load_vectorizer() is None
+
+    # 預留槽位用完的模型需重新訓練以壓縮詞彙表
+    _incremental_vectorizer(feature_reserve=0.0).save(tmp_path, "fingerprint-1")
+    monkeypatch.setattr(tfidf_vectorizer, "_vectorizer_instance", None)
+    assert load_vectorizer() == "retrain"
+
+
+# 測試雜湊模式不需訓練且向量不隨語料改變
+def test_hashing_mode_is_stateless():
+    """測試雜湊模式不需訓練且向量不隨語料改變"""
+    vectorizer = TFIDFVectorizer(hash_bits=10)
+    assert vectorizer.is_trained and vectorizer.vectorizer is None
+    before = vectorizer.transform("Rust 系統 程式設計")
+
+    vectorizer.fit(CORPUS)
+    vectorizer.set_document_frequencies({"rust": 1, "系統": 5}, 10)
+    vector = decode_vector(before)
+    assert vectorizer.transform("Rust 系統 程式設計") == before
+    assert vector.feature_count == 1024
+    assert vector.model_version == TFIDFVectorizer(hash_bits=10).model_version
+    assert vector.model_version != TFIDFVectorizer(hash_bits=12).model_version
+
+    # 查詢端以即時 IDF 加權：較少見的 rust 權重較高
+    query = decode_vector(vectorizer.transform_query("Rust 系統"))
+    weights = dict(zip(query.indices.tolist(), query.values.tolist()))
+    assert weights[vectorizer._hash_slot("rust")] > weights[vectorizer._hash_slot("系統")]
+
+
+# 測試分批稀疏轉換與逐筆轉換產生相同向量（詞彙表與雜湊模式）
+@pytest.mark.parametrize("options", [{"min_df": 1, "max_df": 1.0}, {"hash_bits": 10}])
+def test_transform_many_matches_transform(options):
+    """測試分批稀疏轉換與逐筆轉換產生相同向量（詞彙表與雜湊模式）"""
+    vectorizer = TFIDFVectorizer(**options)
+    vectorizer.fit(CORPUS)
+    texts = CORPUS + ["", "完全 無關 的 詞彙"]
+
+    vectors = list(vectorizer.transform_many(iter(texts), chunk_size=2))
+    assert len(vectors) == len(texts)
+    for text, data in zip(texts, vectors):
+        expected = vectorizer.transform(text)
+        if expected is None:
+            assert data is None
+            continue
+        actual, expected = decode_vector(data), decode_vector(expected)
+        assert actual.feature_count == expected.feature_count
+        assert actual.indices.tolist() == expected.indices.tolist()
+        assert actual.values.tolist() == pytest.approx(expected.values.tolist())
+
+
+# 測試 LSA 投影隨模型存檔與載入
+def test_lsa_projection_roundtrip(tmp_path):
+    """測試 LSA 投影隨模型存檔與載入"""
+    trained = TFIDFVectorizer(min_df=1, max_df=1.0, lsa_components=2)
+    trained.fit(CORPUS)
+    assert trained.lsa_projection.shape == (2, trained.feature_count)
+    assert trained.lsa_projection.dtype == np.float32
+    trained.save(tmp_path, "fingerprint-1")
+
+    loaded = TFIDFVectorizer(lsa_components=2)
+    assert loaded.load(tmp_path) == "fingerprint-1"
+    assert np.array_equal(loaded.lsa_projection, trained.lsa_projection)
+
+    # LSA 設定不同時需要重新訓練
+    assert TFIDFVectorizer().load(tmp_path) is None
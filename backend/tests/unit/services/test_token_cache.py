@@ -0,0 +1,69 @@
+import jieba.analyse
+
+from app.models.database import Bookmark, BookmarkTokens
+from app.services import token_cache
+from app.services.content_enricher import ContentEnricher
+from app.services.tfidf_vectorizer import TFIDFVectorizer
+from app.services.vector_codec import decode_vector
+
+CONTENT = "Python 機器學習 教學，使用 scikit-learn 進行資料分析與模型訓練。機器學習 入門"
+
+
+def _add_bookmark(db_session, **fields):
+    bookmark = Bookmark(url="https://example.com/tokens", **fields)
+    db_session.add(bookmark)
+    db_session.commit()
+    return bookmark
+
+
+# 測試內容未改變的書籤不重新分詞，內容改變時才重新分詞
+def test_unchanged_bookmarks_are_not_resegmented(db_session, monkeypatch):
+    """測試內容未改變的書籤不重新分詞，內容改變時才重新分詞"""
+    bookmark = _add_bookmark(
+        db_session, title="機器學習筆記", description="", content=CONTENT, keywords=["Python"]
+    )
+    calls = []
+    segment_many = token_cache.segment_many
+    monkeypatch.setattr(
+        token_cache, "segment_many", lambda texts: calls.append(texts) or segment_many(texts)
+    )
+
+    first = token_cache.get_document_tokens(db_session, [bookmark])[0]
+    assert "Python" in first.content.split()
+    assert db_session.get(BookmarkTokens, bookmark.id) is not None
+
+    assert token_cache.get_document_tokens(db_session, [bookmark])[0] == first
+    assert len(calls) == 1
+
+    bookmark.content = "料理 食譜"
+    assert token_cache.get_document_tokens(db_session, [bookmark])[0].content == "料理 食譜"
+    assert len(calls) == 2
+
+
+# 測試以快取分詞結果產生的向量與直接向量化相同
+def test_cached_tokens_match_direct_transform(db_session):
+    """測試以快取分詞結果產生的向量與直接向量化相同"""
+    bookmark = _add_bookmark(
+        db_session, title="Python 教學", description="資料分析", content=CONTENT, keywords=["模型"]
+    )
+    vectorizer = TFIDFVectorizer(min_df=1, max_df=1.0)
+    vectorizer.fit([CONTENT, "料理 食譜 紅燒肉"])
+    enricher = ContentEnricher()
+
+    expected = vectorizer.transform(
+        enricher.build_vector_text(
+            bookmark.title, bookmark.description, bookmark.content, bookmark.keywords
+        )
+    )
+    actual = enricher.generate_tfidf_vectors(db_session, [bookmark], vectorizer=vectorizer)[0]
+    assert decode_vector(actual).indices.tolist() == decode_vector(expected).indices.tolist()
+    assert decode_vector(actual).values.tolist() == decode_vector(expected).values.tolist()
+
+
+# 測試以分詞結果提取的關鍵字與 jieba.analyse 相同
+def test_keywords_from_tokens_match_jieba():
+    """測試以分詞結果提取的關鍵字與 jieba.analyse 相同"""
+    enricher = ContentEnricher()
+    tokens = token_cache.segment_many([CONTENT])[0]
+    expected = jieba.analyse.extract_tags(CONTENT, topK=5)
+    assert enricher._rank_keywords(tokens, 5) == expected
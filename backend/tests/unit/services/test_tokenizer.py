@@ -0,0 +1,42 @@
+from app.services import tokenizer
+from app.services.tfidf_vectorizer import TFIDFVectorizer
+from app.services.vector_codec import decode_vector
+
+TEXTS = [
+    "Python 程式設計 入門 教學",
+    "機器學習 使用 Python 與 scikit-learn",
+    "JavaScript 前端 開發 教學",
+    "",
+    "料理 食譜 紅燒肉 家常菜",
+]
+
+
+# 測試行程池平行分詞與循序分詞結果相同且保持順序
+def test_parallel_matches_serial():
+    """測試行程池平行分詞與循序分詞結果相同且保持順序"""
+    stop_words = TFIDFVectorizer().stop_words
+    serial = [tokenizer.preprocess_text(text, stop_words) for text in TEXTS]
+    try:
+        parallel = tokenizer.preprocess_many(TEXTS, stop_words, workers=2, chunk_size=2)
+    finally:
+        tokenizer.shutdown_pool()
+
+    assert parallel == serial
+    assert parallel[3] == ""
+
+
+# 測試批量向量化與逐筆向量化產生相同向量
+def test_transform_many_matches_transform():
+    """測試批量向量化與逐筆向量化產生相同向量"""
+    vectorizer = TFIDFVectorizer(min_df=1, max_df=1.0)
+    vectorizer.fit(TEXTS)
+
+    vectors = list(vectorizer.transform_many(TEXTS))
+    assert len(vectors) == len(TEXTS)
+    assert vectors[3] is None
+    for text, data in zip(TEXTS, vectors):
+        expected = vectorizer.transform(text)
+        if expected is None:
+            assert data is None
+            continue
+        assert decode_vector(data).indices.tolist() == decode_vector(expected).indices.tolist()
@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.services.vector_codec import (
+    UNKNOWN_MODEL_VERSION,
+    convert_legacy_json,
+    decode_vector,
+    pack_vector,
+    unpack_vector,
+)
+
+
+# 測試編碼與解碼往返
+def test_pack_unpack_roundtrip():
+    """測試編碼與解碼往返"""
+    data = pack_vector(np.array([3, 17, 4096]), np.array([0.1, 0.5, 0.25]), 42, 5000)
+    vector = unpack_vector(data)
+
+    assert len(data) == 20 + 3 * 8
+    assert vector.model_version == 42
+    assert vector.feature_count == 5000
+    assert vector.indices.tolist() == [3, 17, 4096]
+    np.testing.assert_allclose(vector.values, [0.1, 0.5, 0.25], rtol=1e-6)
+    # np.frombuffer 直接引用原始資料，不複製
+    assert not vector.indices.flags.owndata
+
+
+# 測試舊版 JSON 向量轉換
+def test_convert_legacy_json():
+    """測試舊版 JSON 向量轉換"""
+    legacy = json.dumps({"vector": {"9": 0.2, "1": 0.4}, "feature_count": 10})
+    vector = decode_vector(legacy)
+
+    assert vector.model_version == UNKNOWN_MODEL_VERSION
+    assert vector.feature_count == 10
+    assert vector.indices.tolist() == [1, 9]
+    assert decode_vector(convert_legacy_json(legacy)).indices.tolist() == [1, 9]
+
+
+# 測試無效資料
+@pytest.mark.parametrize("data", [None, b"", b"garbage", "not json", json.dumps({"vector": {}})])
+def test_decode_invalid_vector(data):
+    """測試無效資料"""
+    assert decode_vector(data) is None
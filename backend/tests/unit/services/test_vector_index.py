@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import LSHIndex
+from app.services.vector_codec import pack_vector
+from app.services.vector_index import VectorIndex
+
+
+@pytest.fixture
+def index():
+    vector_index = VectorIndex(compact_threshold=4)
+    vector_index.build(
+        [
+            (1, np.array([0, 1]), np.array([1.0, 1.0])),
+            (2, np.array([2]), np.array([3.0])),
+        ],
+        feature_count=4,
+        model_version=7,
+    )
+    return vector_index
+
+
+# 測試相似度為正規化後的餘弦值
+def test_similarities_cosine(index):
+    """測試相似度為正規化後的餘弦值"""
+    scores = index.similarities(np.array([0]), np.array([2.0]), [1, 2, 99])
+
+    assert scores[1] == pytest.approx(1 / np.sqrt(2), rel=1e-5)
+    assert scores[2] == pytest.approx(0.0)
+    assert 99 not in scores
+
+
+# 測試更新與刪除書籤向量
+def test_upsert_and_remove(index):
+    """測試更新與刪除書籤向量"""
+    index.upsert_encoded(2, pack_vector(np.array([0]), np.array([0.5]), 7, 4))
+    index.remove(1)
+
+    scores = index.similarities(np.array([0]), np.array([1.0]), [1, 2])
+    assert scores == {2: pytest.approx(1.0)}
+    assert len(index) == 1
+
+
+# 測試待合併列達到門檻時重建主矩陣
+def test_compaction_keeps_rows(index):
+    """測試待合併列達到門檻時重建主矩陣"""
+    for bookmark_id in range(3, 7):
+        index.upsert(bookmark_id, np.array([3]), np.array([1.0]))
+
+    stats = index.stats()
+    assert stats["pending_rows"] == 0
+    assert stats["rows"] == 6
+
+    scores = index.similarities(np.array([3]), np.array([1.0]), list(range(1, 7)))
+    assert scores[6] == pytest.approx(1.0)
+    assert scores[1] == pytest.approx(0.0)
+
+
+# 測試其他模型版本產生的向量會被移出索引
+def test_upsert_rejects_other_model_version(index):
+    """測試其他模型版本產生的向量會被移出索引"""
+    index.upsert_encoded(1, pack_vector(np.array([0]), np.array([1.0]), 8, 4))
+
+    assert 1 not in index
+    assert len(index) == 1
+
+
+# 測試全語料檢索依相似度返回前 k 名（含待合併列，不含已刪除列）
+def test_top_k(index):
+    """測試全語料檢索依相似度返回前 k 名（含待合併列，不含已刪除列）"""
+    index.upsert(3, np.array([0]), np.array([1.0]))
+    index.upsert(4, np.array([3]), np.array([1.0]))
+
+    ranked = index.top_k(np.array([0, 2]), np.array([1.0, 1.0]), 2)
+    assert [bookmark_id for bookmark_id, _ in ranked] == [2, 3]
+    assert ranked[0][1] == pytest.approx(1 / np.sqrt(2), rel=1e-5)
+
+    index.remove(2)
+    ranked = index.top_k(np.array([0, 2]), np.array([1.0, 1.0]), 5)
+    assert [bookmark_id for bookmark_id, _ in ranked] == [3, 1]
+
+
+# 測試 LSA 投影使不同詞彙的同義向量相似
+def test_lsa_projection_matches_synonyms():
+    """測試 LSA 投影使不同詞彙的同義向量相似"""
+    projection = np.array([[1.0, 1.0, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+    vector_index = VectorIndex()
+    vector_index.build(
+        [(1, np.array([1]), np.array([1.0])), (2, np.array([2]), np.array([1.0]))],
+        feature_count=3,
+        model_version=7,
+        projection=projection,
+    )
+    vector_index.upsert(3, np.array([0, 2]), np.array([1.0, 1.0]))
+
+    # 特徵 0 與特徵 1 投影到同一個潛在維度
+    assert vector_index.similarities(np.array([0]), np.array([1.0]), [1, 2, 3]) == {
+        1: pytest.approx(1.0),
+        2: pytest.approx(0.0),
+        3: pytest.approx(1 / np.sqrt(2), rel=1e-5),
+    }
+    assert [bid for bid, _ in vector_index.top_k(np.array([0]), np.array([1.0]), 5)] == [1, 3]
+    assert vector_index.stats()["lsa_dimensions"] == 2
+
+
+# 測試 LSH 候選檢索的結果與召回率量測
+def test_approximate_top_k():
+    """測試 LSH 候選檢索的結果與召回率量測"""
+    vector_index = VectorIndex(ann=LSHIndex(tables=8, bits=2, probes=1))
+    vector_index.build(
+        [
+            (1, np.array([0, 1]), np.array([1.0, 1.0])),
+            (2, np.array([2]), np.array([3.0])),
+            (3, np.array([0]), np.array([1.0])),
+        ],
+        feature_count=4,
+        model_version=7,
+    )
+    vector_index.upsert(4, np.array([0, 1]), np.array([1.0, 0.9]))
+
+    ranked = vector_index.approximate_top_k(np.array([0, 1]), np.array([1.0, 1.0]), 2)
+    assert [bookmark_id for bookmark_id, _ in ranked] == [1, 4]
+
+    vector_index.remove(1)
+    ranked = vector_index.approximate_top_k(np.array([0, 1]), np.array([1.0, 1.0]), 2)
+    assert 1 not in [bookmark_id for bookmark_id, _ in ranked]
+
+    recall = vector_index.measure_ann_recall(k=2)
+    assert 0.0 <= recall <= 1.0
+    assert vector_index.stats()["ann"]["recall_at_k"]["recall"] == recall